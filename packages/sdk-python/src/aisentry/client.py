@@ -3,18 +3,185 @@ WatchLLM - Python SDK for AI Observability
 Provides a simple interface for logging AI events and metrics
 """
 
+import asyncio
+import collections
+import gzip
 import json
+import os
+import random
+import re
+import sys
 import time
-import uuid
+import traceback
 from typing import Dict, List, Optional, Any, Union
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, fields, is_dataclass
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
 from enum import Enum
+from functools import lru_cache
 import threading
-import queue
 import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    AIOHTTP_AVAILABLE = False
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+try:
+    import hyperscan
+    HYPERSCAN_AVAILABLE = True
+except ImportError:
+    HYPERSCAN_AVAILABLE = False
+
+
+# Email, credit card and SSN patterns
+_PII_PATTERNS = (
+    r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b',
+    r'\b\d{4}[-\s]?\d{4}[-\s]?\d{4}[-\s]?\d{4}\b',
+    r'\b\d{3}-\d{2}-\d{4}\b',
+)
+# Fused into one alternation so each string is scanned once
+_PII_RE = re.compile("|".join(_PII_PATTERNS))
+
+# The same patterns loosened for serialized payloads, so that every leaf match is also a
+# payload match: word boundaries are dropped and a card separator may be a JSON escape
+# such as \n or \u000b. A hit only means the slower leaf walk has to run.
+_JSON_SEPARATOR = r'(?:[-\s]|\\[nrtf]|\\u[0-9a-fA-F]{4})'
+_PII_PAYLOAD_PATTERNS = (
+    r'[A-Za-z0-9._%+-]@[A-Za-z0-9.-]+\.[A-Za-z]{2}',
+    r'\d{4}' + (_JSON_SEPARATOR + r'?\d{4}') * 3,
+    r'\d{3}-\d{2}-\d{4}',
+)
+_PII_PAYLOAD_RE = re.compile("|".join(_PII_PAYLOAD_PATTERNS))
+# For ASCII payloads, where bytes and str \d and \s agree
+_PII_BYTES_RE = re.compile(_PII_PAYLOAD_RE.pattern.encode("ascii"))
+
+
+def _compile_pii_database():
+    """Build a Hyperscan database that stops at the first PII match, or None"""
+    if not HYPERSCAN_AVAILABLE:
+        return None
+    try:
+        db = hyperscan.Database()
+        db.compile(
+            expressions=[pattern.encode("ascii") for pattern in _PII_PAYLOAD_PATTERNS],
+            ids=list(range(len(_PII_PAYLOAD_PATTERNS))),
+            elements=len(_PII_PAYLOAD_PATTERNS),
+            flags=[hyperscan.HS_FLAG_SINGLEMATCH] * len(_PII_PAYLOAD_PATTERNS),
+        )
+        return db
+    except hyperscan.error:
+        return None
+
+
+_PII_HS_DB = _compile_pii_database()
+
+
+def _stop_on_match(pattern_id, start, end, flags, context):
+    """Hyperscan match handler: returning True terminates the scan"""
+    return True
+
+
+def _contains_pii(payload: bytes) -> bool:
+    """Whether a serialized payload may contain PII, using Hyperscan when available"""
+    if not payload.isascii():
+        # The leaf patterns also match Unicode digits and spaces, which only str \d and \s know
+        return _PII_PAYLOAD_RE.search(payload.decode("utf-8", "replace")) is not None
+    if _PII_HS_DB is not None:
+        try:
+            _PII_HS_DB.scan(payload, match_event_handler=_stop_on_match)
+            return False
+        except hyperscan.ScanTerminated:
+            return True
+        except hyperscan.error:
+            # e.g. the scratch space is busy with a concurrent flush; use the regex instead
+            pass
+    return _PII_BYTES_RE.search(payload) is not None
+
+
+def _json_default(obj: Any) -> Any:
+    """Serialize values the stdlib encoder does not know about"""
+    if isinstance(obj, Enum):
+        return obj.value
+    if is_dataclass(obj):
+        return {f.name: getattr(obj, f.name) for f in fields(obj)}
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _json_dumps(obj: Any) -> bytes:
+    """Serialize to UTF-8 JSON bytes, using orjson when it is installed"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        obj, default=_json_default, separators=(",", ":"), ensure_ascii=False
+    ).encode("utf-8")
+
+
+def _to_primitive(obj: Any) -> Any:
+    """Convert events to plain dicts/lists/scalars for encoders without dataclass support"""
+    if isinstance(obj, Enum):
+        return obj.value
+    if is_dataclass(obj):
+        return {f.name: _to_primitive(getattr(obj, f.name)) for f in fields(obj)}
+    if isinstance(obj, dict):
+        return {key: _to_primitive(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_to_primitive(item) for item in obj]
+    return obj
+
+
+def _json_loads(data: Union[bytes, str]) -> Any:
+    """Parse JSON, using orjson when it is installed"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _new_event_id() -> str:
+    """Random hyphenated UUID4 string built straight from os.urandom"""
+    b = bytearray(os.urandom(16))
+    b[6] = (b[6] & 0x0F) | 0x40  # version 4
+    b[8] = (b[8] & 0x3F) | 0x80  # RFC 4122 variant
+    h = b.hex()
+    return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+
+
+# (epoch second, formatted "YYYY-MM-DDTHH:MM:SS") for the last second _iso_now saw
+_iso_second_cache = (-1, "")
+
+
+def _iso_now() -> str:
+    """Current UTC time as ISO 8601 with microseconds, e.g. 2024-01-01T00:00:00.000000Z"""
+    global _iso_second_cache
+    seconds, ns = divmod(time.time_ns(), 1_000_000_000)
+    cached_second, prefix = _iso_second_cache
+    if seconds != cached_second:
+        prefix = time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(seconds))
+        _iso_second_cache = (seconds, prefix)
+    return f"{prefix}.{ns // 1000:06d}Z"
+
 
 class EventType(Enum):
     PROMPT_CALL = "prompt_call"
@@ -68,7 +235,75 @@ class Severity(Enum):
     CRITICAL = "critical"
 
 
-@dataclass
+def _enum_lookup(enum_cls) -> Dict[Any, Any]:
+    """Map both member values and members themselves to the member"""
+    lookup = {member.value: member for member in enum_cls}
+    lookup.update({member: member for member in enum_cls})
+    return lookup
+
+
+# Coerce with `_X_MAP.get(value) or X(value)`: one dict hit normally, Enum's ValueError for unknowns
+_STATUS_MAP = _enum_lookup(Status)
+_STEP_TYPE_MAP = _enum_lookup(StepType)
+_ASSERTION_TYPE_MAP = _enum_lookup(AssertionType)
+_DETECTION_METHOD_MAP = _enum_lookup(DetectionMethod)
+_ALERT_TYPE_MAP = _enum_lookup(AlertType)
+_SEVERITY_MAP = _enum_lookup(Severity)
+
+
+# Simplified pricing model as (input, output) USD per token, i.e. per-1K prices already divided by 1000
+_PRICING = {
+    "gpt-4o": (0.005 / 1000, 0.015 / 1000),
+    "gpt-4o-mini": (0.00015 / 1000, 0.0006 / 1000),
+    "gpt-3.5-turbo": (0.0005 / 1000, 0.0015 / 1000),
+    "claude-3-5-sonnet-20241022": (0.003 / 1000, 0.015 / 1000),
+    "claude-3-haiku-20240307": (0.00025 / 1000, 0.00125 / 1000),
+}
+_DEFAULT_PRICING = (0.001 / 1000, 0.002 / 1000)
+
+
+@lru_cache(maxsize=32)
+def _get_pricing(model: str):
+    """Per-token (input, output) prices for a model, falling back to the default rate"""
+    return _PRICING.get(model, _DEFAULT_PRICING)
+
+
+# Events drop their per-instance __dict__ where dataclasses support it (Python 3.10+).
+# slots=True rebuilds the class, which breaks zero-argument super(), so the
+# __post_init__ chains below name BaseEvent explicitly.
+_DATACLASS_OPTIONS = {"slots": True} if sys.version_info >= (3, 10) else {}
+
+
+# Defaults for log_* calls made inside trace(); ContextVars keep them per thread and per asyncio task
+_run_id_var = ContextVar("watchllm_run_id", default=None)
+_user_id_var = ContextVar("watchllm_user_id", default=None)
+_tags_var = ContextVar("watchllm_tags", default=None)
+
+
+@contextmanager
+def trace(run_id: Optional[str] = None, user_id: Optional[str] = None, tags: Optional[List[str]] = None):
+    """
+    Context manager that supplies run_id, user_id and tags to log_* calls made inside it.
+
+    Usage:
+        with trace(run_id="my-session"):
+            client.log_prompt_call(None, prompt, model, ...)
+
+    Arguments passed to a log_* call explicitly still take precedence.
+    """
+    run_id = run_id or _new_event_id()
+    run_token = _run_id_var.set(run_id)
+    user_token = _user_id_var.set(user_id)
+    tags_token = _tags_var.set(tags or [])
+    try:
+        yield run_id
+    finally:
+        _run_id_var.reset(run_token)
+        _user_id_var.reset(user_token)
+        _tags_var.reset(tags_token)
+
+
+@dataclass(**_DATACLASS_OPTIONS)
 class BaseEvent:
     event_id: str
     project_id: str
@@ -89,8 +324,12 @@ class BaseEvent:
                 "platform": "python"
             }
 
+    def to_json_bytes(self) -> bytes:
+        """Serialize the event straight to JSON bytes, without an intermediate dict"""
+        return _json_dumps(self)
+
 
-@dataclass
+@dataclass(**_DATACLASS_OPTIONS)
 class ToolCallEvent:
     tool_name: str
     input: Dict[str, Any]
@@ -100,7 +339,7 @@ class ToolCallEvent:
     error: Optional[Dict[str, str]] = None
 
 
-@dataclass
+@dataclass(**_DATACLASS_OPTIONS)
 class PromptCallEvent(BaseEvent):
     event_type: str = EventType.PROMPT_CALL.value
     prompt: str = ""
@@ -118,14 +357,14 @@ class PromptCallEvent(BaseEvent):
     latency_ms: int = 0
 
     def __post_init__(self):
-        super().__post_init__()
+        BaseEvent.__post_init__(self)
         if self.response_metadata is None:
             self.response_metadata = {}
         if self.tool_calls is None:
             self.tool_calls = []
 
 
-@dataclass
+@dataclass(**_DATACLASS_OPTIONS)
 class AgentStepEvent(BaseEvent):
     event_type: str = EventType.AGENT_STEP.value
     step_number: int = 0
@@ -140,7 +379,7 @@ class AgentStepEvent(BaseEvent):
     error: Optional[Dict[str, str]] = None
 
     def __post_init__(self):
-        super().__post_init__()
+        BaseEvent.__post_init__(self)
         if self.input_data is None:
             self.input_data = {}
         if self.output_data is None:
@@ -149,7 +388,7 @@ class AgentStepEvent(BaseEvent):
             self.context = {}
 
 
-@dataclass
+@dataclass(**_DATACLASS_OPTIONS)
 class ErrorEvent(BaseEvent):
     event_type: str = EventType.ERROR.value
     error: Dict[str, str] = None
@@ -157,14 +396,14 @@ class ErrorEvent(BaseEvent):
     stack_trace: Optional[str] = None
 
     def __post_init__(self):
-        super().__post_init__()
+        BaseEvent.__post_init__(self)
         if self.error is None:
             self.error = {}
         if self.context is None:
             self.context = {}
 
 
-@dataclass
+@dataclass(**_DATACLASS_OPTIONS)
 class AssertionFailedEvent(BaseEvent):
     event_type: str = EventType.ASSERTION_FAILED.value
     assertion_name: str = ""
@@ -174,7 +413,7 @@ class AssertionFailedEvent(BaseEvent):
     severity: Severity = Severity.MEDIUM
 
 
-@dataclass
+@dataclass(**_DATACLASS_OPTIONS)
 class HallucinationDetectedEvent(BaseEvent):
     event_type: str = EventType.HALLUCINATION_DETECTED.value
     detection_method: DetectionMethod = DetectionMethod.HEURISTIC
@@ -184,12 +423,12 @@ class HallucinationDetectedEvent(BaseEvent):
     recommendations: List[str] = None
 
     def __post_init__(self):
-        super().__post_init__()
+        BaseEvent.__post_init__(self)
         if self.recommendations is None:
             self.recommendations = []
 
 
-@dataclass
+@dataclass(**_DATACLASS_OPTIONS)
 class PerformanceAlertEvent(BaseEvent):
     event_type: str = EventType.COST_THRESHOLD_EXCEEDED.value
     alert_type: AlertType = AlertType.COST_SPIKE
@@ -199,7 +438,7 @@ class PerformanceAlertEvent(BaseEvent):
     affected_models: List[str] = None
 
     def __post_init__(self):
-        super().__post_init__()
+        BaseEvent.__post_init__(self)
         if self.affected_models is None:
             self.affected_models = []
 
@@ -219,7 +458,13 @@ class WatchLLMClient:
         redact_pii: bool = True,
         batch_size: int = 10,
         flush_interval_seconds: int = 5,
-        timeout: int = 30
+        timeout: int = 30,
+        max_connections: int = 16,
+        keepalive_timeout: float = 60.0,
+        compression: Optional[str] = None,
+        max_queue_size: Optional[int] = None,
+        max_send_workers: int = 4,
+        wire_format: str = "json"
     ):
         self.api_key = api_key
         self.project_id = project_id
@@ -230,32 +475,141 @@ class WatchLLMClient:
         self.batch_size = batch_size
         self.flush_interval_seconds = flush_interval_seconds
         self.timeout = timeout
-
-        # Event queue and background thread
-        self._event_queue = queue.Queue()
+        self.max_connections = max_connections
+        self.keepalive_timeout = keepalive_timeout
+        self.max_send_workers = max_send_workers
+
+        # Batch body compression: None, "gzip" or "zstd" (the server must accept it)
+        if compression not in (None, "gzip", "zstd"):
+            raise ValueError(f"Unsupported compression: {compression}")
+        if compression == "zstd" and not ZSTD_AVAILABLE:
+            raise ImportError(
+                "zstandard is not installed. Install it with: "
+                "pip install zstandard"
+            )
+        self.compression = compression
+
+        # Batch wire format: "json" or "msgpack" (the server must accept application/msgpack)
+        if wire_format not in ("json", "msgpack"):
+            raise ValueError(f"Unsupported wire format: {wire_format}")
+        if wire_format == "msgpack" and not MSGPACK_AVAILABLE:
+            raise ImportError(
+                "msgpack is not installed. Install it with: "
+                "pip install msgpack"
+            )
+        self.wire_format = wire_format
+
+        # Header dicts and URLs are fixed for the client's lifetime, so build them once
+        self._auth_header = {"Authorization": f"Bearer {api_key}"}
+        self._auth_headers = {**self._auth_header, "Content-Type": "application/json"}
+        self._batch_headers = dict(self._auth_headers)
+        if wire_format == "msgpack":
+            self._batch_headers["Content-Type"] = "application/msgpack"
+        if compression is not None:
+            self._batch_headers["Content-Encoding"] = compression
+        self._events_batch_url = f"{self.base_url}/events/batch"
+        self._events_query_url = f"{self.base_url}/events/query"
+        self._metrics_url = f"{self.base_url}/projects/{project_id}/metrics"
+
+        # Event queue and background thread; when full the oldest events are dropped
+        self.max_queue_size = max_queue_size or batch_size * 100
+        self._buf = collections.deque()
+        self._lock = threading.Lock()
+        # Signalled when the buffer goes from empty to non-empty or fills a batch
+        self._cv = threading.Condition(self._lock)
+        self.dropped_events = 0
         self._shutdown_event = threading.Event()
         self._flush_thread = None
         self._session = None
+        # Sync transport only: sends the batches of one flush concurrently
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+        # Async transport: batch POSTs are fire-and-forget tasks on a dedicated loop
+        self._use_async = AIOHTTP_AVAILABLE
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._flush_task = None
+        self._async_flush_requested: Optional[asyncio.Event] = None
+        self._async_session = None
+        # Added on the flush thread, discarded by done-callbacks on the loop thread and
+        # snapshotted by close(), so every access holds _pending_lock
+        self._pending_sends = set()
+        self._pending_lock = threading.Lock()
 
         # Start background thread
         self._start_flush_thread()
 
     def _start_flush_thread(self):
         """Start the background flush thread"""
-        self._flush_thread = threading.Thread(target=self._flush_worker, daemon=True)
+        if self._use_async:
+            self._loop = asyncio.new_event_loop()
+            self._flush_thread = threading.Thread(target=self._run_loop, daemon=True)
+        else:
+            self._flush_thread = threading.Thread(target=self._flush_worker, daemon=True)
         self._flush_thread.start()
 
+    def _run_loop(self):
+        """Run the client event loop that hosts periodic flushes and in-flight sends"""
+        asyncio.set_event_loop(self._loop)
+        self._flush_task = self._loop.create_task(self._async_flush_worker())
+        self._loop.run_forever()
+
+    async def _async_flush_worker(self):
+        """Event-loop counterpart of _flush_worker"""
+        self._async_flush_requested = asyncio.Event()
+        while not self._shutdown_event.is_set():
+            # Sleep without a timeout while there is nothing to send
+            while not self._buf:
+                await self._async_flush_requested.wait()
+                self._async_flush_requested.clear()
+            # Then wait for a full batch or the flush deadline
+            deadline = time.monotonic() + self.flush_interval_seconds
+            while len(self._buf) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(self._async_flush_requested.wait(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
+                self._async_flush_requested.clear()
+            if self._shutdown_event.is_set():
+                return
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error in flush worker: {e}")
+
     def _flush_worker(self):
-        """Background worker that flushes events periodically"""
+        """Background worker that flushes on a full batch or the flush interval, whichever comes first"""
         while not self._shutdown_event.is_set():
+            with self._cv:
+                # Sleep without a timeout while there is nothing to send
+                self._cv.wait_for(lambda: self._shutdown_event.is_set() or self._buf)
+                # Then wait for a full batch, shutdown, or the flush deadline
+                self._cv.wait_for(
+                    lambda: self._shutdown_event.is_set() or len(self._buf) >= self.batch_size,
+                    timeout=self.flush_interval_seconds
+                )
+            if self._shutdown_event.is_set():
+                return
             try:
-                # Wait for shutdown event or flush interval
-                self._shutdown_event.wait(self.flush_interval_seconds)
-                if not self._shutdown_event.is_set():
-                    self.flush()
+                self.flush()
             except Exception as e:
-                # Log error but continue running
+                # Log error but continue running; back off so re-queued events are not retried in a tight loop
                 print(f"Error in flush worker: {e}")
+                self._shutdown_event.wait(self.flush_interval_seconds)
+
+    def _request_flush(self):
+        """Wake the flush worker ahead of its deadline"""
+        if self._loop is not None and self._loop.is_running():
+            self._loop.call_soon_threadsafe(self._wake_async_flush_worker)
+        else:
+            with self._cv:
+                self._cv.notify()
+
+    def _wake_async_flush_worker(self):
+        if self._async_flush_requested is not None:
+            self._async_flush_requested.set()
 
     def _get_session(self) -> requests.Session:
         """Get or create HTTP session with retry configuration"""
@@ -266,47 +620,133 @@ class WatchLLMClient:
                 backoff_factor=1,
                 status_forcelist=[429, 500, 502, 503, 504],
             )
-            adapter = HTTPAdapter(max_retries=retry_strategy)
+            # One keep-alive pool per host, sized so concurrent flushes reuse connections
+            adapter = HTTPAdapter(
+                pool_connections=4,
+                pool_maxsize=self.max_connections,
+                max_retries=retry_strategy
+            )
             self._session.mount("http://", adapter)
             self._session.mount("https://", adapter)
         return self._session
 
+    def _get_async_session(self) -> "aiohttp.ClientSession":
+        """Get or create the aiohttp session (must be called on the client loop)"""
+        if self._async_session is None:
+            # Idle connections are kept open between flushes to skip the TCP/TLS handshake
+            self._async_session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self.max_connections,
+                    limit_per_host=self.max_connections,
+                    keepalive_timeout=self.keepalive_timeout
+                )
+            )
+        return self._async_session
+
+    @property
+    def sample_rate(self) -> float:
+        """Fraction of events to send, between 0 and 1"""
+        return self._sample_rate
+
+    @sample_rate.setter
+    def sample_rate(self, value: float):
+        self._sample_rate = value
+        # The default rate keeps every event; skip the sampling call entirely then
+        self._always_sample = value >= 1.0
+
     def _should_sample(self) -> bool:
         """Check if event should be sampled based on sample rate"""
         return self.sample_rate >= 1.0 or (self.sample_rate > 0 and random.random() < self.sample_rate)
 
-    def _redact_pii(self, event_dict: Dict[str, Any]) -> Dict[str, Any]:
-        """Redact PII from event if enabled"""
-        if not self.redact_pii:
-            return event_dict
-
-        # Simple PII redaction patterns
-        import re
-        event_str = json.dumps(event_dict)
-        
-        # Redact emails
-        event_str = re.sub(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b', '[REDACTED]', event_str)
-        
-        # Redact credit cards
-        event_str = re.sub(r'\b\d{4}[-\s]?\d{4}[-\s]?\d{4}[-\s]?\d{4}\b', '[REDACTED]', event_str)
-        
-        # Redact SSNs
-        event_str = re.sub(r'\b\d{3}-\d{2}-\d{4}\b', '[REDACTED]', event_str)
-        
-        return json.loads(event_str)
+    def _redact_pii(self, payload: bytes) -> bytes:
+        """Redact PII from a serialized event if enabled"""
+        if not self.redact_pii or not _contains_pii(payload):
+            return payload
+
+        return _json_dumps(self._redact_pii_inplace(_json_loads(payload)))
+
+    def _redact_pii_inplace(self, value: Any) -> Any:
+        """Redact PII in every string leaf; dicts and lists are updated in place"""
+        if isinstance(value, str):
+            # sub() hands back the same object when nothing matched
+            return _PII_RE.sub('[REDACTED]', value)
+        # Only leaves that changed are written back, so clean payloads are left untouched
+        if isinstance(value, dict):
+            for key, item in value.items():
+                redacted = self._redact_pii_inplace(item)
+                if redacted is not item:
+                    value[key] = redacted
+        elif isinstance(value, list):
+            for i, item in enumerate(value):
+                redacted = self._redact_pii_inplace(item)
+                if redacted is not item:
+                    value[i] = redacted
+        elif isinstance(value, tuple):
+            return tuple(self._redact_pii_inplace(item) for item in value)
+        return value
 
     def _queue_event(self, event: BaseEvent):
         """Queue event for background sending"""
-        if not self._should_sample():
+        if not self._always_sample and not self._should_sample():
             return
 
-        event_dict = asdict(event)
-        event_dict = self._redact_pii(event_dict)
-        self._event_queue.put(event_dict)
+        # Queue the raw event; serialization and PII redaction run on the flushing thread
+        with self._cv:
+            if len(self._buf) >= self.max_queue_size:
+                self._buf.popleft()
+                self.dropped_events += 1
+            self._buf.append(event)
+            queued = len(self._buf)
+            if queued == 1 or queued >= self.batch_size:
+                # Arms an idle sync flush worker, or releases it early on a full batch
+                self._cv.notify()
+
+        if (queued == 1 or queued >= self.batch_size) and self._async_transport_running():
+            # Same wake-ups for the event-loop worker
+            self._request_flush()
+
+    def _serialize_events(self, events: List[Union[BaseEvent, bytes]]) -> List[bytes]:
+        """Serialize and redact raw events; re-queued events are already bytes"""
+        payloads = []
+        failed = 0
+        for event in events:
+            if isinstance(event, bytes):
+                payloads.append(event)
+                continue
+            try:
+                if self.wire_format == "msgpack":
+                    payloads.append(self._pack_event(event))
+                else:
+                    payloads.append(self._redact_pii(event.to_json_bytes()))
+            except Exception as e:
+                # One unserializable event must not take the rest of the batch with it
+                failed += 1
+                print(f"Failed to serialize event: {e}")
+        if failed:
+            # Producers update the counter too, so it is only touched under the lock
+            with self._lock:
+                self.dropped_events += failed
+        return payloads
+
+    def _pack_event(self, event: BaseEvent) -> bytes:
+        """Encode one event as msgpack, redacting PII first if enabled"""
+        # msgpack length prefixes can sit next to string data, so the byte-level
+        # PII check used for JSON is not reliable here; redact the leaves instead
+        data = _to_primitive(event)
+        if self.redact_pii:
+            data = self._redact_pii_inplace(data)
+        return msgpack.packb(data, use_bin_type=True)
+
+    def _requeue_events(self, events: List[bytes]):
+        """Put a failed batch back, keeping only what fits in the free capacity"""
+        with self._lock:
+            free = max(self.max_queue_size - len(self._buf), 0)
+            self._buf.extend(events[:free])
+            self.dropped_events += max(len(events) - free, 0)
 
     def log_prompt_call(
         self,
-        run_id: str,
+        run_id: Optional[str],
         prompt: str,
         model: str,
         response: str,
@@ -324,8 +764,7 @@ class WatchLLMClient:
         release: Optional[str] = None
     ):
         """Log a prompt call event"""
-        if isinstance(status, str):
-            status = Status(status)
+        status = _STATUS_MAP.get(status) or Status(status)
 
         # Calculate cost estimate
         cost_estimate = self._calculate_cost_estimate(model, tokens_input, tokens_output)
@@ -339,15 +778,15 @@ class WatchLLMClient:
                     input=tc['input'],
                     output=tc['output'],
                     latency_ms=tc['latency_ms'],
-                    status=Status(tc['status']) if isinstance(tc['status'], str) else tc['status'],
+                    status=_STATUS_MAP.get(tc['status']) or Status(tc['status']),
                     error=tc.get('error')
                 ))
 
         event = PromptCallEvent(
-            event_id=str(uuid.uuid4()),
+            event_id=_new_event_id(),
             project_id=self.project_id,
-            run_id=run_id,
-            timestamp=time.strftime('%Y-%m-%dT%H:%M:%S.%fZ', time.gmtime()),
+            run_id=run_id or _run_id_var.get() or _new_event_id(),
+            timestamp=_iso_now(),
             prompt=prompt,
             model=model,
             response=response,
@@ -361,8 +800,8 @@ class WatchLLMClient:
             model_version=model_version,
             response_metadata=response_metadata or {},
             tool_calls=tool_call_events,
-            tags=tags or [],
-            user_id=user_id,
+            tags=tags or _tags_var.get() or [],
+            user_id=user_id or _user_id_var.get(),
             release=release,
             env=self.environment
         )
@@ -371,7 +810,7 @@ class WatchLLMClient:
 
     def log_agent_step(
         self,
-        run_id: str,
+        run_id: Optional[str],
         step_number: int,
         step_name: str,
         step_type: Union[StepType, str],
@@ -387,16 +826,14 @@ class WatchLLMClient:
         release: Optional[str] = None
     ):
         """Log an agent step event"""
-        if isinstance(status, str):
-            status = Status(status)
-        if isinstance(step_type, str):
-            step_type = StepType(step_type)
+        status = _STATUS_MAP.get(status) or Status(status)
+        step_type = _STEP_TYPE_MAP.get(step_type) or StepType(step_type)
 
         event = AgentStepEvent(
-            event_id=str(uuid.uuid4()),
+            event_id=_new_event_id(),
             project_id=self.project_id,
-            run_id=run_id,
-            timestamp=time.strftime('%Y-%m-%dT%H:%M:%S.%fZ', time.gmtime()),
+            run_id=run_id or _run_id_var.get() or _new_event_id(),
+            timestamp=_iso_now(),
             step_number=step_number,
             step_name=step_name,
             step_type=step_type,
@@ -407,8 +844,8 @@ class WatchLLMClient:
             latency_ms=latency_ms,
             status=status,
             error=error,
-            tags=tags or [],
-            user_id=user_id,
+            tags=tags or _tags_var.get() or [],
+            user_id=user_id or _user_id_var.get(),
             release=release,
             env=self.environment
         )
@@ -417,7 +854,7 @@ class WatchLLMClient:
 
     def log_error(
         self,
-        run_id: str,
+        run_id: Optional[str],
         error: Union[Exception, Dict[str, str]],
         context: Optional[Dict[str, Any]] = None,
         tags: Optional[List[str]] = None,
@@ -429,21 +866,22 @@ class WatchLLMClient:
             error_dict = {
                 "message": str(error),
                 "type": type(error).__name__,
-                "stack": traceback.format_exc()
+                # format_exc() is "NoneType: None" outside an except block
+                "stack": "".join(traceback.format_exception(type(error), error, error.__traceback__))
             }
         else:
             error_dict = error
 
         event = ErrorEvent(
-            event_id=str(uuid.uuid4()),
+            event_id=_new_event_id(),
             project_id=self.project_id,
-            run_id=run_id,
-            timestamp=time.strftime('%Y-%m-%dT%H:%M:%S.%fZ', time.gmtime()),
+            run_id=run_id or _run_id_var.get() or _new_event_id(),
+            timestamp=_iso_now(),
             error=error_dict,
             context=context or {},
             stack_trace=error_dict.get("stack"),
-            tags=tags or [],
-            user_id=user_id,
+            tags=tags or _tags_var.get() or [],
+            user_id=user_id or _user_id_var.get(),
             release=release,
             env=self.environment
         )
@@ -452,7 +890,7 @@ class WatchLLMClient:
 
     def log_assertion_failure(
         self,
-        run_id: str,
+        run_id: Optional[str],
         assertion_name: str,
         assertion_type: Union[AssertionType, str],
         expected: Any,
@@ -463,23 +901,21 @@ class WatchLLMClient:
         release: Optional[str] = None
     ):
         """Log an assertion failure event"""
-        if isinstance(assertion_type, str):
-            assertion_type = AssertionType(assertion_type)
-        if isinstance(severity, str):
-            severity = Severity(severity)
+        assertion_type = _ASSERTION_TYPE_MAP.get(assertion_type) or AssertionType(assertion_type)
+        severity = _SEVERITY_MAP.get(severity) or Severity(severity)
 
         event = AssertionFailedEvent(
-            event_id=str(uuid.uuid4()),
+            event_id=_new_event_id(),
             project_id=self.project_id,
-            run_id=run_id,
-            timestamp=time.strftime('%Y-%m-%dT%H:%M:%S.%fZ', time.gmtime()),
+            run_id=run_id or _run_id_var.get() or _new_event_id(),
+            timestamp=_iso_now(),
             assertion_name=assertion_name,
             assertion_type=assertion_type,
             expected=expected,
             actual=actual,
             severity=severity,
-            tags=tags or [],
-            user_id=user_id,
+            tags=tags or _tags_var.get() or [],
+            user_id=user_id or _user_id_var.get(),
             release=release,
             env=self.environment
         )
@@ -488,7 +924,7 @@ class WatchLLMClient:
 
     def log_hallucination_detection(
         self,
-        run_id: str,
+        run_id: Optional[str],
         detection_method: Union[DetectionMethod, str],
         confidence_score: float,
         flagged_content: str,
@@ -499,21 +935,20 @@ class WatchLLMClient:
         release: Optional[str] = None
     ):
         """Log a hallucination detection event"""
-        if isinstance(detection_method, str):
-            detection_method = DetectionMethod(detection_method)
+        detection_method = _DETECTION_METHOD_MAP.get(detection_method) or DetectionMethod(detection_method)
 
         event = HallucinationDetectedEvent(
-            event_id=str(uuid.uuid4()),
+            event_id=_new_event_id(),
             project_id=self.project_id,
-            run_id=run_id,
-            timestamp=time.strftime('%Y-%m-%dT%H:%M:%S.%fZ', time.gmtime()),
+            run_id=run_id or _run_id_var.get() or _new_event_id(),
+            timestamp=_iso_now(),
             detection_method=detection_method,
             confidence_score=confidence_score,
             flagged_content=flagged_content,
             ground_truth=ground_truth,
             recommendations=recommendations or [],
-            tags=tags or [],
-            user_id=user_id,
+            tags=tags or _tags_var.get() or [],
+            user_id=user_id or _user_id_var.get(),
             release=release,
             env=self.environment
         )
@@ -522,7 +957,7 @@ class WatchLLMClient:
 
     def log_performance_alert(
         self,
-        run_id: str,
+        run_id: Optional[str],
         alert_type: Union[AlertType, str],
         threshold: float,
         actual_value: float,
@@ -533,21 +968,20 @@ class WatchLLMClient:
         release: Optional[str] = None
     ):
         """Log a performance alert event"""
-        if isinstance(alert_type, str):
-            alert_type = AlertType(alert_type)
+        alert_type = _ALERT_TYPE_MAP.get(alert_type) or AlertType(alert_type)
 
         event = PerformanceAlertEvent(
-            event_id=str(uuid.uuid4()),
+            event_id=_new_event_id(),
             project_id=self.project_id,
-            run_id=run_id,
-            timestamp=time.strftime('%Y-%m-%dT%H:%M:%S.%fZ', time.gmtime()),
+            run_id=run_id or _run_id_var.get() or _new_event_id(),
+            timestamp=_iso_now(),
             alert_type=alert_type,
             threshold=threshold,
             actual_value=actual_value,
             window_minutes=window_minutes,
             affected_models=affected_models or [],
-            tags=tags or [],
-            user_id=user_id,
+            tags=tags or _tags_var.get() or [],
+            user_id=user_id or _user_id_var.get(),
             release=release,
             env=self.environment
         )
@@ -555,18 +989,56 @@ class WatchLLMClient:
         self._queue_event(event)
 
     def flush(self):
-        """Manually flush all queued events"""
-        events = []
-        
-        # Collect all events from queue
-        while not self._event_queue.empty():
-            try:
-                event = self._event_queue.get_nowait()
-                events.append(event)
-            except queue.Empty:
-                break
+        """Manually flush all queued events, one POST per batch_size events"""
+        # Swap the buffer out in one critical section; later events wait for the next flush
+        with self._lock:
+            if not self._buf:
+                return
+            events, self._buf = list(self._buf), collections.deque()
+
+        events = self._serialize_events(events)
+        chunks = [events[i:i + self.batch_size] for i in range(0, len(events), self.batch_size)]
+        if len(chunks) == 1 or self._async_transport_running():
+            for chunk in chunks:
+                self._send_batch(chunk)
+            return
 
-        if not events:
+        # Sync transport: POST the batches in parallel; a failed batch re-queues only itself
+        executor = self._get_executor()
+        futures = [executor.submit(self._send_batch, chunk) for chunk in chunks]
+        errors = [future.exception() for future in futures]
+        for error in errors:
+            if error is not None:
+                raise error
+
+    def _async_transport_running(self) -> bool:
+        """Whether batches can be handed to the client's event loop"""
+        return self._use_async and self._loop is not None and self._loop.is_running()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """Get or create the thread pool used for parallel sync sends"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_send_workers,
+                thread_name_prefix="watchllm-send"
+            )
+        return self._executor
+
+    def _forget_send(self, future):
+        """Done-callback dropping a finished async send from _pending_sends"""
+        with self._pending_lock:
+            self._pending_sends.discard(future)
+
+    def _send_batch(self, events: List[bytes]):
+        """Send one batch on the async transport if running, else synchronously"""
+        if self._async_transport_running():
+            # Hand the batch to the loop and return without waiting on the network
+            future = asyncio.run_coroutine_threadsafe(
+                self._async_send_events_batch(events), self._loop
+            )
+            with self._pending_lock:
+                self._pending_sends.add(future)
+            future.add_done_callback(self._forget_send)
             return
 
         try:
@@ -574,26 +1046,75 @@ class WatchLLMClient:
             self._send_events_batch(events)
         except Exception as e:
             # Re-queue events on failure
-            for event in events:
-                self._event_queue.put(event)
+            self._requeue_events(events)
             raise e
 
-    def _send_events_batch(self, events: List[Dict[str, Any]]):
+    def _encode_batch(self, events: List[bytes]):
+        """Join serialized events into a batch body, compressing it if enabled; returns (body, headers)"""
+        if self.wire_format == "msgpack":
+            # {"events": [...]} with the already packed events spliced into the array
+            packer = msgpack.Packer(use_bin_type=True)
+            body = (
+                packer.pack_map_header(1)
+                + packer.pack("events")
+                + packer.pack_array_header(len(events))
+                + b"".join(events)
+            )
+        else:
+            body = b'{"events":[' + b",".join(events) + b"]}"
+
+        if self.compression == "gzip":
+            body = gzip.compress(body, compresslevel=3)
+        elif self.compression == "zstd":
+            body = zstandard.ZstdCompressor(level=3).compress(body)
+
+        return body, self._batch_headers
+
+    def _send_events_batch(self, events: List[bytes]):
         """Send a batch of events to the API"""
         session = self._get_session()
+        body, headers = self._encode_batch(events)
         
         response = session.post(
-            f"{self.base_url}/events/batch",
-            json={"events": events},
-            headers={
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            },
+            self._events_batch_url,
+            data=body,
+            headers=headers,
             timeout=self.timeout
         )
 
         response.raise_for_status()
-        return response.json()
+        return _json_loads(response.content)
+
+    async def _async_send_events_batch(self, events: List[bytes]):
+        """Send a batch of events to the API from the client loop"""
+        session = self._get_async_session()
+        try:
+            body, headers = self._encode_batch(events)
+            async with session.post(
+                self._events_batch_url,
+                data=body,
+                headers=headers,
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            ) as response:
+                response.raise_for_status()
+                return _json_loads(await response.read())
+        except Exception as e:
+            # Re-queue events on failure and retry them one interval later; an idle worker is
+            # only woken by new events, and waking it now would retry a full batch at once
+            self._requeue_events(events)
+            self._loop.call_later(self.flush_interval_seconds, self._wake_async_flush_worker)
+            print(f"Failed to send events batch: {e}")
+
+    async def _shutdown_async(self):
+        """Stop the periodic flush task and close the aiohttp session"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+        if self._async_session is not None:
+            await self._async_session.close()
 
     def get_events(
         self,
@@ -626,17 +1147,14 @@ class WatchLLMClient:
             query["text_search"] = text_search
 
         response = session.post(
-            f"{self.base_url}/events/query",
+            self._events_query_url,
             json=query,
-            headers={
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            },
+            headers=self._auth_headers,
             timeout=self.timeout
         )
 
         response.raise_for_status()
-        return response.json()
+        return _json_loads(response.content)
 
     def get_metrics(
         self,
@@ -653,45 +1171,57 @@ class WatchLLMClient:
             params["date_to"] = date_to
 
         response = session.get(
-            f"{self.base_url}/projects/{self.project_id}/metrics",
+            self._metrics_url,
             params=params,
-            headers={
-                "Authorization": f"Bearer {self.api_key}"
-            },
+            headers=self._auth_header,
             timeout=self.timeout
         )
 
         response.raise_for_status()
-        return response.json()
+        return _json_loads(response.content)
 
     def _calculate_cost_estimate(self, model: str, tokens_input: int, tokens_output: int) -> float:
         """Calculate cost estimate for a model call"""
-        # Simplified pricing model
-        pricing = {
-            "gpt-4o": {"input": 0.005, "output": 0.015},
-            "gpt-4o-mini": {"input": 0.00015, "output": 0.0006},
-            "gpt-3.5-turbo": {"input": 0.0005, "output": 0.0015},
-            "claude-3-5-sonnet-20241022": {"input": 0.003, "output": 0.015},
-            "claude-3-haiku-20240307": {"input": 0.00025, "output": 0.00125},
-        }
-
-        model_pricing = pricing.get(model, {"input": 0.001, "output": 0.002})
-        return (tokens_input * model_pricing["input"] + tokens_output * model_pricing["output"]) / 1000
+        input_price, output_price = _get_pricing(model)
+        return tokens_input * input_price + tokens_output * output_price
 
     def close(self):
         """Close the client and clean up resources"""
         self._shutdown_event.set()
+        with self._cv:
+            self._cv.notify_all()
         
         # Flush remaining events
         try:
             self.flush()
         except Exception:
             pass  # Ignore errors during shutdown
+
+        # Let in-flight async sends finish, then stop the loop
+        if self._loop is not None and self._loop.is_running():
+            with self._pending_lock:
+                pending = list(self._pending_sends)
+            for future in pending:
+                try:
+                    future.result(timeout=self.timeout)
+                except Exception:
+                    pass
+            try:
+                asyncio.run_coroutine_threadsafe(self._shutdown_async(), self._loop).result(timeout=5)
+            except Exception:
+                pass
+            self._loop.call_soon_threadsafe(self._loop.stop)
         
         # Wait for flush thread to finish
         if self._flush_thread and self._flush_thread.is_alive():
             self._flush_thread.join(timeout=5)
         
+        if self._loop is not None and not self._loop.is_running():
+            self._loop.close()
+
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
         # Close HTTP session
         if self._session:
             self._session.close()
@@ -711,8 +1241,3 @@ def create_client(
 ) -> WatchLLMClient:
     """Create a new WatchLLM client"""
     return WatchLLMClient(api_key, project_id, **kwargs)
-
-
-# Import required modules
-import random
-import traceback
@@ -3,21 +3,50 @@ WatchLLM - Python SDK for AI Observability
 Provides a simple interface for logging AI events and metrics
 """
 
+import collections
+import functools
+import gzip
 import json
+import math
+import os
+import re
+import socket
+import sys
 import time
-import datetime
-import uuid
-from typing import Dict, List, Optional, Any, Union
-from dataclasses import dataclass, asdict
+from typing import Callable, Deque, Dict, List, Optional, Any, Sequence, Tuple, Union
+from dataclasses import dataclass, field, fields, is_dataclass
 from enum import Enum
 import threading
-import queue
-import requests
-from requests.adapters import HTTPAdapter
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+import urllib3
 from urllib3.util.retry import Retry
 import random
 import traceback
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+try:
+    import hyperscan
+    HYPERSCAN_AVAILABLE = True
+except ImportError:
+    HYPERSCAN_AVAILABLE = False
+
+try:
+    import re2
+    RE2_AVAILABLE = True
+except ImportError:
+    RE2_AVAILABLE = False
+
 
 class EventType(Enum):
     PROMPT_CALL = "prompt_call"
@@ -72,30 +101,255 @@ class Severity(Enum):
     CRITICAL = "critical"
 
 
-@dataclass
+# PII patterns run over serialized JSON: a match may start right after an escape
+# such as \n, \u30e1 or an escaped backslash, but never on an escaped character itself
+_EMAIL_PATTERN = rb'[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b'
+# Whitespace is spelled out because RE2's \s leaves out \v
+_CC_PATTERN = rb'(?:\d{4}[-\t\n\x0b\f\r ]?){3}\d{4}\b'
+_PII_PATTERNS = (_EMAIL_PATTERN, _CC_PATTERN)
+_PII_REPLACEMENTS = (b'[REDACTED_EMAIL]', b'[REDACTED_CC]')
+
+# RE2 and Hyperscan have no lookbehind, so each pattern matches behind an explicit
+# escape prefix (after any escaped backslashes), behind escaped backslashes alone, or
+# at a word boundary; the PII itself is the group that took part. Matches that start
+# on an escaped character are discarded in _pii_spans. re runs the same patterns, so
+# both agree exactly.
+_JSON_ESCAPE = rb'\\(?:[nrtbf]|u[0-9a-fA-F]{4})'
+_ESCAPED_BACKSLASHES = rb'(?:\\\\)'
+_BACKSLASH = ord('\\')
+
+
+def _span_pattern(pattern: bytes) -> bytes:
+    group = b'(' + pattern + b')'
+    return (
+        _ESCAPED_BACKSLASHES + b'*' + _JSON_ESCAPE + group
+        + b'|' + _ESCAPED_BACKSLASHES + b'+' + group
+        + rb'|\b' + group
+    )
+
+
+_RE_PATTERNS = tuple(re.compile(_span_pattern(p)) for p in _PII_PATTERNS)
+_RE2_PATTERNS = tuple(re2.compile(_span_pattern(p)) for p in _PII_PATTERNS) if RE2_AVAILABLE else None
+
+
+def _compile_hyperscan_db():
+    if not HYPERSCAN_AVAILABLE:
+        return None
+    # A superset of _span_pattern's starts, whatever the backslashes before them
+    prefixes = (rb'\b', _JSON_ESCAPE, rb'\\')
+    expressions = [prefix + p for prefix in prefixes for p in _PII_PATTERNS]
+    try:
+        db = hyperscan.Database()
+        db.compile(
+            expressions=expressions,
+            ids=list(range(len(expressions))),
+            elements=len(expressions),
+            flags=[hyperscan.HS_FLAG_SINGLEMATCH] * len(expressions),
+        )
+        return db
+    except hyperscan.error:
+        return None
+
+
+_HS_DB = _compile_hyperscan_db()
+_hs_scratch = threading.local()
+
+
+def _stop_scan(pattern_id, start, end, flags, context):
+    return True
+
+
+def _hyperscan_may_match(blob: bytes) -> bool:
+    """Whether any pattern could match, in one linear scan that stops at the first hit.
+
+    Hyperscan reports every overlapping match rather than re's leftmost-first ones, so it
+    only rules out clean bodies (the common case); spans always come from _pii_spans.
+    """
+    scratch = getattr(_hs_scratch, "scratch", None)
+    if scratch is None:
+        # Scratch space cannot be shared between concurrent scans
+        scratch = _hs_scratch.scratch = hyperscan.Scratch(_HS_DB)
+    try:
+        _HS_DB.scan(blob, match_event_handler=_stop_scan, scratch=scratch)
+    except hyperscan.ScanTerminated:
+        return True
+    return False
+
+
+def _is_escaped(blob: bytes, pos: int) -> bool:
+    # An odd run of backslashes before pos escapes the byte at pos
+    run = 0
+    while run < pos and blob[pos - run - 1] == _BACKSLASH:
+        run += 1
+    return run % 2 == 1
+
+
+def _pii_spans(patterns: Sequence[Any], blob: bytes) -> List[List[int]]:
+    spans = []
+    for kind, pattern in enumerate(patterns):
+        for m in pattern.finditer(blob):
+            if _is_escaped(blob, m.start()):
+                continue
+            spans.append([m.start(m.lastindex), m.end(), kind])
+    return spans
+
+
+def _splice_redactions(blob: bytes, spans: List[List[int]]) -> bytes:
+    if not spans:
+        return blob
+    # An email and a card number can overlap; collapse them into one span
+    spans.sort()
+    merged = [spans[0]]
+    for span in spans[1:]:
+        last = merged[-1]
+        if span[0] < last[1]:
+            last[1] = max(last[1], span[1])
+        else:
+            merged.append(span)
+
+    out = bytearray()
+    pos = 0
+    for start, end, kind in merged:
+        out += blob[pos:start]
+        out += _PII_REPLACEMENTS[kind]
+        pos = end
+    out += blob[pos:]
+    return bytes(out)
+
+
+# (epoch second, "YYYY-MM-DDTHH:MM:SS"), replaced as one tuple so readers never see a torn pair;
+# two threads racing on a new second just format it twice
+_TS_CACHE = (-1, "")
+
+
+def _utc_timestamp() -> str:
+    global _TS_CACHE
+    seconds, ns = divmod(time.time_ns(), 1_000_000_000)
+    cached_second, prefix = _TS_CACHE
+    if cached_second != seconds:
+        prefix = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(seconds))
+        _TS_CACHE = (seconds, prefix)
+    return f"{prefix}.{ns // 1000:06d}Z"
+
+
+def _new_event_id() -> str:
+    # Hyphenated UUID4 straight from os.urandom, without building a uuid.UUID
+    b = bytearray(os.urandom(16))
+    b[6] = (b[6] & 0x0F) | 0x40
+    b[8] = (b[8] & 0x3F) | 0x80
+    h = b.hex()
+    return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+
+
+def _always_true() -> bool:
+    return True
+
+
+def _always_false() -> bool:
+    return False
+
+
+def _enum_value(value: Any) -> Any:
+    return value.value if isinstance(value, Enum) else value
+
+
+def _make_encoder(cls: type) -> Callable[[Any], Dict[str, Any]]:
+    """Generate a function returning an instance's fields as a dict, specialized for cls.
+
+    The field list is resolved once here instead of being reflected on every event.
+    """
+    items = ", ".join(f"{f.name!r}: ev.{f.name}" for f in fields(cls))
+    namespace: Dict[str, Any] = {}
+    exec(f"def encode(ev):\n    return {{{items}}}\n", namespace)
+    encoder = namespace["encode"]
+    encoder.__qualname__ = encoder.__name__ = f"_encode_{cls.__name__}"
+    return encoder
+
+
+_ENCODERS: Dict[type, Callable[[Any], Dict[str, Any]]] = {}
+
+
+class _LazyStack:
+    """An exception's formatted traceback, rendered on first str() (i.e. when serialized).
+
+    Events dropped by sampling never pay for walking and formatting the stack.
+    """
+
+    __slots__ = ("_error", "_limit", "_text")
+
+    def __init__(self, error: BaseException, limit: Optional[int] = None):
+        self._error = error
+        self._limit = limit
+        self._text: Optional[str] = None
+
+    def __str__(self) -> str:
+        if self._text is None:
+            error = self._error
+            self._text = "".join(traceback.format_exception(
+                type(error), error, error.__traceback__, limit=self._limit
+            ))
+        return self._text
+
+
+def _dataclass_default(o: Any) -> Any:
+    encoder = _ENCODERS.get(type(o))
+    if encoder is not None:
+        return encoder(o)
+    if isinstance(o, _LazyStack):
+        return str(o)
+    if is_dataclass(o):
+        encoder = _ENCODERS[type(o)] = _make_encoder(type(o))
+        return encoder(o)
+    if isinstance(o, Enum):
+        return o.value
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+def _dumps(obj: Any) -> bytes:
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj, default=_dataclass_default, option=orjson.OPT_NON_STR_KEYS)
+    encoder = _ENCODERS.get(type(obj))
+    if encoder is not None:
+        obj = encoder(obj)
+    # Like orjson, emit non-ASCII text as UTF-8 rather than \u escapes
+    return json.dumps(
+        obj, default=_dataclass_default, separators=(",", ":"), ensure_ascii=False
+    ).encode("utf-8")
+
+
+def _hostname() -> str:
+    try:
+        return socket.gethostname() or "unknown"
+    except OSError:
+        return "unknown"
+
+
+# Identical for every event, so one shared dict is reused rather than rebuilt per event.
+# It is not a MappingProxyType because orjson and json only serialize real dicts.
+_CLIENT_META: Dict[str, Any] = {
+    "sdk_version": "0.1.0",
+    "platform": "python",
+    "hostname": _hostname()
+}
+
+# Slots drop the per-instance __dict__ on Python versions whose dataclasses support them
+_DATACLASS_OPTIONS = {"slots": True} if sys.version_info >= (3, 10) else {}
+
+
+@dataclass(**_DATACLASS_OPTIONS)
 class BaseEvent:
     event_id: str
     project_id: str
     run_id: str
     timestamp: str
     user_id: Optional[str] = None
-    tags: List[str] = None
+    tags: List[str] = field(default_factory=list)
     release: Optional[str] = None
     env: str = "development"
-    client: Dict[str, Any] = None
-
-    def __post_init__(self):
-        if self.tags is None:
-            self.tags = []
-        if self.client is None:
-            self.client = {
-                "sdk_version": "0.1.0",
-                "platform": "python",
-                "hostname": "unknown"
-            }
+    client: Dict[str, Any] = field(default_factory=lambda: _CLIENT_META)
 
 
-@dataclass
+@dataclass(**_DATACLASS_OPTIONS)
 class ToolCallEvent:
     tool_name: str
     input: Dict[str, Any]
@@ -105,12 +359,8 @@ class ToolCallEvent:
     tool_id: Optional[str] = None
     error: Optional[Dict[str, str]] = None
 
-    def __post_init__(self):
-        if isinstance(self.status, Status):
-            self.status = self.status.value
-
 
-@dataclass
+@dataclass(**_DATACLASS_OPTIONS)
 class PromptCallEvent(BaseEvent):
     event_type: str = EventType.PROMPT_CALL.value
     prompt: str = ""
@@ -121,114 +371,91 @@ class PromptCallEvent(BaseEvent):
     tokens_output: int = 0
     cost_estimate_usd: float = 0.0
     response: str = ""
-    response_metadata: Dict[str, Any] = None
-    tool_calls: List[ToolCallEvent] = None
-    status: Union[Status, str] = Status.SUCCESS
+    response_metadata: Dict[str, Any] = field(default_factory=dict)
+    tool_calls: List[ToolCallEvent] = field(default_factory=list)
+    status: Union[Status, str] = Status.SUCCESS.value
     error: Optional[Dict[str, str]] = None
     latency_ms: int = 0
 
-    def __post_init__(self):
-        super().__post_init__()
-        if self.response_metadata is None:
-            self.response_metadata = {}
-        if self.tool_calls is None:
-            self.tool_calls = []
-        if isinstance(self.status, Status):
-            self.status = self.status.value
 
-
-@dataclass
+@dataclass(**_DATACLASS_OPTIONS)
 class AgentStepEvent(BaseEvent):
     event_type: str = EventType.AGENT_STEP.value
     step_number: int = 0
     step_name: str = ""
-    step_type: Union[StepType, str] = StepType.REASONING
-    input_data: Dict[str, Any] = None
-    output_data: Dict[str, Any] = None
+    step_type: Union[StepType, str] = StepType.REASONING.value
+    input_data: Dict[str, Any] = field(default_factory=dict)
+    output_data: Dict[str, Any] = field(default_factory=dict)
     reasoning: Optional[str] = None
-    context: Dict[str, Any] = None
+    context: Dict[str, Any] = field(default_factory=dict)
     latency_ms: int = 0
-    status: Union[Status, str] = Status.SUCCESS
+    status: Union[Status, str] = Status.SUCCESS.value
     error: Optional[Dict[str, str]] = None
 
-    def __post_init__(self):
-        super().__post_init__()
-        if self.input_data is None:
-            self.input_data = {}
-        if self.output_data is None:
-            self.output_data = {}
-        if self.context is None:
-            self.context = {}
-        if isinstance(self.status, Status):
-            self.status = self.status.value
-        if isinstance(self.step_type, StepType):
-            self.step_type = self.step_type.value
-
-
-@dataclass
+
+@dataclass(**_DATACLASS_OPTIONS)
 class ErrorEvent(BaseEvent):
     event_type: str = EventType.ERROR.value
-    error: Dict[str, str] = None
-    context: Dict[str, Any] = None
+    error: Dict[str, str] = field(default_factory=dict)
+    context: Dict[str, Any] = field(default_factory=dict)
     stack_trace: Optional[str] = None
 
-    def __post_init__(self):
-        super().__post_init__()
-        if self.error is None:
-            self.error = {}
-        if self.context is None:
-            self.context = {}
 
-
-@dataclass
+@dataclass(**_DATACLASS_OPTIONS)
 class AssertionFailedEvent(BaseEvent):
     event_type: str = EventType.ASSERTION_FAILED.value
     assertion_name: str = ""
-    assertion_type: Union[AssertionType, str] = AssertionType.CUSTOM
+    assertion_type: Union[AssertionType, str] = AssertionType.CUSTOM.value
     expected: Any = None
     actual: Any = None
-    severity: Union[Severity, str] = Severity.MEDIUM
-
-    def __post_init__(self):
-        super().__post_init__()
-        if isinstance(self.assertion_type, AssertionType):
-            self.assertion_type = self.assertion_type.value
-        if isinstance(self.severity, Severity):
-            self.severity = self.severity.value
+    severity: Union[Severity, str] = Severity.MEDIUM.value
 
 
-@dataclass
+@dataclass(**_DATACLASS_OPTIONS)
 class HallucinationDetectedEvent(BaseEvent):
     event_type: str = EventType.HALLUCINATION_DETECTED.value
-    detection_method: Union[DetectionMethod, str] = DetectionMethod.HEURISTIC
+    detection_method: Union[DetectionMethod, str] = DetectionMethod.HEURISTIC.value
     confidence_score: float = 0.0
     flagged_content: str = ""
     ground_truth: Optional[str] = None
-    recommendations: List[str] = None
-
-    def __post_init__(self):
-        super().__post_init__()
-        if self.recommendations is None:
-            self.recommendations = []
-        if isinstance(self.detection_method, DetectionMethod):
-            self.detection_method = self.detection_method.value
+    recommendations: List[str] = field(default_factory=list)
 
 
-@dataclass
+@dataclass(**_DATACLASS_OPTIONS)
 class PerformanceAlertEvent(BaseEvent):
     event_type: str = EventType.PERFORMANCE_ALERT.value
-    alert_type: Union[AlertType, str] = AlertType.COST_SPIKE
+    alert_type: Union[AlertType, str] = AlertType.COST_SPIKE.value
     threshold: float = 0.0
     actual_value: float = 0.0
     window_minutes: int = 0
-    affected_models: List[str] = None
+    affected_models: List[str] = field(default_factory=list)
 
-    def __post_init__(self):
-        super().__post_init__()
-        if self.affected_models is None:
-            self.affected_models = []
-        if isinstance(self.alert_type, AlertType):
-            self.alert_type = self.alert_type.value
+
+for _event_cls in (
+    ToolCallEvent, PromptCallEvent, AgentStepEvent, ErrorEvent,
+    AssertionFailedEvent, HallucinationDetectedEvent, PerformanceAlertEvent,
+):
+    _ENCODERS[_event_cls] = _make_encoder(_event_cls)
+del _event_cls
+
+
+# (input, output) USD per 1K tokens
+_PRICING = {
+    "gpt-4o": (0.005, 0.015),
+    "gpt-4o-mini": (0.00015, 0.0006),
+    "gpt-3.5-turbo": (0.0005, 0.0015),
+    "gpt-4-turbo": (0.01, 0.03),
+    "claude-3-5-sonnet-20241022": (0.003, 0.015),
+}
+
+
+@functools.lru_cache(maxsize=256)
+def _model_price(model: str) -> Tuple[float, float]:
+    # Model names repeat heavily, so the table lookup and fallback run once per name
+    price = _PRICING.get(model)
+    if price is None:
+        price = (0.03, 0.06) if "gpt-4" in model else (0.001, 0.002)
+    return price
 
 
 class WatchLLMClient:
@@ -236,6 +463,10 @@ class WatchLLMClient:
     Main client for WatchLLM AI observability
     """
 
+    _MAX_EVENTS_PER_REQUEST = 100
+    _MIN_COMPRESS_BYTES = 256
+    _MAX_IN_FLIGHT_SENDS = 8
+
     def __init__(
         self,
         api_key: str,
@@ -246,22 +477,72 @@ class WatchLLMClient:
         redact_pii: bool = True,
         batch_size: int = 10,
         flush_interval_seconds: int = 5,
-        timeout: int = 30
+        timeout: int = 30,
+        adaptive: bool = False,
+        compression: Optional[str] = None,
+        max_send_workers: int = 2,
+        stack_trace_max_frames: Optional[int] = 20,
+        max_queue_size: int = 1000
     ):
         self.api_key = api_key
         self.project_id = project_id
         self.base_url = base_url.rstrip('/')
         self.environment = environment
         self.sample_rate = sample_rate
+        # Pick the sampler once: the default rate of 1.0 then costs no RNG call or compare per event
+        if sample_rate >= 1.0:
+            self._sample: Callable[[], bool] = _always_true
+        elif sample_rate <= 0:
+            self._sample = _always_false
+        else:
+            rng = random.Random()
+            self._sample = lambda rng=rng, rate=sample_rate: rng.random() < rate
         self.redact_pii = redact_pii
         self.batch_size = batch_size
         self.flush_interval_seconds = flush_interval_seconds
         self.timeout = timeout
-
-        self._event_queue = queue.Queue(maxsize=1000)
+        self.adaptive = adaptive
+        self.max_send_workers = max_send_workers
+        self.stack_trace_max_frames = stack_trace_max_frames
+
+        # Batch body compression: None, "gzip" or "zstd" (the server must accept it)
+        if compression not in (None, "gzip", "zstd"):
+            raise ValueError(f"Unsupported compression: {compression}")
+        if compression == "zstd" and not ZSTD_AVAILABLE:
+            raise ImportError(
+                "zstandard is not installed. Install it with: "
+                "pip install zstandard"
+            )
+        self.compression = compression
+
+        # adaptive=True: EWMAs of event inter-arrival time and per-flush POST time (seconds)
+        self._ewma_interarrival: Optional[float] = None
+        self._ewma_flush_cost: Optional[float] = None
+        self._last_arrival: Optional[float] = None
+
+        # Queue of (event count, blob) entries holding at most max_queue_size events;
+        # appending past the bound evicts the oldest entries
+        self.max_queue_size = max_queue_size
+        self.dropped_events = 0
+        self._events: Deque[Tuple[int, bytes]] = collections.deque()
+        self._queued_events = 0
+        self._events_lock = threading.Lock()
         self._shutdown_event = threading.Event()
+        self._wakeup = threading.Event()
         self._flush_thread = None
-        self._session = None
+        self._pool = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._in_flight: set = set()
+        self._in_flight_lock = threading.Lock()
+        # The endpoint and headers are fixed for the client's lifetime, so build them once
+        self._endpoint = f"{self.base_url}/events/batch"
+        self._headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        }
+        self._compressed_headers = dict(self._headers)
+        if compression is not None:
+            self._compressed_headers["Content-Encoding"] = compression
 
         self._start_flush_thread()
 
@@ -270,71 +551,114 @@ class WatchLLMClient:
         self._flush_thread.start()
 
     def _flush_worker(self):
-        last_flush_time = time.time()
-        
         while not self._shutdown_event.is_set():
             try:
-                current_time = time.time()
-                queue_size = self._event_queue.qsize()
-                
-                time_since_flush = current_time - last_flush_time
-                should_flush = (
-                    queue_size >= self.batch_size or 
-                    (queue_size > 0 and time_since_flush >= self.flush_interval_seconds)
-                )
-
-                if should_flush:
-                    self.flush()
-                    last_flush_time = time.time()
-                
-                time.sleep(1.0)
-                
+                # Sleep without a timeout while there is nothing to send; the first queued
+                # entry wakes the worker
+                while not self._events and not self._shutdown_event.is_set():
+                    self._wakeup.wait()
+                    self._wakeup.clear()
+                if self._shutdown_event.is_set():
+                    break
+
+                # Then wait for the flush deadline, cut short once a batch is full
+                timeout = self._flush_timeout()
+                if timeout > 0 and self._queued_events < self.batch_size:
+                    self._wakeup.wait(timeout=timeout)
+                    self._wakeup.clear()
+                if self._shutdown_event.is_set():
+                    break
+
+                self.flush(wait=False)
+
             except Exception as e:
                 print(f"[WatchLLM] Error in flush worker: {e}")
 
-    def _get_session(self) -> requests.Session:
-        if self._session is None:
-            self._session = requests.Session()
-            retry_strategy = Retry(
-                total=3,
-                backoff_factor=1,
-                status_forcelist=[408, 429, 500, 502, 503, 504],
+    _EWMA_ALPHA = 0.2
+
+    def _ewma(self, current: Optional[float], sample: float) -> float:
+        if current is None:
+            return sample
+        return self._EWMA_ALPHA * sample + (1 - self._EWMA_ALPHA) * current
+
+    def _flush_timeout(self) -> float:
+        # Ski-rental timer: with arrival rate lambda and fixed flush cost F0 the optimal wait
+        # is sqrt(2 * F0 / lambda); above lambda = 2 / F0 waiting never pays, so flush greedily
+        if not self.adaptive or not self._ewma_interarrival or not self._ewma_flush_cost:
+            return self.flush_interval_seconds
+        rate = 1.0 / self._ewma_interarrival
+        flush_cost = self._ewma_flush_cost
+        if rate > 2.0 / flush_cost:
+            return 0.0
+        return max(0.0, min(self.flush_interval_seconds, math.sqrt(2 * flush_cost / rate)))
+
+    def _get_pool(self) -> urllib3.PoolManager:
+        # urllib3 directly: keep-alive and retries without the per-call requests.Session layers
+        if self._pool is None:
+            self._pool = urllib3.PoolManager(
+                num_pools=4,
+                maxsize=64,
+                block=False,
+                # Batches are POSTed, so only retry where the server cannot have ingested
+                # them: connection failures and explicit 408/429/503 rejections. A read
+                # timeout or a 5xx may follow a successful write and would duplicate events.
+                retries=Retry(
+                    total=3,
+                    connect=3,
+                    read=0,
+                    other=0,
+                    backoff_factor=1,
+                    status_forcelist=[408, 429, 503],
+                    allowed_methods=None,
+                    respect_retry_after_header=True,
+                ),
             )
-            adapter = HTTPAdapter(max_retries=retry_strategy)
-            self._session.mount("http://", adapter)
-            self._session.mount("https://", adapter)
-        return self._session
-
-    def _should_sample(self) -> bool:
-        return self.sample_rate >= 1.0 or (self.sample_rate > 0 and random.random() < self.sample_rate)
+        return self._pool
 
-    def _redact_pii(self, event_dict: Dict[str, Any]) -> Dict[str, Any]:
+    def _redact_bytes(self, blob: bytes) -> bytes:
         if not self.redact_pii:
-            return event_dict
+            return blob
 
-        import re
-        event_str = json.dumps(event_dict)
-        
-        event_str = re.sub(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b', '[REDACTED_EMAIL]', event_str)
-        event_str = re.sub(r'\b(?:\d{4}[-\s]?){3}\d{4}\b', '[REDACTED_CC]', event_str)
-        
-        return json.loads(event_str)
+        if _HS_DB is not None and not _hyperscan_may_match(blob):
+            return blob
+        # RE2 scans in linear time; re gives the same spans
+        return _splice_redactions(blob, _pii_spans(_RE2_PATTERNS or _RE_PATTERNS, blob))
 
     def _get_timestamp(self) -> str:
-        return datetime.datetime.now(datetime.timezone.utc).isoformat().replace("+00:00", "Z")
+        return _utc_timestamp()
 
     def _queue_event(self, event: BaseEvent):
-        if not self._should_sample():
+        if not self._sample():
             return
 
+        if self.adaptive:
+            now = time.perf_counter()
+            if self._last_arrival is not None:
+                self._ewma_interarrival = self._ewma(self._ewma_interarrival, now - self._last_arrival)
+            self._last_arrival = now
+
         try:
-            event_dict = asdict(event)
-            event_dict = self._redact_pii(event_dict)
-            self._event_queue.put(event_dict, block=False)
-        except queue.Full:
-            print("[WatchLLM] Event queue full, dropping event")
+            blob = _dumps(event)
         except Exception as e:
             print(f"[WatchLLM] Failed to queue event: {e}")
+            return
+
+        with self._events_lock:
+            self._append_entry(1, blob)
+            queued = self._queued_events
+
+        if queued == 1 or queued >= self.batch_size or (self.adaptive and self._flush_timeout() <= 0):
+            self._wakeup.set()
+
+    def _append_entry(self, count: int, blob: bytes):
+        # Caller holds _events_lock. Keep the freshest events: evict whole entries from
+        # the front until the queued event count fits max_queue_size again
+        self._events.append((count, blob))
+        self._queued_events += count
+        while self._queued_events > self.max_queue_size:
+            dropped, _ = self._events.popleft()
+            self._queued_events -= dropped
+            self.dropped_events += dropped
 
     def log_prompt_call(
         self,
@@ -355,9 +679,93 @@ class WatchLLMClient:
         user_id: Optional[str] = None,
         release: Optional[str] = None
     ) -> str:
-        event_id = str(uuid.uuid4())
+        event = self._build_prompt_call_event(
+            run_id, prompt, model, response, tokens_input, tokens_output, latency_ms,
+            status=status, error=error, prompt_template_id=prompt_template_id,
+            model_version=model_version, response_metadata=response_metadata,
+            tool_calls=tool_calls, tags=tags, user_id=user_id, release=release
+        )
+        self._queue_event(event)
+        return event.event_id
+
+    def log_prompt_calls_bulk(self, calls: Sequence[Any]) -> List[str]:
+        """Log several prompt calls, each given as a dict of ``log_prompt_call`` arguments.
+
+        A call may also be a record object carrying run_id, prompt, model, response,
+        tokens_input, tokens_output, latency_ms, status, error, response_metadata,
+        tags and user_id as attributes (see instrumentation._LogRecord).
+        The events are serialized with one ``_dumps`` call per request-sized chunk
+        (orjson when installed) and queued under a single lock acquisition.
+        """
+        event_ids = []
+        events: List[Any] = []
+        for call in calls:
+            try:
+                if isinstance(call, dict):
+                    event = self._build_prompt_call_event(**call)
+                else:
+                    event = self._build_prompt_call_event(
+                        call.run_id, call.prompt, call.model, call.response,
+                        call.tokens_input, call.tokens_output, call.latency_ms,
+                        call.status, call.error,
+                        response_metadata=call.response_metadata,
+                        tags=call.tags,
+                        user_id=call.user_id,
+                    )
+                event_ids.append(event.event_id)
+                events.append(event)
+            except Exception as e:
+                print(f"[WatchLLM] Failed to queue event: {e}")
+
+        self._queue_events(events)
+        return event_ids
+
+    def _queue_events(self, events: List[Any]):
+        """Sample, serialize and queue the events of a bulk call (dataclasses or plain dicts)."""
+        events = [event for event in events if self._sample()]
+        blobs = []
+        # No entry may hold more events than the queue, or queuing it would evict it
+        chunk_size = max(1, min(self._MAX_EVENTS_PER_REQUEST, self.max_queue_size))
+        for start in range(0, len(events), chunk_size):
+            chunk = events[start:start + chunk_size]
+            try:
+                # Strip the array brackets so the blob joins into the batch body like single events
+                blobs.append((len(chunk), _dumps(chunk)[1:-1]))
+            except Exception as e:
+                print(f"[WatchLLM] Failed to queue events: {e}")
+
+        if blobs:
+            with self._events_lock:
+                was_empty = not self._events
+                for count, blob in blobs:
+                    self._append_entry(count, blob)
+                queued = self._queued_events
+            if was_empty or queued >= self.batch_size or len(events) >= self.batch_size:
+                self._wakeup.set()
+
+    def _build_prompt_call_event(
+        self,
+        run_id: str,
+        prompt: str,
+        model: str,
+        response: str,
+        tokens_input: int,
+        tokens_output: int,
+        latency_ms: int,
+        status: Union[Status, str] = Status.SUCCESS,
+        error: Optional[Dict[str, str]] = None,
+        prompt_template_id: Optional[str] = None,
+        model_version: Optional[str] = None,
+        response_metadata: Optional[Dict[str, Any]] = None,
+        tool_calls: Optional[List[Dict[str, Any]]] = None,
+        tags: Optional[List[str]] = None,
+        user_id: Optional[str] = None,
+        release: Optional[str] = None
+    ) -> PromptCallEvent:
+        event_id = _new_event_id()
         
         cost_estimate = self._calculate_cost_estimate(model, tokens_input, tokens_output)
+        status = _enum_value(status)
 
         tool_call_events = []
         if tool_calls:
@@ -368,7 +776,7 @@ class WatchLLMClient:
                     input=tc.get('input', {}),
                     output=tc.get('output', {}),
                     latency_ms=tc.get('latency_ms', 0),
-                    status=tc.get('status', Status.SUCCESS),
+                    status=_enum_value(tc.get('status', Status.SUCCESS.value)),
                     error=tc.get('error')
                 ))
 
@@ -395,9 +803,59 @@ class WatchLLMClient:
             release=release,
             env=self.environment
         )
+        return event
 
-        self._queue_event(event)
-        return event_id
+    def log_prompt_calls(
+        self,
+        run_ids: Sequence[str],
+        prompts: Sequence[str],
+        models: Sequence[str],
+        responses: Sequence[str],
+        tokens_input: Sequence[int],
+        tokens_output: Sequence[int],
+        latency_ms: Sequence[int],
+        status: Union[Status, str] = Status.SUCCESS,
+        tags: Optional[List[str]] = None,
+        user_id: Optional[str] = None,
+        release: Optional[str] = None
+    ) -> List[str]:
+        """Log many prompt calls given column-wise, e.g. from a batch evaluation loop.
+
+        Each argument is a sequence with one entry per call; the remaining fields are shared
+        by every call. One PromptCallEvent holds the shared fields and each call is a copy
+        of its encoded dict, so no dataclass is built per call; the events are then queued
+        like those of ``log_prompt_calls_bulk``.
+        """
+        columns = (run_ids, prompts, models, responses, tokens_input, tokens_output, latency_ms)
+        n = len(run_ids)
+        if any(len(column) != n for column in columns):
+            raise ValueError("log_prompt_calls columns must all have the same length")
+        if not n:
+            return []
+
+        template = _ENCODERS[PromptCallEvent](self._build_prompt_call_event(
+            "", "", "", "", 0, 0, 0, status=status, tags=tags, user_id=user_id, release=release
+        ))
+        event_ids = []
+        events = []
+        for run_id, prompt, model, response, tin, tout, latency in zip(*columns):
+            # Updating existing keys keeps the encoder's field order
+            event = template.copy()
+            event_id = event["event_id"] = _new_event_id()
+            event["run_id"] = run_id
+            event["timestamp"] = self._get_timestamp()
+            event["prompt"] = prompt
+            event["model"] = model
+            event["tokens_input"] = tin
+            event["tokens_output"] = tout
+            event["cost_estimate_usd"] = self._calculate_cost_estimate(model, tin, tout)
+            event["response"] = response
+            event["latency_ms"] = latency
+            event_ids.append(event_id)
+            events.append(event)
+
+        self._queue_events(events)
+        return event_ids
 
     def log_agent_step(
         self,
@@ -416,8 +874,10 @@ class WatchLLMClient:
         user_id: Optional[str] = None,
         release: Optional[str] = None
     ) -> str:
-        event_id = str(uuid.uuid4())
-        
+        event_id = _new_event_id()
+        step_type = _enum_value(step_type)
+        status = _enum_value(status)
+
         event = AgentStepEvent(
             event_id=event_id,
             project_id=self.project_id,
@@ -451,13 +911,16 @@ class WatchLLMClient:
         user_id: Optional[str] = None,
         release: Optional[str] = None
     ) -> str:
-        event_id = str(uuid.uuid4())
+        event_id = _new_event_id()
         
         if isinstance(error, Exception):
+            # Format the error's own traceback, keeping only the innermost frames so deep stacks
+            # stay cheap (a negative limit counts from the raise site; None keeps every frame)
+            limit = -self.stack_trace_max_frames if self.stack_trace_max_frames else None
             error_dict = {
                 "message": str(error),
                 "type": type(error).__name__,
-                "stack": traceback.format_exc()
+                "stack": _LazyStack(error, limit),
             }
         else:
             error_dict = error
@@ -479,69 +942,111 @@ class WatchLLMClient:
         self._queue_event(event)
         return event_id
 
-    def flush(self):
-        events = []
-        while not self._event_queue.empty():
-            try:
-                event = self._event_queue.get_nowait()
-                events.append(event)
-                if len(events) >= 100:
-                    break
-            except queue.Empty:
-                break
+    def flush(self, wait: bool = True):
+        """Send every queued event.
+
+        POSTs run on a small thread pool so a slow request does not hold up the next flush.
+        With ``wait=True`` this returns once every outstanding send has finished.
+        """
+        self._schedule_flush()
+        if wait:
+            with self._in_flight_lock:
+                pending = list(self._in_flight)
+            for future in pending:
+                future.result()
+
+    def _schedule_flush(self):
+        # Take everything queued in one lock acquisition, then send it in request-sized chunks
+        with self._events_lock:
+            if not self._events:
+                return
+            events, self._events = self._events, collections.deque()
+            self._queued_events = 0
+
+        # Entries are (event count, blob); log_prompt_calls_bulk queues one blob for many events
+        chunk: List[bytes] = []
+        chunk_events = 0
+        for count, blob in events:
+            if chunk and chunk_events + count > self._MAX_EVENTS_PER_REQUEST:
+                self._send_chunk(chunk)
+                chunk, chunk_events = [], 0
+            chunk.append(blob)
+            chunk_events += count
+        if chunk:
+            self._send_chunk(chunk)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_send_workers,
+                thread_name_prefix="watchllm-http"
+            )
+        return self._executor
 
-        if not events:
-            return
+    def _send_chunk(self, chunk: List[bytes]):
+        # Back-pressure: with too many POSTs outstanding, wait for one to finish first
+        with self._in_flight_lock:
+            pending = list(self._in_flight) if len(self._in_flight) >= self._MAX_IN_FLIGHT_SENDS else None
+        if pending:
+            wait(pending, return_when=FIRST_COMPLETED)
 
+        future = self._get_executor().submit(self._post_chunk, chunk)
+        with self._in_flight_lock:
+            self._in_flight.add(future)
+        future.add_done_callback(self._discard_in_flight)
+
+    def _discard_in_flight(self, future: Future):
+        with self._in_flight_lock:
+            self._in_flight.discard(future)
+
+    def _post_chunk(self, chunk: List[bytes]):
         try:
-            self._send_events_batch(events)
+            self._send_events_batch(chunk)
         except Exception as e:
             print(f"[WatchLLM] Failed to flush events: {e}")
 
-    def _send_events_batch(self, events: List[Dict[str, Any]]):
-        session = self._get_session()
-        try:
-            response = session.post(
-                f"{self.base_url}/events/batch",
-                json={"events": events},
-                headers={
-                    "Authorization": f"Bearer {self.api_key}",
-                    "Content-Type": "application/json"
-                },
-                timeout=self.timeout
-            )
-            response.raise_for_status()
-        except requests.exceptions.RequestException as e:
-            raise e
-
-    def _calculate_cost_estimate(self, model: str, tokens_input: int, tokens_output: int) -> float:
-        pricing = {
-            "gpt-4o": {"input": 0.005, "output": 0.015},
-            "gpt-4o-mini": {"input": 0.00015, "output": 0.0006},
-            "gpt-3.5-turbo": {"input": 0.0005, "output": 0.0015},
-            "gpt-4-turbo": {"input": 0.01, "output": 0.03},
-            "claude-3-5-sonnet-20241022": {"input": 0.003, "output": 0.015},
-        }
-
-        model_pricing = pricing.get(model)
-        if not model_pricing:
-            if "gpt-4" in model:
-                model_pricing = {"input": 0.03, "output": 0.06}
+    def _send_events_batch(self, events: List[bytes]):
+        pool = self._get_pool()
+        # Redact the final body once per batch, off the logging call's thread
+        body = self._redact_bytes(b'{"events":[' + b','.join(events) + b']}')
+        headers = self._headers
+        # Tiny bodies are not worth the compression round trip
+        if self.compression and len(body) >= self._MIN_COMPRESS_BYTES:
+            if self.compression == "gzip":
+                body = gzip.compress(body, compresslevel=4)
             else:
-                model_pricing = {"input": 0.001, "output": 0.002}
+                body = zstandard.ZstdCompressor(level=3).compress(body)
+            headers = self._compressed_headers
+        started = time.perf_counter()
+        response = pool.request(
+            "POST",
+            self._endpoint,
+            body=body,
+            headers=headers,
+            timeout=urllib3.Timeout(self.timeout),
+        )
+        if response.status >= 400:
+            raise urllib3.exceptions.HTTPError(f"{response.status} error posting events to {self._endpoint}")
+        if self.adaptive:
+            self._ewma_flush_cost = self._ewma(self._ewma_flush_cost, time.perf_counter() - started)
 
-        return (tokens_input * model_pricing["input"] + tokens_output * model_pricing["output"]) / 1000
+    def _calculate_cost_estimate(self, model: str, tokens_input: int, tokens_output: int) -> float:
+        price_in, price_out = _model_price(model)
+        return (tokens_input * price_in + tokens_output * price_out) / 1000
 
     def close(self):
         self._shutdown_event.set()
+        self._wakeup.set()
         try:
             self.flush()
         except Exception:
             pass
         if self._flush_thread and self._flush_thread.is_alive():
             self._flush_thread.join(timeout=1.0)
-        if self._session:
-            self._session.close()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+        if self._pool:
+            self._pool.clear()
 
     def __enter__(self):
         return self
@@ -19,34 +19,231 @@ Usage:
     response = client.chat.completions.create(...)  # Automatically logged!
 """
 
+import atexit
+import logging
+import os
 import time
-import uuid
 import functools
-import traceback
-from typing import Any, Callable, Dict, List, Optional, Union, TYPE_CHECKING
+import itertools
+import queue
+import random
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union, TYPE_CHECKING
 from contextlib import contextmanager
+from dataclasses import dataclass
+from types import SimpleNamespace
+from contextvars import ContextVar
 import threading
 
-from .client import WatchLLMClient, Status
+from .client import WatchLLMClient, Status, _DATACLASS_OPTIONS, _new_event_id
 
 if TYPE_CHECKING:
     pass
 
+_logger = logging.getLogger("watchllm")
+
+
+def _env_number(name: str, default: Any, parse: Callable[[str], Any]) -> Any:
+    """Parse environment variable ``name``, warning and returning ``default`` if it is malformed."""
+    value = os.environ.get(name)
+    if not value:
+        return default
+    try:
+        return parse(value)
+    except ValueError:
+        _logger.warning("Ignoring %s=%r: not a valid %s, using %r", name, value, parse.__name__, default)
+        return default
+
 # Global state for instrumentation
 _global_client: Optional[WatchLLMClient] = None
 _instrumentation_enabled: bool = False
-_original_methods: Dict[str, Callable] = {}
-_run_id_context: threading.local = threading.local()
+# (class, attribute, original) for every method we patched, restored in one pass
+_patches: List[Tuple[type, str, Callable]] = []
+
+# Trace context; ContextVars keep concurrent asyncio tasks that share a thread apart
+_run_id_var = ContextVar("watchllm_run_id", default=None)
+_user_id_var = ContextVar("watchllm_user_id", default=None)
+_tags_var = ContextVar("watchllm_tags", default=())
+
+
+@dataclass(**_DATACLASS_OPTIONS)
+class _LogRecord:
+    """One instrumented call, in the shape log_prompt_calls_bulk consumes."""
+    run_id: str
+    prompt: str
+    model: str
+    response: str
+    tokens_input: int
+    tokens_output: int
+    latency_ms: int
+    status: Status
+    error: Optional[Dict[str, Any]]
+    response_metadata: Dict[str, Any]
+    tags: Tuple[str, ...]
+    user_id: Optional[str]
+
+
+class _LogBatcher:
+    """Hands instrumented-call records to the client in batches from a daemon thread.
+
+    Wrappers only enqueue the raw call (kwargs, response or exception, latency);
+    extracting prompt/response/usage/cost into a _LogRecord, building and
+    serializing the events all happen here, up to ``max_batch`` records or
+    ``flush_interval`` seconds at a time, through ``log_prompt_calls_bulk``.
+    Ready-made dicts of ``log_prompt_call`` arguments can be ``put`` directly.
+    """
+
+    def __init__(self, max_batch: int = 64, flush_interval: float = 0.25):
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    def put(self, record: Dict[str, Any]):
+        if self._thread is None:
+            self._start()
+        self._queue.put(record)
+
+    def put_success(self, build: Callable, start_ns: int, context: Tuple, kwargs: Dict[str, Any], response: Any):
+        """Queue a call that returned; ``build`` turns it into a record on the worker."""
+        self._put_call(build, start_ns, context, kwargs, response, None)
+
+    def put_error(self, build: Callable, start_ns: int, context: Tuple, kwargs: Dict[str, Any], error: Exception):
+        """Queue a call that raised; ``build`` turns it into a record on the worker."""
+        self._put_call(build, start_ns, context, kwargs, None, error)
+
+    def _put_call(self, build, start_ns, context, kwargs, response, error):
+        latency_ms = (time.perf_counter_ns() - start_ns) // 1_000_000
+        try:
+            # Callers commonly append the reply to their messages list; keep the list as sent
+            for key in ("messages", "input"):
+                value = kwargs.get(key)
+                if isinstance(value, list):
+                    kwargs[key] = value[:]
+            self.put((build, context, kwargs, response, error, latency_ms))
+        except Exception as log_error:
+            _logger.debug("Failed to queue instrumented call: %s", log_error, exc_info=True)
+
+    def flush(self, timeout: float = 5.0):
+        """Deliver every record queued so far to the client."""
+        if self._thread is None or not self._thread.is_alive():
+            self._deliver(self._drain())
+            return
+        # The worker delivers what it holds when it reaches the marker, then sets it
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait(timeout)
+
+    def _start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="watchllm-log-batcher", daemon=True)
+                self._thread.start()
+
+    def _drain(self) -> List[Any]:
+        records = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return records
+            if isinstance(item, threading.Event):
+                item.set()
+            else:
+                records.append(item)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            batch: List[Any] = []
+            marker = None
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if isinstance(item, threading.Event):
+                    marker = item
+                    break
+                batch.append(item)
+                remaining = deadline - time.monotonic()
+                if len(batch) >= self.max_batch or remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            self._deliver(batch)
+            if marker is not None:
+                marker.set()
+
+    @staticmethod
+    def _deliver(batch: List[Any]):
+        client = _global_client
+        if not batch or client is None:
+            return
+        records = []
+        for item in batch:
+            if isinstance(item, tuple):
+                build, context, kwargs, response, error, latency_ms = item
+                try:
+                    item = build(kwargs, response, error, latency_ms, context)
+                except Exception as log_error:
+                    _logger.debug("Failed to log instrumented call: %s", log_error, exc_info=True)
+                    continue
+            records.append(item)
+        try:
+            for record in records:
+                error = record.get("error") if isinstance(record, dict) else record.error
+                if error and "_exc" in error:
+                    # Only failed calls need traceback; sys.modules makes repeat imports cheap
+                    import traceback
+                    exc = error.pop("_exc")
+                    error["stack"] = "".join(
+                        traceback.format_exception(type(exc), exc, exc.__traceback__)
+                    )
+            client.log_prompt_calls_bulk(records)
+        except Exception as log_error:
+            _logger.debug("Failed to log instrumented calls: %s", log_error, exc_info=True)
+
+
+_log_batcher = _LogBatcher()
+
+# WATCHLLM_CAPTURE_STACK=0 skips stack traces for failed LLM calls altogether
+_CAPTURE_STACK = os.environ.get("WATCHLLM_CAPTURE_STACK", "1") not in ("0", "false", "False", "")
+
+
+def _error_info(e: BaseException) -> Dict[str, Any]:
+    """Error details for a failed call.
+
+    The stack is not formatted here: the exception rides along under "_exc" and
+    _LogBatcher formats it on its own thread, off the caller's error path.
+    """
+    info: Dict[str, Any] = {"message": str(e), "type": type(e).__name__, "stack": None}
+    if _CAPTURE_STACK:
+        info["_exc"] = e
+    return info
+
+
+def _flush_at_exit():
+    _log_batcher.flush()
+    if _global_client is not None:
+        _global_client.flush()
+
+
+atexit.register(_flush_at_exit)
 
 
 def get_current_run_id() -> str:
-    """Get the current run ID from thread-local context or generate a new one."""
-    run_id = getattr(_run_id_context, 'run_id', None)
+    """Get the current run ID from the trace context or generate a new one."""
+    run_id = _run_id_var.get()
     if run_id is None:
-        return str(uuid.uuid4())
+        return _new_event_id()
     return run_id
 
 
+def _current_trace_context():
+    """Resolve (run_id, user_id, tags) for one instrumented call."""
+    return _run_id_var.get() or _new_event_id(), _user_id_var.get(), _tags_var.get()
+
+
 @contextmanager
 def trace(run_id: Optional[str] = None, user_id: Optional[str] = None, tags: Optional[List[str]] = None):
     """
@@ -63,28 +260,68 @@ def trace(run_id: Optional[str] = None, user_id: Optional[str] = None, tags: Opt
         user_id: Optional user ID to associate with all calls in this trace.
         tags: Optional tags to add to all calls in this trace.
     """
-    old_run_id = getattr(_run_id_context, 'run_id', None)
-    old_user_id = getattr(_run_id_context, 'user_id', None)
-    old_tags = getattr(_run_id_context, 'tags', None)
-    
-    _run_id_context.run_id = run_id or str(uuid.uuid4())
-    _run_id_context.user_id = user_id
-    _run_id_context.tags = tags or []
+    run_id = run_id or _new_event_id()
+    run_token = _run_id_var.set(run_id)
+    user_token = _user_id_var.set(user_id)
+    tags_token = _tags_var.set(tuple(tags) if tags else ())
     
     try:
-        yield _run_id_context.run_id
+        yield run_id
     finally:
-        _run_id_context.run_id = old_run_id
-        _run_id_context.user_id = old_user_id
-        _run_id_context.tags = old_tags
+        _run_id_var.reset(run_token)
+        _user_id_var.reset(user_token)
+        _tags_var.reset(tags_token)
 
 
 # =============================================================================
 # Cost Calculation
 # =============================================================================
 
+class _PricingTable(dict):
+    """MODEL_PRICING: a dict that refreshes the integer price table whenever it changes.
+
+    Assign a whole entry (``MODEL_PRICING[model] = {...}``) to add or override a price;
+    the entries' own dicts are only read when the table is rebuilt.
+    """
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        _refresh_prices()
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        _refresh_prices()
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        _refresh_prices()
+
+    def setdefault(self, key, default=None):
+        value = super().setdefault(key, default)
+        _refresh_prices()
+        return value
+
+    def pop(self, *args):
+        value = super().pop(*args)
+        _refresh_prices()
+        return value
+
+    def popitem(self):
+        item = super().popitem()
+        _refresh_prices()
+        return item
+
+    def clear(self):
+        super().clear()
+        _refresh_prices()
+
+
 # Pricing per 1K tokens (as of 2024)
-MODEL_PRICING = {
+MODEL_PRICING = _PricingTable({
     # OpenAI models
     "gpt-4o": {"input": 0.0025, "output": 0.01},
     "gpt-4o-2024-11-20": {"input": 0.0025, "output": 0.01},
@@ -122,342 +359,499 @@ MODEL_PRICING = {
     "text-embedding-3-small": {"input": 0.00002, "output": 0},
     "text-embedding-3-large": {"input": 0.00013, "output": 0},
     "text-embedding-ada-002": {"input": 0.0001, "output": 0},
-}
+})
+
+
+def _price_micros_table() -> Dict[str, Tuple[int, int]]:
+    return {
+        model: (round(price["input"] * 1_000_000), round(price["output"] * 1_000_000))
+        for model, price in MODEL_PRICING.items()
+    }
+
+
+# Prices in integer microdollars per 1K tokens, so a cost is one multiply-add and a scale
+_PRICE_MICROS = _price_micros_table()
+
+
+@functools.lru_cache(maxsize=256)
+def _resolve_price_micros(model: str) -> Tuple[int, int]:
+    """Resolve pricing for a model without an exact table entry (prefix, then family default)."""
+    for model_prefix, price in _PRICE_MICROS.items():
+        if model.startswith(model_prefix):
+            return price
+
+    # Default pricing for unknown models
+    if "gpt-4" in model:
+        return (30_000, 60_000)
+    if "gpt-3" in model or "gpt-35" in model:
+        return (1_000, 2_000)
+    if "claude" in model:
+        return (3_000, 15_000)
+    return (1_000, 2_000)
+
+
+def _refresh_prices() -> None:
+    """Rebuild the price table from MODEL_PRICING, swapped in whole for concurrent readers."""
+    global _PRICE_MICROS
+    _PRICE_MICROS = _price_micros_table()
+    _resolve_price_micros.cache_clear()
 
 
 def calculate_cost(model: str, tokens_input: int, tokens_output: int) -> float:
     """Calculate cost in USD based on model and token counts."""
-    # Try exact match first
-    pricing = MODEL_PRICING.get(model)
-    
-    if not pricing:
-        # Try prefix matching
-        for model_prefix, price in MODEL_PRICING.items():
-            if model.startswith(model_prefix):
-                pricing = price
-                break
-    
-    if not pricing:
-        # Default pricing for unknown models
-        if "gpt-4" in model:
-            pricing = {"input": 0.03, "output": 0.06}
-        elif "gpt-3" in model or "gpt-35" in model:
-            pricing = {"input": 0.001, "output": 0.002}
-        elif "claude" in model:
-            pricing = {"input": 0.003, "output": 0.015}
-        else:
-            pricing = {"input": 0.001, "output": 0.002}
-    
-    return (tokens_input * pricing["input"] + tokens_output * pricing["output"]) / 1000
+    price_in, price_out = _PRICE_MICROS.get(model) or _resolve_price_micros(model)
+    return (tokens_input * price_in + tokens_output * price_out) * 1e-9
 
 
 # =============================================================================
 # OpenAI Instrumentation
 # =============================================================================
 
-def _extract_openai_messages(messages: List[Dict[str, Any]]) -> str:
-    """Extract prompt text from OpenAI messages format."""
-    parts = []
-    for msg in messages:
-        role = msg.get("role", "unknown")
-        content = msg.get("content", "")
-        if isinstance(content, list):
-            # Handle multimodal content
-            text_parts = []
-            for item in content:
-                if isinstance(item, dict) and item.get("type") == "text":
-                    text_parts.append(item.get("text", ""))
-            content = " ".join(text_parts)
-        parts.append(f"[{role}]: {content}")
-    return "\n".join(parts)
+def _wraps(original: Callable) -> Callable[[Callable], Callable]:
+    """Lean functools.wraps: copy the identifying attributes, skip the __dict__ merge."""
+    def decorate(wrapper: Callable) -> Callable:
+        wrapper.__wrapped__ = original
+        wrapper.__name__ = original.__name__
+        wrapper.__qualname__ = getattr(original, '__qualname__', original.__name__)
+        wrapper.__doc__ = original.__doc__
+        return wrapper
+    return decorate
 
 
-def _extract_openai_response(response: Any) -> str:
-    """Extract response text from OpenAI response object."""
-    try:
-        if hasattr(response, 'choices') and response.choices:
-            choice = response.choices[0]
-            if hasattr(choice, 'message') and choice.message:
-                content = choice.message.content
-                return content if content else ""
-            elif hasattr(choice, 'text'):
-                return choice.text or ""
-    except Exception:
-        pass
-    return ""
+def _sample_rate(provider: str) -> float:
+    """Fraction of calls to log: WATCHLLM_SAMPLE_<PROVIDER>, else WATCHLLM_SAMPLE, else all."""
+    default = _env_number("WATCHLLM_SAMPLE", 1.0, float)
+    return _env_number(f"WATCHLLM_SAMPLE_{provider.upper()}", default, float)
 
 
-def _extract_openai_usage(response: Any) -> Dict[str, int]:
-    """Extract token usage from OpenAI response."""
-    usage = {"input": 0, "output": 0, "total": 0}
-    try:
-        if hasattr(response, 'usage') and response.usage:
-            usage["input"] = getattr(response.usage, 'prompt_tokens', 0) or 0
-            usage["output"] = getattr(response.usage, 'completion_tokens', 0) or 0
-            usage["total"] = getattr(response.usage, 'total_tokens', 0) or 0
-    except Exception:
-        pass
-    return usage
+class _StreamProxy:
+    """Hands a streaming response's chunks to the caller and logs the call once it ends.
 
+    Each chunk is passed to ``accumulator.add`` (which keeps only the text and
+    usage). When the stream is exhausted, fails or is closed early,
+    ``accumulator.response()`` stands in for the response in the usual record builder.
+    Anything else is forwarded to the wrapped stream.
+    """
 
-def _wrap_openai_chat_completions_create(original_method: Callable) -> Callable:
-    """Wrap OpenAI chat.completions.create method."""
-    
-    @functools.wraps(original_method)
+    def __init__(self, stream, accumulator, build, start_ns, context, kwargs):
+        self._stream = stream
+        self._accumulator = accumulator
+        self._build = build
+        self._start_ns = start_ns
+        self._context = context
+        self._kwargs = kwargs
+        self._done = False
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+    def _add(self, chunk):
+        try:
+            self._accumulator.add(chunk)
+        except Exception as log_error:
+            _logger.debug("Failed to record stream chunk: %s", log_error, exc_info=True)
+
+    def _finish(self, error: Optional[Exception] = None):
+        if self._done:
+            return
+        self._done = True
+        if error is None:
+            _log_batcher.put_success(self._build, self._start_ns, self._context, self._kwargs,
+                                     self._accumulator.response())
+        else:
+            _log_batcher.put_error(self._build, self._start_ns, self._context, self._kwargs, error)
+
+
+class _SyncStreamProxy(_StreamProxy):
+
+    def __init__(self, stream, *args):
+        super().__init__(stream, *args)
+        self._iterator = iter(stream)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            chunk = next(self._iterator)
+        except StopIteration:
+            self._finish()
+            raise
+        except Exception as e:
+            self._finish(e)
+            raise
+        self._add(chunk)
+        return chunk
+
+    def __enter__(self):
+        self._stream.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._finish()
+        return self._stream.__exit__(*exc_info)
+
+    def close(self):
+        self._finish()
+        self._stream.close()
+
+
+class _AsyncStreamProxy(_StreamProxy):
+
+    def __init__(self, stream, *args):
+        super().__init__(stream, *args)
+        self._iterator = stream.__aiter__()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            chunk = await self._iterator.__anext__()
+        except StopAsyncIteration:
+            self._finish()
+            raise
+        except Exception as e:
+            self._finish(e)
+            raise
+        self._add(chunk)
+        return chunk
+
+    async def __aenter__(self):
+        await self._stream.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self._finish()
+        return await self._stream.__aexit__(*exc_info)
+
+    async def close(self):
+        self._finish()
+        await self._stream.close()
+
+
+def _wrap_sync(
+    original_method: Callable,
+    build: Callable,
+    sample_rate: float = 1.0,
+    stream_accumulator: Optional[Callable] = None,
+) -> Callable:
+    """Shared body of the sync wrappers; ``build`` is the provider's record builder.
+
+    With ``stream_accumulator`` set, ``stream=True`` calls return a proxy that logs
+    the call when the stream ends instead of logging the bare stream object.
+    """
+
+    @_wraps(original_method)
     def wrapper(self, *args, **kwargs):
-        if not _instrumentation_enabled or _global_client is None:
-            return original_method(self, *args, **kwargs)
-        
-        start_time = time.time()
-        error_info = None
-        response = None
-        
-        # Extract request info
-        model = kwargs.get('model', 'unknown')
-        messages = kwargs.get('messages', [])
-        prompt = _extract_openai_messages(messages)
-        
+        context = _current_trace_context()
+        start_ns = time.perf_counter_ns()
         try:
             response = original_method(self, *args, **kwargs)
-            status = Status.SUCCESS
         except Exception as e:
-            error_info = {
-                "message": str(e),
-                "type": type(e).__name__,
-                "stack": traceback.format_exc(),
-            }
-            status = Status.ERROR
+            _log_batcher.put_error(build, start_ns, context, kwargs, e)
             raise
-        finally:
-            latency_ms = int((time.time() - start_time) * 1000)
-            
-            # Extract response info
-            response_text = _extract_openai_response(response) if response else ""
-            usage = _extract_openai_usage(response) if response else {"input": 0, "output": 0}
-            cost = calculate_cost(model, usage["input"], usage["output"])
-            
-            # Get context from thread-local storage
-            run_id = get_current_run_id()
-            user_id = getattr(_run_id_context, 'user_id', None)
-            tags = getattr(_run_id_context, 'tags', []) or []
-            
-            try:
-                _global_client.log_prompt_call(
-                    run_id=run_id,
-                    prompt=prompt,
-                    model=model,
-                    response=response_text,
-                    tokens_input=usage["input"],
-                    tokens_output=usage["output"],
-                    latency_ms=latency_ms,
-                    status=status,
-                    error=error_info,
-                    response_metadata={
-                        "provider": "openai",
-                        "cost_usd": cost,
-                        "finish_reason": getattr(response.choices[0], 'finish_reason', None) if response and response.choices else None,
-                    },
-                    tags=["auto-instrumented", "openai"] + tags,
-                    user_id=user_id,
-                )
-            except Exception as log_error:
-                print(f"[WatchLLM] Failed to log OpenAI call: {log_error}")
-        
+        if stream_accumulator is not None and kwargs.get("stream"):
+            return _SyncStreamProxy(response, stream_accumulator(), build, start_ns, context, kwargs)
+        _log_batcher.put_success(build, start_ns, context, kwargs, response)
         return response
-    
-    return wrapper
 
+    if sample_rate >= 1.0:
+        return wrapper
 
-def _wrap_openai_chat_completions_create_async(original_method: Callable) -> Callable:
-    """Wrap OpenAI async chat.completions.create method."""
-    
-    @functools.wraps(original_method)
+    @_wraps(original_method)
+    def sampled(self, *args, **kwargs):
+        # Sampled-out calls skip the trace lookup, timing and logging entirely
+        if random.random() >= sample_rate:
+            return original_method(self, *args, **kwargs)
+        return wrapper(self, *args, **kwargs)
+
+    return sampled
+
+
+def _wrap_async(
+    original_method: Callable,
+    build: Callable,
+    sample_rate: float = 1.0,
+    stream_accumulator: Optional[Callable] = None,
+) -> Callable:
+    """Async counterpart of _wrap_sync."""
+
+    @_wraps(original_method)
     async def wrapper(self, *args, **kwargs):
-        if not _instrumentation_enabled or _global_client is None:
-            return await original_method(self, *args, **kwargs)
-        
-        start_time = time.time()
-        error_info = None
-        response = None
-        
-        model = kwargs.get('model', 'unknown')
-        messages = kwargs.get('messages', [])
-        prompt = _extract_openai_messages(messages)
-        
+        context = _current_trace_context()
+        start_ns = time.perf_counter_ns()
         try:
             response = await original_method(self, *args, **kwargs)
-            status = Status.SUCCESS
         except Exception as e:
-            error_info = {
-                "message": str(e),
-                "type": type(e).__name__,
-                "stack": traceback.format_exc(),
-            }
-            status = Status.ERROR
+            _log_batcher.put_error(build, start_ns, context, kwargs, e)
             raise
-        finally:
-            latency_ms = int((time.time() - start_time) * 1000)
-            
-            response_text = _extract_openai_response(response) if response else ""
-            usage = _extract_openai_usage(response) if response else {"input": 0, "output": 0}
-            cost = calculate_cost(model, usage["input"], usage["output"])
-            
-            run_id = get_current_run_id()
-            user_id = getattr(_run_id_context, 'user_id', None)
-            tags = getattr(_run_id_context, 'tags', []) or []
-            
-            try:
-                _global_client.log_prompt_call(
-                    run_id=run_id,
-                    prompt=prompt,
-                    model=model,
-                    response=response_text,
-                    tokens_input=usage["input"],
-                    tokens_output=usage["output"],
-                    latency_ms=latency_ms,
-                    status=status,
-                    error=error_info,
-                    response_metadata={
-                        "provider": "openai",
-                        "cost_usd": cost,
-                    },
-                    tags=["auto-instrumented", "openai"] + tags,
-                    user_id=user_id,
-                )
-            except Exception as log_error:
-                print(f"[WatchLLM] Failed to log OpenAI async call: {log_error}")
-        
+        if stream_accumulator is not None and kwargs.get("stream"):
+            return _AsyncStreamProxy(response, stream_accumulator(), build, start_ns, context, kwargs)
+        _log_batcher.put_success(build, start_ns, context, kwargs, response)
         return response
-    
-    return wrapper
+
+    if sample_rate >= 1.0:
+        return wrapper
+
+    @_wraps(original_method)
+    async def sampled(self, *args, **kwargs):
+        if random.random() >= sample_rate:
+            return await original_method(self, *args, **kwargs)
+        return await wrapper(self, *args, **kwargs)
+
+    return sampled
+
+
+# Tag prefixes per provider; adding an empty trace tags tuple returns the prefix unchanged
+_OPENAI_TAGS = ("auto-instrumented", "openai")
+_OPENAI_EMBED_TAGS = ("auto-instrumented", "openai", "embedding")
+_ANTHROPIC_TAGS = ("auto-instrumented", "anthropic")
+
+# Upper bound on the prompt text captured per call; huge contexts are cut instead of copied whole
+_MAX_PROMPT_CHARS = _env_number("WATCHLLM_MAX_PROMPT_CHARS", 32768, int)
+# Embedding inputs are bulk text rather than a conversation; keep the long-standing 500
+_MAX_EMBED_PROMPT_CHARS = _env_number("WATCHLLM_MAX_EMBED_PROMPT_CHARS", 500, int)
+_TRUNCATED_MARKER = "...[truncated]"
+
+
+def _join_capped(parts: Iterable[str]) -> str:
+    """Newline-join rendered messages, stopping once _MAX_PROMPT_CHARS is reached."""
+    kept = []
+    total = 0
+    for part in parts:
+        kept.append(part)
+        total += len(part) + 1
+        if total > _MAX_PROMPT_CHARS:
+            return "\n".join(kept)[:_MAX_PROMPT_CHARS] + _TRUNCATED_MARKER
+    return "\n".join(kept)
+
+
+def _format_message(msg: Dict[str, Any]) -> str:
+    """Render one chat message as "[role]: text" (shared by the OpenAI and Anthropic formats).
+
+    The text is cut to _MAX_PROMPT_CHARS first, so one huge message is never copied whole.
+    """
+    limit = _MAX_PROMPT_CHARS
+    content = msg.get("content", "")
+    if isinstance(content, list):
+        # Handle multimodal content: keep only the text blocks, up to the cap
+        texts = []
+        size = 0
+        for item in content:
+            if isinstance(item, dict) and item.get("type") == "text":
+                text = item.get("text", "")
+                texts.append(text)
+                size += len(text) + 1
+                if size > limit:
+                    break
+        content = " ".join(texts)
+    if isinstance(content, str):
+        content = content[:limit]
+    return f"[{msg.get('role', 'unknown')}]: {content}"
+
+
+def _extract_openai_messages(messages: List[Dict[str, Any]]) -> str:
+    """Extract prompt text from OpenAI messages format."""
+    return _join_capped(_format_message(msg) for msg in messages)
+
+
+def _first_choice(response: Any) -> Any:
+    """The first choice of an OpenAI response, or None."""
+    try:
+        return response.choices[0]
+    except (AttributeError, IndexError, TypeError):
+        return None
+
+
+def _extract_choice_text(choice: Any) -> str:
+    """Extract the text of one OpenAI choice."""
+    # Access the known shape directly; a missing piece raises instead of being probed first
+    try:
+        return choice.message.content or ""
+    except AttributeError:
+        pass
+    try:
+        # Legacy completions put the text on the choice itself
+        return choice.text or ""
+    except AttributeError:
+        return ""
+
+
+def _extract_openai_response(response: Any) -> str:
+    """Extract response text from OpenAI response object."""
+    return _extract_choice_text(_first_choice(response))
+
+
+def _extract_openai_usage(response: Any) -> Dict[str, int]:
+    """Extract token usage from OpenAI response."""
+    try:
+        u = response.usage
+        return {
+            "input": u.prompt_tokens or 0,
+            # Embedding responses report no completion tokens
+            "output": getattr(u, 'completion_tokens', 0) or 0,
+            "total": u.total_tokens or 0,
+        }
+    except AttributeError:
+        return {"input": 0, "output": 0, "total": 0}
+
+
+def _openai_chat_record(kwargs, response, error, latency_ms, context) -> _LogRecord:
+    """The log record for one chat.completions.create call (runs on the batcher)."""
+    run_id, user_id, tags = context
+    model = kwargs.get('model', 'unknown')
+    usage = _extract_openai_usage(response) if response else {"input": 0, "output": 0}
+    # Walk response.choices once for both the text and the finish reason
+    first_choice = _first_choice(response) if response else None
+    return _LogRecord(
+        run_id=run_id,
+        prompt=_extract_openai_messages(kwargs.get('messages', [])),
+        model=model,
+        response=_extract_choice_text(first_choice) if first_choice is not None else "",
+        tokens_input=usage["input"],
+        tokens_output=usage["output"],
+        latency_ms=latency_ms,
+        status=Status.SUCCESS if error is None else Status.ERROR,
+        error=None if error is None else _error_info(error),
+        response_metadata={
+            "provider": "openai",
+            "cost_usd": calculate_cost(model, usage["input"], usage["output"]),
+            "finish_reason": getattr(first_choice, 'finish_reason', None),
+        },
+        tags=_OPENAI_TAGS + tags,
+        user_id=user_id,
+    )
+
+
+def _openai_embedding_record(kwargs, response, error, latency_ms, context) -> _LogRecord:
+    """The log record for one embeddings.create call (runs on the batcher)."""
+    run_id, user_id, tags = context
+    model = kwargs.get('model', 'text-embedding-ada-002')
+    input_text = kwargs.get('input', '')
+    if isinstance(input_text, list):
+        prompt = str(input_text[:3]) + ("..." if len(input_text) > 3 else "")
+    else:
+        prompt = str(input_text)[:_MAX_EMBED_PROMPT_CHARS]
+    if error is not None or not response:
+        # A failed call has no vectors or usage to report
+        response_text = ""
+        tokens_input = 0
+        cost = 0.0
+    else:
+        response_text = f"[{len(response.data) if response.data else 0} embeddings]"
+        tokens_input = _extract_openai_usage(response)["input"]
+        cost = calculate_cost(model, tokens_input, 0)
+    return _LogRecord(
+        run_id=run_id,
+        prompt=f"[embedding] {prompt}",
+        model=model,
+        response=response_text,
+        tokens_input=tokens_input,
+        tokens_output=0,
+        latency_ms=latency_ms,
+        status=Status.SUCCESS if error is None else Status.ERROR,
+        error=None if error is None else _error_info(error),
+        response_metadata={
+            "provider": "openai",
+            "type": "embedding",
+            "cost_usd": cost,
+        },
+        tags=_OPENAI_EMBED_TAGS + tags,
+        user_id=user_id,
+    )
+
+
+class _OpenAIStreamAccumulator:
+    """Collects the text, finish reason and usage of a streamed chat completion."""
+
+    def __init__(self):
+        self.parts: List[str] = []
+        self.finish_reason: Optional[str] = None
+        # Only sent, on the last chunk, when stream_options={"include_usage": True}
+        self.usage: Any = None
+
+    def add(self, chunk: Any):
+        usage = getattr(chunk, 'usage', None)
+        if usage is not None:
+            self.usage = usage
+        choice = _first_choice(chunk)
+        if choice is None:
+            return
+        content = getattr(getattr(choice, 'delta', None), 'content', None)
+        if content:
+            self.parts.append(content)
+        if getattr(choice, 'finish_reason', None):
+            self.finish_reason = choice.finish_reason
+
+    def response(self) -> Any:
+        """A stand-in with the shape _openai_chat_record reads from a response."""
+        message = SimpleNamespace(content="".join(self.parts))
+        choice = SimpleNamespace(message=message, finish_reason=self.finish_reason)
+        return SimpleNamespace(choices=[choice], usage=self.usage)
+
+
+def _wrap_openai_chat_completions_create(original_method: Callable) -> Callable:
+    """Wrap OpenAI chat.completions.create method."""
+    return _wrap_sync(original_method, _openai_chat_record, _sample_rate("openai"), _OpenAIStreamAccumulator)
+
+
+def _wrap_openai_chat_completions_create_async(original_method: Callable) -> Callable:
+    """Wrap OpenAI async chat.completions.create method."""
+    return _wrap_async(original_method, _openai_chat_record, _sample_rate("openai"), _OpenAIStreamAccumulator)
 
 
 def _wrap_openai_embeddings_create(original_method: Callable) -> Callable:
     """Wrap OpenAI embeddings.create method."""
-    
-    @functools.wraps(original_method)
-    def wrapper(self, *args, **kwargs):
-        if not _instrumentation_enabled or _global_client is None:
-            return original_method(self, *args, **kwargs)
-        
-        start_time = time.time()
-        error_info = None
-        response = None
-        
-        model = kwargs.get('model', 'text-embedding-ada-002')
-        input_text = kwargs.get('input', '')
-        if isinstance(input_text, list):
-            prompt = str(input_text[:3]) + ("..." if len(input_text) > 3 else "")
-        else:
-            prompt = str(input_text)[:500]
-        
-        try:
-            response = original_method(self, *args, **kwargs)
-            status = Status.SUCCESS
-        except Exception as e:
-            error_info = {
-                "message": str(e),
-                "type": type(e).__name__,
-                "stack": traceback.format_exc(),
-            }
-            status = Status.ERROR
-            raise
-        finally:
-            latency_ms = int((time.time() - start_time) * 1000)
-            
-            usage = _extract_openai_usage(response) if response else {"input": 0, "output": 0}
-            cost = calculate_cost(model, usage["input"], 0)
-            
-            run_id = get_current_run_id()
-            user_id = getattr(_run_id_context, 'user_id', None)
-            tags = getattr(_run_id_context, 'tags', []) or []
-            
-            try:
-                _global_client.log_prompt_call(
-                    run_id=run_id,
-                    prompt=f"[embedding] {prompt}",
-                    model=model,
-                    response=f"[{len(response.data) if response and response.data else 0} embeddings]",
-                    tokens_input=usage["input"],
-                    tokens_output=0,
-                    latency_ms=latency_ms,
-                    status=status,
-                    error=error_info,
-                    response_metadata={
-                        "provider": "openai",
-                        "type": "embedding",
-                        "cost_usd": cost,
-                    },
-                    tags=["auto-instrumented", "openai", "embedding"] + tags,
-                    user_id=user_id,
-                )
-            except Exception as log_error:
-                print(f"[WatchLLM] Failed to log OpenAI embedding: {log_error}")
-        
-        return response
-    
-    return wrapper
+    return _wrap_sync(original_method, _openai_embedding_record, _sample_rate("openai"))
+
+
+def _patch_create(cls: type, wrap: Callable[[Callable], Callable]):
+    """Replace cls.create with wrap(cls.create) once, recording the original in _patches."""
+    if hasattr(cls, '_watchllm_instrumented'):
+        return
+    original = cls.create
+    cls.create = wrap(original)
+    cls._watchllm_instrumented = True
+    _patches.append((cls, 'create', original))
+
+
+def _unpatch_all():
+    """Restore every method recorded by _patch_create."""
+    for cls, name, original in _patches:
+        setattr(cls, name, original)
+        if '_watchllm_instrumented' in cls.__dict__:
+            delattr(cls, '_watchllm_instrumented')
+    _patches.clear()
+
+
+# (Completions, AsyncCompletions, Embeddings), resolved on the first _instrument_openai call
+_openai_classes: Optional[Tuple[type, type, type]] = None
 
 
 def _instrument_openai():
     """Apply instrumentation to the OpenAI library."""
+    global _openai_classes
     try:
-        import openai
-        from openai.resources.chat import completions as chat_completions
-        from openai.resources import embeddings as embeddings_module
-        
-        # Instrument sync chat completions
-        if not hasattr(chat_completions.Completions, '_watchllm_instrumented'):
-            _original_methods['openai_chat_create'] = chat_completions.Completions.create
-            chat_completions.Completions.create = _wrap_openai_chat_completions_create(
-                chat_completions.Completions.create
+        if _openai_classes is None:
+            from openai.resources.chat import completions as chat_completions
+            from openai.resources import embeddings as embeddings_module
+            _openai_classes = (
+                chat_completions.Completions,
+                chat_completions.AsyncCompletions,
+                embeddings_module.Embeddings,
             )
-            chat_completions.Completions._watchllm_instrumented = True
+        completions_cls, async_completions_cls, embeddings_cls = _openai_classes
         
-        # Instrument async chat completions
-        if not hasattr(chat_completions.AsyncCompletions, '_watchllm_instrumented'):
-            _original_methods['openai_chat_create_async'] = chat_completions.AsyncCompletions.create
-            chat_completions.AsyncCompletions.create = _wrap_openai_chat_completions_create_async(
-                chat_completions.AsyncCompletions.create
-            )
-            chat_completions.AsyncCompletions._watchllm_instrumented = True
-        
-        # Instrument embeddings
-        if not hasattr(embeddings_module.Embeddings, '_watchllm_instrumented'):
-            _original_methods['openai_embeddings_create'] = embeddings_module.Embeddings.create
-            embeddings_module.Embeddings.create = _wrap_openai_embeddings_create(
-                embeddings_module.Embeddings.create
-            )
-            embeddings_module.Embeddings._watchllm_instrumented = True
+        _patch_create(completions_cls, _wrap_openai_chat_completions_create)
+        _patch_create(async_completions_cls, _wrap_openai_chat_completions_create_async)
+        _patch_create(embeddings_cls, _wrap_openai_embeddings_create)
         
         return True
     except ImportError:
         return False
     except Exception as e:
-        print(f"[WatchLLM] Failed to instrument OpenAI: {e}")
-        return False
-
-
-def _uninstrument_openai():
-    """Remove instrumentation from the OpenAI library."""
-    try:
-        from openai.resources.chat import completions as chat_completions
-        from openai.resources import embeddings as embeddings_module
-        
-        if 'openai_chat_create' in _original_methods:
-            chat_completions.Completions.create = _original_methods['openai_chat_create']
-            delattr(chat_completions.Completions, '_watchllm_instrumented')
-        
-        if 'openai_chat_create_async' in _original_methods:
-            chat_completions.AsyncCompletions.create = _original_methods['openai_chat_create_async']
-            delattr(chat_completions.AsyncCompletions, '_watchllm_instrumented')
-        
-        if 'openai_embeddings_create' in _original_methods:
-            embeddings_module.Embeddings.create = _original_methods['openai_embeddings_create']
-            delattr(embeddings_module.Embeddings, '_watchllm_instrumented')
-        
-        return True
-    except Exception:
+        _logger.warning("Failed to instrument OpenAI: %s", e)
         return False
 
 
@@ -467,226 +861,123 @@ def _uninstrument_openai():
 
 def _extract_anthropic_messages(messages: List[Dict[str, Any]], system: Optional[str] = None) -> str:
     """Extract prompt text from Anthropic messages format."""
-    parts = []
+    parts = (_format_message(msg) for msg in messages)
     if system:
-        parts.append(f"[system]: {system}")
-    
-    for msg in messages:
-        role = msg.get("role", "unknown")
-        content = msg.get("content", "")
-        if isinstance(content, list):
-            text_parts = []
-            for item in content:
-                if isinstance(item, dict) and item.get("type") == "text":
-                    text_parts.append(item.get("text", ""))
-            content = " ".join(text_parts)
-        parts.append(f"[{role}]: {content}")
-    
-    return "\n".join(parts)
+        parts = itertools.chain((f"[system]: {system}",), parts)
+    return _join_capped(parts)
 
 
 def _extract_anthropic_response(response: Any) -> str:
     """Extract response text from Anthropic response object."""
     try:
-        if hasattr(response, 'content') and response.content:
-            parts = []
-            for block in response.content:
-                if hasattr(block, 'text'):
-                    parts.append(block.text)
-            return " ".join(parts)
-    except Exception:
-        pass
-    return ""
+        # Only text blocks carry .text; tool_use and other blocks are skipped
+        return " ".join([block.text for block in response.content if hasattr(block, 'text')])
+    except (AttributeError, TypeError):
+        return ""
 
 
 def _extract_anthropic_usage(response: Any) -> Dict[str, int]:
     """Extract token usage from Anthropic response."""
-    usage = {"input": 0, "output": 0}
     try:
-        if hasattr(response, 'usage') and response.usage:
-            usage["input"] = getattr(response.usage, 'input_tokens', 0) or 0
-            usage["output"] = getattr(response.usage, 'output_tokens', 0) or 0
-    except Exception:
-        pass
-    return usage
+        u = response.usage
+        return {"input": u.input_tokens or 0, "output": u.output_tokens or 0}
+    except AttributeError:
+        return {"input": 0, "output": 0}
+
+
+def _anthropic_message_record(kwargs, response, error, latency_ms, context) -> _LogRecord:
+    """The log record for one messages.create call (runs on the batcher)."""
+    run_id, user_id, tags = context
+    model = kwargs.get('model', 'unknown')
+    usage = _extract_anthropic_usage(response) if response else {"input": 0, "output": 0}
+    return _LogRecord(
+        run_id=run_id,
+        prompt=_extract_anthropic_messages(kwargs.get('messages', []), kwargs.get('system', None)),
+        model=model,
+        response=_extract_anthropic_response(response) if response else "",
+        tokens_input=usage["input"],
+        tokens_output=usage["output"],
+        latency_ms=latency_ms,
+        status=Status.SUCCESS if error is None else Status.ERROR,
+        error=None if error is None else _error_info(error),
+        response_metadata={
+            "provider": "anthropic",
+            "cost_usd": calculate_cost(model, usage["input"], usage["output"]),
+            "stop_reason": getattr(response, 'stop_reason', None) if response else None,
+        },
+        tags=_ANTHROPIC_TAGS + tags,
+        user_id=user_id,
+    )
+
+
+class _AnthropicStreamAccumulator:
+    """Collects the text, stop reason and usage from a stream of Anthropic message events."""
+
+    def __init__(self):
+        self.parts: List[str] = []
+        self.stop_reason: Optional[str] = None
+        self.input_tokens = 0
+        self.output_tokens = 0
+
+    def add(self, event: Any):
+        kind = getattr(event, 'type', None)
+        if kind == 'content_block_delta':
+            text = getattr(event.delta, 'text', None)
+            if text:
+                self.parts.append(text)
+        elif kind == 'message_start':
+            usage = getattr(event.message, 'usage', None)
+            if usage is not None:
+                self.input_tokens = getattr(usage, 'input_tokens', 0) or 0
+                self.output_tokens = getattr(usage, 'output_tokens', 0) or 0
+        elif kind == 'message_delta':
+            self.stop_reason = getattr(event.delta, 'stop_reason', None) or self.stop_reason
+            usage = getattr(event, 'usage', None)
+            if usage is not None:
+                # message_delta carries the cumulative output count
+                self.output_tokens = getattr(usage, 'output_tokens', 0) or self.output_tokens
+
+    def response(self) -> Any:
+        """A stand-in with the shape _anthropic_message_record reads from a response."""
+        usage = SimpleNamespace(input_tokens=self.input_tokens, output_tokens=self.output_tokens)
+        return SimpleNamespace(
+            content=[SimpleNamespace(text="".join(self.parts))],
+            usage=usage,
+            stop_reason=self.stop_reason,
+        )
 
 
 def _wrap_anthropic_messages_create(original_method: Callable) -> Callable:
     """Wrap Anthropic messages.create method."""
-    
-    @functools.wraps(original_method)
-    def wrapper(self, *args, **kwargs):
-        if not _instrumentation_enabled or _global_client is None:
-            return original_method(self, *args, **kwargs)
-        
-        start_time = time.time()
-        error_info = None
-        response = None
-        
-        model = kwargs.get('model', 'unknown')
-        messages = kwargs.get('messages', [])
-        system = kwargs.get('system', None)
-        prompt = _extract_anthropic_messages(messages, system)
-        
-        try:
-            response = original_method(self, *args, **kwargs)
-            status = Status.SUCCESS
-        except Exception as e:
-            error_info = {
-                "message": str(e),
-                "type": type(e).__name__,
-                "stack": traceback.format_exc(),
-            }
-            status = Status.ERROR
-            raise
-        finally:
-            latency_ms = int((time.time() - start_time) * 1000)
-            
-            response_text = _extract_anthropic_response(response) if response else ""
-            usage = _extract_anthropic_usage(response) if response else {"input": 0, "output": 0}
-            cost = calculate_cost(model, usage["input"], usage["output"])
-            
-            run_id = get_current_run_id()
-            user_id = getattr(_run_id_context, 'user_id', None)
-            tags = getattr(_run_id_context, 'tags', []) or []
-            
-            try:
-                _global_client.log_prompt_call(
-                    run_id=run_id,
-                    prompt=prompt,
-                    model=model,
-                    response=response_text,
-                    tokens_input=usage["input"],
-                    tokens_output=usage["output"],
-                    latency_ms=latency_ms,
-                    status=status,
-                    error=error_info,
-                    response_metadata={
-                        "provider": "anthropic",
-                        "cost_usd": cost,
-                        "stop_reason": getattr(response, 'stop_reason', None) if response else None,
-                    },
-                    tags=["auto-instrumented", "anthropic"] + tags,
-                    user_id=user_id,
-                )
-            except Exception as log_error:
-                print(f"[WatchLLM] Failed to log Anthropic call: {log_error}")
-        
-        return response
-    
-    return wrapper
+    return _wrap_sync(original_method, _anthropic_message_record, _sample_rate("anthropic"), _AnthropicStreamAccumulator)
 
 
 def _wrap_anthropic_messages_create_async(original_method: Callable) -> Callable:
     """Wrap Anthropic async messages.create method."""
-    
-    @functools.wraps(original_method)
-    async def wrapper(self, *args, **kwargs):
-        if not _instrumentation_enabled or _global_client is None:
-            return await original_method(self, *args, **kwargs)
-        
-        start_time = time.time()
-        error_info = None
-        response = None
-        
-        model = kwargs.get('model', 'unknown')
-        messages = kwargs.get('messages', [])
-        system = kwargs.get('system', None)
-        prompt = _extract_anthropic_messages(messages, system)
-        
-        try:
-            response = await original_method(self, *args, **kwargs)
-            status = Status.SUCCESS
-        except Exception as e:
-            error_info = {
-                "message": str(e),
-                "type": type(e).__name__,
-                "stack": traceback.format_exc(),
-            }
-            status = Status.ERROR
-            raise
-        finally:
-            latency_ms = int((time.time() - start_time) * 1000)
-            
-            response_text = _extract_anthropic_response(response) if response else ""
-            usage = _extract_anthropic_usage(response) if response else {"input": 0, "output": 0}
-            cost = calculate_cost(model, usage["input"], usage["output"])
-            
-            run_id = get_current_run_id()
-            user_id = getattr(_run_id_context, 'user_id', None)
-            tags = getattr(_run_id_context, 'tags', []) or []
-            
-            try:
-                _global_client.log_prompt_call(
-                    run_id=run_id,
-                    prompt=prompt,
-                    model=model,
-                    response=response_text,
-                    tokens_input=usage["input"],
-                    tokens_output=usage["output"],
-                    latency_ms=latency_ms,
-                    status=status,
-                    error=error_info,
-                    response_metadata={
-                        "provider": "anthropic",
-                        "cost_usd": cost,
-                    },
-                    tags=["auto-instrumented", "anthropic"] + tags,
-                    user_id=user_id,
-                )
-            except Exception as log_error:
-                print(f"[WatchLLM] Failed to log Anthropic async call: {log_error}")
-        
-        return response
-    
-    return wrapper
+    return _wrap_async(original_method, _anthropic_message_record, _sample_rate("anthropic"), _AnthropicStreamAccumulator)
+
+
+# (Messages, AsyncMessages), resolved on the first _instrument_anthropic call
+_anthropic_classes: Optional[Tuple[type, type]] = None
 
 
 def _instrument_anthropic():
     """Apply instrumentation to the Anthropic library."""
+    global _anthropic_classes
     try:
-        import anthropic
-        from anthropic.resources import messages as messages_module
+        if _anthropic_classes is None:
+            from anthropic.resources import messages as messages_module
+            _anthropic_classes = (messages_module.Messages, messages_module.AsyncMessages)
+        messages_cls, async_messages_cls = _anthropic_classes
         
-        # Instrument sync messages
-        if not hasattr(messages_module.Messages, '_watchllm_instrumented'):
-            _original_methods['anthropic_messages_create'] = messages_module.Messages.create
-            messages_module.Messages.create = _wrap_anthropic_messages_create(
-                messages_module.Messages.create
-            )
-            messages_module.Messages._watchllm_instrumented = True
-        
-        # Instrument async messages
-        if not hasattr(messages_module.AsyncMessages, '_watchllm_instrumented'):
-            _original_methods['anthropic_messages_create_async'] = messages_module.AsyncMessages.create
-            messages_module.AsyncMessages.create = _wrap_anthropic_messages_create_async(
-                messages_module.AsyncMessages.create
-            )
-            messages_module.AsyncMessages._watchllm_instrumented = True
+        _patch_create(messages_cls, _wrap_anthropic_messages_create)
+        _patch_create(async_messages_cls, _wrap_anthropic_messages_create_async)
         
         return True
     except ImportError:
         return False
     except Exception as e:
-        print(f"[WatchLLM] Failed to instrument Anthropic: {e}")
-        return False
-
-
-def _uninstrument_anthropic():
-    """Remove instrumentation from the Anthropic library."""
-    try:
-        from anthropic.resources import messages as messages_module
-        
-        if 'anthropic_messages_create' in _original_methods:
-            messages_module.Messages.create = _original_methods['anthropic_messages_create']
-            delattr(messages_module.Messages, '_watchllm_instrumented')
-        
-        if 'anthropic_messages_create_async' in _original_methods:
-            messages_module.AsyncMessages.create = _original_methods['anthropic_messages_create_async']
-            delattr(messages_module.AsyncMessages, '_watchllm_instrumented')
-        
-        return True
-    except Exception:
+        _logger.warning("Failed to instrument Anthropic: %s", e)
         return False
 
 
@@ -755,9 +1046,9 @@ def auto_instrument(
     _instrumentation_enabled = True
     
     if instrumented:
-        print(f"[WatchLLM] Auto-instrumentation enabled for: {', '.join(instrumented)}")
+        _logger.info("Auto-instrumentation enabled for: %s", ", ".join(instrumented))
     else:
-        print("[WatchLLM] Warning: No libraries were instrumented. Make sure openai/anthropic are installed.")
+        _logger.warning("No libraries were instrumented. Make sure openai/anthropic are installed.")
     
     return _global_client
 
@@ -785,16 +1076,14 @@ def disable_instrumentation():
     
     _instrumentation_enabled = False
     
-    _uninstrument_openai()
-    _uninstrument_anthropic()
+    _unpatch_all()
     
     if _global_client:
+        _log_batcher.flush()
         _global_client.close()
         _global_client = None
     
-    _original_methods.clear()
-    
-    print("[WatchLLM] Auto-instrumentation disabled")
+    _logger.info("Auto-instrumentation disabled")
 
 
 def get_client() -> Optional[WatchLLMClient]:
@@ -14,10 +14,14 @@ Usage:
     chain = LLMChain(..., callbacks=[handler])
 """
 
+import functools
+import logging
+import operator
+import queue
+import threading
 import time
 import uuid
-import traceback
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 from dataclasses import dataclass, field
 
 try:
@@ -40,10 +44,61 @@ except ImportError:
             """Stub for when LangChain is not installed."""
             pass
 
-from .client import WatchLLMClient, Status, StepType
+from .client import WatchLLMClient, Status, StepType, _DATACLASS_OPTIONS, _LazyStack
 
+_logger = logging.getLogger("watchllm")
 
-@dataclass
+
+def _run_key(run_id: Any) -> str:
+    """Key for a LangChain run_id in the handler's run table ("" when missing)."""
+    # UUID.hex skips the dash formatting str() does; keys never leave the handler
+    if isinstance(run_id, uuid.UUID):
+        return run_id.hex
+    return str(run_id) if run_id else ""
+
+
+_MISSING = object()
+
+# AgentAction / AgentFinish fields, read in one call on the agent callbacks
+_ACTION_FIELDS = operator.attrgetter('tool', 'tool_input', 'log')
+_FINISH_FIELDS = operator.attrgetter('return_values', 'log')
+
+
+@functools.singledispatch
+def _format_message(msg: Any) -> str:
+    """Render one message as "[type]: content", or just its content / str() without a type."""
+    # One getattr per attribute instead of hasattr followed by getattr
+    content = getattr(msg, 'content', _MISSING)
+    if content is _MISSING:
+        return str(msg)
+    msg_type = getattr(msg, 'type', _MISSING)
+    if msg_type is _MISSING:
+        return str(content)
+    return f"[{msg_type}]: {content}"
+
+
+@_format_message.register(str)
+def _(msg: str) -> str:
+    return msg
+
+
+if LANGCHAIN_AVAILABLE:
+    # Real LangChain messages skip the attribute probes above
+    @_format_message.register(BaseMessage)
+    def _(msg: Any) -> str:
+        return f"[{msg.type}]: {msg.content}"
+
+
+def _summarize_document(doc: Any) -> Dict[str, Any]:
+    """Preview of one retrieved document for a retriever step."""
+    content = getattr(doc, 'page_content', _MISSING)
+    if content is _MISSING:
+        return {"content": str(doc)[:200]}
+    preview = content[:200] + "..." if len(content) > 200 else content
+    return {"content_preview": preview, "metadata": getattr(doc, 'metadata', {})}
+
+
+@dataclass(**_DATACLASS_OPTIONS)
 class RunContext:
     """Stores context for an active run."""
     run_id: str
@@ -52,8 +107,6 @@ class RunContext:
     step_count: int = 0
     model: str = ""
     prompt: str = ""
-    tokens_input: int = 0
-    tokens_output: int = 0
     metadata: Dict[str, Any] = field(default_factory=dict)
 
 
@@ -105,6 +158,7 @@ class WatchLLMCallbackHandler(BaseCallbackHandler):
         metadata: Optional[Dict[str, Any]] = None,
         log_prompts: bool = True,
         log_responses: bool = True,
+        background: bool = False,
     ):
         """
         Initialize the WatchLLM callback handler.
@@ -117,6 +171,8 @@ class WatchLLMCallbackHandler(BaseCallbackHandler):
             metadata: Optional metadata to include with all events
             log_prompts: Whether to log full prompt text (set False for privacy)
             log_responses: Whether to log full response text (set False for privacy)
+            background: Hand client.log_* calls to a daemon thread so callbacks only
+                enqueue; call close() to drain it
         """
         if not LANGCHAIN_AVAILABLE:
             raise ImportError(
@@ -126,6 +182,10 @@ class WatchLLMCallbackHandler(BaseCallbackHandler):
         
         super().__init__()
         self.client = client
+        # Bound once so each callback loads one attribute instead of self.client + method
+        self._log_prompt = client.log_prompt_call
+        self._log_step = client.log_agent_step
+        self._log_error = client.log_error
         self.run_id = run_id or str(uuid.uuid4())
         self.user_id = user_id
         self.tags = tags or []
@@ -135,22 +195,106 @@ class WatchLLMCallbackHandler(BaseCallbackHandler):
         
         # Track active runs by their run_id
         self._runs: Dict[str, RunContext] = {}
-        # Track the chain of runs for parent-child relationships
-        self._run_stack: List[str] = []
+        # Innermost started run; each RunContext links back to its parent
+        self._current_run_id: Optional[str] = None
+        
+        # "kind:name" step names, reused across repeated tools and chains
+        self._step_names: Dict[Tuple[str, Any], str] = {}
+        
+        # (log method, kwargs) handed to the background thread when background=True
+        self._tx: Optional[queue.SimpleQueue] = None
+        self._tx_thread: Optional[threading.Thread] = None
+        if background:
+            self._tx = queue.SimpleQueue()
+            self._tx_thread = threading.Thread(
+                target=self._drain, args=(self._tx,), name="watchllm-langchain", daemon=True
+            )
+            self._tx_thread.start()
+    
+    def _log(self, log_method: Callable, **kwargs: Any) -> None:
+        """Call a client log method, or queue it for the background thread."""
+        tx = self._tx
+        if tx is None:
+            log_method(**kwargs)
+        else:
+            tx.put_nowait((log_method, kwargs))
+    
+    @staticmethod
+    def _drain(tx: queue.SimpleQueue) -> None:
+        while True:
+            item = tx.get()
+            if item is None:
+                return
+            log_method, kwargs = item
+            try:
+                log_method(**kwargs)
+            except Exception as e:
+                _logger.debug("Failed to log LangChain event: %s", e, exc_info=True)
+    
+    def close(self, timeout: float = 5.0) -> None:
+        """Log everything still queued for the background thread, stop it and flush the client.
+        
+        The client itself stays open; the handler does not own it.
+        """
+        tx, thread = self._tx, self._tx_thread
+        if tx is not None and thread is not None:
+            # Later callbacks log inline
+            self._tx = self._tx_thread = None
+            tx.put_nowait(None)
+            thread.join(timeout)
+        self.client.flush()
+    
+    def __enter__(self) -> "WatchLLMCallbackHandler":
+        return self
+    
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
     
     def _get_run_context(self, run_id: str) -> RunContext:
         """Get or create a run context."""
         if run_id not in self._runs:
-            parent_id = self._run_stack[-1] if self._run_stack else None
             self._runs[run_id] = RunContext(
                 run_id=run_id,
-                parent_run_id=parent_id
+                parent_run_id=self._current_run_id
             )
         return self._runs[run_id]
     
+    def _start_run(self, run_id: Any, metadata: Dict[str, Any]) -> RunContext:
+        """Start timing a run, make it the current run and return its context."""
+        run_id_str = _run_key(run_id) or uuid.uuid4().hex
+        ctx = self._get_run_context(run_id_str)
+        ctx.start_time = time.time()
+        ctx.metadata = metadata
+        self._current_run_id = run_id_str
+        return ctx
+    
+    def _end_run(self, run_id: Any) -> Optional[RunContext]:
+        """Context of a finished run (None if it was never started)."""
+        return self._cleanup_run(_run_key(run_id))
+    
     def _cleanup_run(self, run_id: str) -> Optional[RunContext]:
         """Clean up a run context and return it."""
-        return self._runs.pop(run_id, None)
+        ctx = self._runs.pop(run_id, None)
+        if ctx is not None and self._current_run_id == run_id:
+            self._current_run_id = ctx.parent_run_id
+        return ctx
+    
+    def _step_name(self, kind: str, name: Any) -> str:
+        """The "kind:name" step name, built once per distinct tool/chain."""
+        key = (kind, name)
+        step_name = self._step_names.get(key)
+        if step_name is None:
+            step_name = self._step_names[key] = f"{kind}:{name}"
+        return step_name
+    
+    def _merge_metadata(self, metadata: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Handler metadata overlaid with a callback's metadata, copying only when both are set."""
+        # Run metadata is only read after this point, so sharing either dict is safe
+        if not metadata:
+            return self.metadata
+        if not self.metadata:
+            return metadata
+        return {**self.metadata, **metadata}
     
     def _serialize_message(self, message: Any) -> str:
         """Serialize a message to string."""
@@ -160,38 +304,34 @@ class WatchLLMCallbackHandler(BaseCallbackHandler):
     
     def _serialize_messages(self, messages: List[Any]) -> str:
         """Serialize a list of messages to a prompt string."""
-        if not messages:
-            return ""
-        
-        parts = []
-        for msg in messages:
-            if hasattr(msg, 'type') and hasattr(msg, 'content'):
-                parts.append(f"[{msg.type}]: {msg.content}")
-            elif hasattr(msg, 'content'):
-                parts.append(str(msg.content))
-            else:
-                parts.append(str(msg))
-        
-        return "\n".join(parts)
+        return "\n".join(map(_format_message, messages))
     
     def _extract_token_usage(self, response: Any) -> Dict[str, int]:
         """Extract token usage from LLM response."""
-        usage = {"input": 0, "output": 0, "total": 0}
-        
-        if response is None:
-            return usage
-            
-        # Try to get from llm_output
-        if hasattr(response, 'llm_output') and response.llm_output:
-            llm_output = response.llm_output
-            if isinstance(llm_output, dict):
-                token_usage = llm_output.get('token_usage', {})
-                if isinstance(token_usage, dict):
-                    usage["input"] = token_usage.get('prompt_tokens', 0)
-                    usage["output"] = token_usage.get('completion_tokens', 0)
-                    usage["total"] = token_usage.get('total_tokens', 0)
-        
-        return usage
+        # OpenAI-style providers report usage in llm_output["token_usage"]
+        llm_output = getattr(response, 'llm_output', None)
+        if isinstance(llm_output, dict):
+            token_usage = llm_output.get('token_usage')
+            if token_usage and isinstance(token_usage, dict):
+                return {
+                    "input": token_usage.get('prompt_tokens', 0),
+                    "output": token_usage.get('completion_tokens', 0),
+                    "total": token_usage.get('total_tokens', 0),
+                }
+        
+        # Newer chat models put it on the message as usage_metadata instead
+        try:
+            usage_metadata = response.generations[0][0].message.usage_metadata
+        except (AttributeError, IndexError, TypeError):
+            usage_metadata = None
+        if isinstance(usage_metadata, dict):
+            return {
+                "input": usage_metadata.get('input_tokens', 0),
+                "output": usage_metadata.get('output_tokens', 0),
+                "total": usage_metadata.get('total_tokens', 0),
+            }
+        
+        return {"input": 0, "output": 0, "total": 0}
     
     def _extract_model_name(self, serialized: Dict[str, Any]) -> str:
         """Extract model name from serialized LLM."""
@@ -228,15 +368,10 @@ class WatchLLMCallbackHandler(BaseCallbackHandler):
         **kwargs: Any,
     ) -> None:
         """Called when LLM starts processing."""
-        run_id_str = str(run_id) if run_id else str(uuid.uuid4())
-        
-        ctx = self._get_run_context(run_id_str)
-        ctx.start_time = time.time()
+        ctx = self._start_run(run_id, self._merge_metadata(metadata))
         ctx.model = self._extract_model_name(serialized)
-        ctx.prompt = prompts[0] if prompts else ""
-        ctx.metadata = {**self.metadata, **(metadata or {})}
-        
-        self._run_stack.append(run_id_str)
+        if self.log_prompts:
+            ctx.prompt = prompts[0] if prompts else ""
     
     def on_chat_model_start(
         self,
@@ -250,24 +385,20 @@ class WatchLLMCallbackHandler(BaseCallbackHandler):
         **kwargs: Any,
     ) -> None:
         """Called when chat model starts processing."""
-        run_id_str = str(run_id) if run_id else str(uuid.uuid4())
-        
-        ctx = self._get_run_context(run_id_str)
-        ctx.start_time = time.time()
+        ctx = self._start_run(run_id, self._merge_metadata(metadata))
         ctx.model = self._extract_model_name(serialized)
         
-        # Flatten messages
-        all_messages = []
-        for msg_list in messages:
-            if isinstance(msg_list, list):
-                all_messages.extend(msg_list)
-            else:
-                all_messages.append(msg_list)
-        
-        ctx.prompt = self._serialize_messages(all_messages)
-        ctx.metadata = {**self.metadata, **(metadata or {})}
-        
-        self._run_stack.append(run_id_str)
+        # The prompt is replaced with "[REDACTED]" when not logged, so don't build it
+        if self.log_prompts:
+            # Flatten messages
+            all_messages = []
+            for msg_list in messages:
+                if isinstance(msg_list, list):
+                    all_messages.extend(msg_list)
+                else:
+                    all_messages.append(msg_list)
+            
+            ctx.prompt = self._serialize_messages(all_messages)
     
     def on_llm_end(
         self,
@@ -278,11 +409,7 @@ class WatchLLMCallbackHandler(BaseCallbackHandler):
         **kwargs: Any,
     ) -> None:
         """Called when LLM finishes processing."""
-        run_id_str = str(run_id) if run_id else ""
-        
-        ctx = self._cleanup_run(run_id_str)
-        if run_id_str in self._run_stack:
-            self._run_stack.remove(run_id_str)
+        ctx = self._end_run(run_id)
         
         if ctx is None:
             return
@@ -290,25 +417,28 @@ class WatchLLMCallbackHandler(BaseCallbackHandler):
         latency_ms = int((time.time() - ctx.start_time) * 1000)
         
         # Extract response text
-        response_text = ""
-        if hasattr(response, 'generations') and response.generations:
-            for gen_list in response.generations:
-                if isinstance(gen_list, list) and len(gen_list) > 0:
-                    gen = gen_list[0]
-                    if hasattr(gen, 'text'):
-                        response_text = gen.text
-                    elif hasattr(gen, 'message') and hasattr(gen.message, 'content'):
-                        response_text = str(gen.message.content)
-                    break
+        response_text = "[REDACTED]"
+        if self.log_responses:
+            response_text = ""
+            if hasattr(response, 'generations') and response.generations:
+                for gen_list in response.generations:
+                    if isinstance(gen_list, list) and len(gen_list) > 0:
+                        gen = gen_list[0]
+                        if hasattr(gen, 'text'):
+                            response_text = gen.text
+                        elif hasattr(gen, 'message') and hasattr(gen.message, 'content'):
+                            response_text = str(gen.message.content)
+                        break
         
         # Extract token usage
         usage = self._extract_token_usage(response)
         
-        self.client.log_prompt_call(
+        self._log(
+            self._log_prompt,
             run_id=self.run_id,
             prompt=ctx.prompt if self.log_prompts else "[REDACTED]",
             model=ctx.model,
-            response=response_text if self.log_responses else "[REDACTED]",
+            response=response_text,
             tokens_input=usage["input"],
             tokens_output=usage["output"],
             latency_ms=latency_ms,
@@ -327,15 +457,12 @@ class WatchLLMCallbackHandler(BaseCallbackHandler):
         **kwargs: Any,
     ) -> None:
         """Called when LLM encounters an error."""
-        run_id_str = str(run_id) if run_id else ""
-        
-        ctx = self._cleanup_run(run_id_str)
-        if run_id_str in self._run_stack:
-            self._run_stack.remove(run_id_str)
+        ctx = self._end_run(run_id)
         
         latency_ms = int((time.time() - (ctx.start_time if ctx else time.time())) * 1000)
         
-        self.client.log_prompt_call(
+        self._log(
+            self._log_prompt,
             run_id=self.run_id,
             prompt=(ctx.prompt if ctx and self.log_prompts else "[REDACTED]"),
             model=(ctx.model if ctx else "unknown"),
@@ -347,7 +474,8 @@ class WatchLLMCallbackHandler(BaseCallbackHandler):
             error={
                 "message": str(error),
                 "type": type(error).__name__,
-                "stack": traceback.format_exc(),
+                # Formatted only if the event is actually serialized
+                "stack": _LazyStack(error),
             },
             tags=self.tags,
             user_id=self.user_id,
@@ -369,18 +497,13 @@ class WatchLLMCallbackHandler(BaseCallbackHandler):
         **kwargs: Any,
     ) -> None:
         """Called when chain starts."""
-        run_id_str = str(run_id) if run_id else str(uuid.uuid4())
-        
-        ctx = self._get_run_context(run_id_str)
-        ctx.start_time = time.time()
-        ctx.metadata = {
+        ctx = self._start_run(run_id, {
             "chain_name": serialized.get("name", "unknown"),
             "chain_type": serialized.get("id", ["unknown"])[-1] if serialized.get("id") else "unknown",
             "inputs": inputs,
-            **(metadata or {}),
-        }
-        
-        self._run_stack.append(run_id_str)
+        })
+        if metadata:
+            ctx.metadata.update(metadata)
     
     def on_chain_end(
         self,
@@ -391,11 +514,7 @@ class WatchLLMCallbackHandler(BaseCallbackHandler):
         **kwargs: Any,
     ) -> None:
         """Called when chain ends."""
-        run_id_str = str(run_id) if run_id else ""
-        
-        ctx = self._cleanup_run(run_id_str)
-        if run_id_str in self._run_stack:
-            self._run_stack.remove(run_id_str)
+        ctx = self._end_run(run_id)
         
         if ctx is None:
             return
@@ -405,10 +524,11 @@ class WatchLLMCallbackHandler(BaseCallbackHandler):
         
         chain_name = ctx.metadata.get("chain_name", "chain")
         
-        self.client.log_agent_step(
+        self._log(
+            self._log_step,
             run_id=self.run_id,
             step_number=ctx.step_count,
-            step_name=f"chain:{chain_name}",
+            step_name=self._step_name("chain", chain_name),
             step_type=StepType.REASONING,
             input_data=ctx.metadata.get("inputs", {}),
             output_data=outputs,
@@ -428,13 +548,10 @@ class WatchLLMCallbackHandler(BaseCallbackHandler):
         **kwargs: Any,
     ) -> None:
         """Called when chain encounters an error."""
-        run_id_str = str(run_id) if run_id else ""
-        
-        ctx = self._cleanup_run(run_id_str)
-        if run_id_str in self._run_stack:
-            self._run_stack.remove(run_id_str)
+        ctx = self._end_run(run_id)
         
-        self.client.log_error(
+        self._log(
+            self._log_error,
             run_id=self.run_id,
             error=error,
             context={"chain_metadata": ctx.metadata if ctx else {}},
@@ -459,19 +576,14 @@ class WatchLLMCallbackHandler(BaseCallbackHandler):
         **kwargs: Any,
     ) -> None:
         """Called when tool starts execution."""
-        run_id_str = str(run_id) if run_id else str(uuid.uuid4())
-        
-        ctx = self._get_run_context(run_id_str)
-        ctx.start_time = time.time()
-        ctx.metadata = {
+        ctx = self._start_run(run_id, {
             "tool_name": serialized.get("name", "unknown"),
             "tool_description": serialized.get("description", ""),
             "input_str": input_str,
             "inputs": inputs or {},
-            **(metadata or {}),
-        }
-        
-        self._run_stack.append(run_id_str)
+        })
+        if metadata:
+            ctx.metadata.update(metadata)
     
     def on_tool_end(
         self,
@@ -482,11 +594,7 @@ class WatchLLMCallbackHandler(BaseCallbackHandler):
         **kwargs: Any,
     ) -> None:
         """Called when tool finishes execution."""
-        run_id_str = str(run_id) if run_id else ""
-        
-        ctx = self._cleanup_run(run_id_str)
-        if run_id_str in self._run_stack:
-            self._run_stack.remove(run_id_str)
+        ctx = self._end_run(run_id)
         
         if ctx is None:
             return
@@ -496,10 +604,11 @@ class WatchLLMCallbackHandler(BaseCallbackHandler):
         
         tool_name = ctx.metadata.get("tool_name", "unknown")
         
-        self.client.log_agent_step(
+        self._log(
+            self._log_step,
             run_id=self.run_id,
             step_number=ctx.step_count,
-            step_name=f"tool:{tool_name}",
+            step_name=self._step_name("tool", tool_name),
             step_type=StepType.TOOL_CALL,
             input_data={
                 "input": ctx.metadata.get("input_str", ""),
@@ -522,15 +631,12 @@ class WatchLLMCallbackHandler(BaseCallbackHandler):
         **kwargs: Any,
     ) -> None:
         """Called when tool encounters an error."""
-        run_id_str = str(run_id) if run_id else ""
-        
-        ctx = self._cleanup_run(run_id_str)
-        if run_id_str in self._run_stack:
-            self._run_stack.remove(run_id_str)
+        ctx = self._end_run(run_id)
         
         tool_name = ctx.metadata.get("tool_name", "unknown") if ctx else "unknown"
         
-        self.client.log_error(
+        self._log(
+            self._log_error,
             run_id=self.run_id,
             error=error,
             context={
@@ -554,20 +660,22 @@ class WatchLLMCallbackHandler(BaseCallbackHandler):
         **kwargs: Any,
     ) -> None:
         """Called when agent takes an action."""
-        run_id_str = str(run_id) if run_id else str(uuid.uuid4())
-        
-        ctx = self._get_run_context(run_id_str)
+        ctx = self._get_run_context(_run_key(run_id) or uuid.uuid4().hex)
         ctx.step_count += 1
         
         # Extract action details
-        tool = getattr(action, 'tool', 'unknown')
-        tool_input = getattr(action, 'tool_input', {})
-        log = getattr(action, 'log', '')
-        
-        self.client.log_agent_step(
+        try:
+            tool, tool_input, log = _ACTION_FIELDS(action)
+        except AttributeError:
+            tool = getattr(action, 'tool', 'unknown')
+            tool_input = getattr(action, 'tool_input', {})
+            log = getattr(action, 'log', '')
+        
+        self._log(
+            self._log_step,
             run_id=self.run_id,
             step_number=ctx.step_count,
-            step_name=f"agent_action:{tool}",
+            step_name=self._step_name("agent_action", tool),
             step_type=StepType.REASONING,
             input_data={"tool_input": tool_input},
             output_data={},
@@ -587,16 +695,18 @@ class WatchLLMCallbackHandler(BaseCallbackHandler):
         **kwargs: Any,
     ) -> None:
         """Called when agent finishes."""
-        run_id_str = str(run_id) if run_id else str(uuid.uuid4())
-        
-        ctx = self._get_run_context(run_id_str)
+        ctx = self._get_run_context(_run_key(run_id) or uuid.uuid4().hex)
         ctx.step_count += 1
         
         # Extract finish details
-        return_values = getattr(finish, 'return_values', {})
-        log = getattr(finish, 'log', '')
-        
-        self.client.log_agent_step(
+        try:
+            return_values, log = _FINISH_FIELDS(finish)
+        except AttributeError:
+            return_values = getattr(finish, 'return_values', {})
+            log = getattr(finish, 'log', '')
+        
+        self._log(
+            self._log_step,
             run_id=self.run_id,
             step_number=ctx.step_count,
             step_name="agent_finish",
@@ -626,17 +736,12 @@ class WatchLLMCallbackHandler(BaseCallbackHandler):
         **kwargs: Any,
     ) -> None:
         """Called when retriever starts."""
-        run_id_str = str(run_id) if run_id else str(uuid.uuid4())
-        
-        ctx = self._get_run_context(run_id_str)
-        ctx.start_time = time.time()
-        ctx.metadata = {
+        ctx = self._start_run(run_id, {
             "retriever_type": serialized.get("name", "unknown"),
             "query": query,
-            **(metadata or {}),
-        }
-        
-        self._run_stack.append(run_id_str)
+        })
+        if metadata:
+            ctx.metadata.update(metadata)
     
     def on_retriever_end(
         self,
@@ -647,11 +752,7 @@ class WatchLLMCallbackHandler(BaseCallbackHandler):
         **kwargs: Any,
     ) -> None:
         """Called when retriever ends."""
-        run_id_str = str(run_id) if run_id else ""
-        
-        ctx = self._cleanup_run(run_id_str)
-        if run_id_str in self._run_stack:
-            self._run_stack.remove(run_id_str)
+        ctx = self._end_run(run_id)
         
         if ctx is None:
             return
@@ -660,17 +761,10 @@ class WatchLLMCallbackHandler(BaseCallbackHandler):
         ctx.step_count += 1
         
         # Serialize documents
-        doc_summaries = []
-        for doc in documents[:5]:  # Limit to 5 docs for logging
-            if hasattr(doc, 'page_content'):
-                doc_summaries.append({
-                    "content_preview": doc.page_content[:200] + "..." if len(doc.page_content) > 200 else doc.page_content,
-                    "metadata": getattr(doc, 'metadata', {}),
-                })
-            else:
-                doc_summaries.append({"content": str(doc)[:200]})
-        
-        self.client.log_agent_step(
+        doc_summaries = [_summarize_document(doc) for doc in documents[:5]]  # Limit to 5 docs for logging
+        
+        self._log(
+            self._log_step,
             run_id=self.run_id,
             step_number=ctx.step_count,
             step_name="retriever",
@@ -696,13 +790,10 @@ class WatchLLMCallbackHandler(BaseCallbackHandler):
         **kwargs: Any,
     ) -> None:
         """Called when retriever encounters an error."""
-        run_id_str = str(run_id) if run_id else ""
-        
-        ctx = self._cleanup_run(run_id_str)
-        if run_id_str in self._run_stack:
-            self._run_stack.remove(run_id_str)
+        ctx = self._end_run(run_id)
         
-        self.client.log_error(
+        self._log(
+            self._log_error,
             run_id=self.run_id,
             error=error,
             context={"retriever_metadata": ctx.metadata if ctx else {}},
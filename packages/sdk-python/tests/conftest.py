@@ -0,0 +1,51 @@
+import os
+import sys
+
+import pytest
+
+# Add src to path to import watchllm
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from watchllm import instrumentation
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "slow: builds real clients; deselect with -m 'not slow'")
+
+
+@pytest.fixture(scope="session")
+def _watchllm_client():
+    """One auto_instrument() client for the session; tests register it as needed."""
+    client = instrumentation.auto_instrument(api_key="test-key", project_id="test-project")
+    # Start every test from a clean slot, as if instrumentation were never enabled
+    instrumentation._global_client = None
+    instrumentation._instrumentation_enabled = False
+    yield client
+    instrumentation._global_client = client
+    instrumentation.disable_instrumentation()
+
+
+@pytest.fixture(autouse=True)
+def _restore_instrumentation_state(monkeypatch):
+    """Leave the global client slot as the test found it, whatever the test does to it.
+
+    Keeps tests independent of ordering, e.g. when pytest-xdist spreads them over
+    worker processes (each worker has its own module state and session client).
+    """
+    monkeypatch.setattr(instrumentation, "_global_client", instrumentation._global_client)
+    monkeypatch.setattr(instrumentation, "_instrumentation_enabled", instrumentation._instrumentation_enabled)
+
+
+@pytest.fixture
+def instrumented(_watchllm_client, monkeypatch):
+    """Instrumentation enabled with the session client, reset afterwards."""
+    monkeypatch.setattr(instrumentation, "_global_client", _watchllm_client)
+    monkeypatch.setattr(instrumentation, "_instrumentation_enabled", True)
+    return _watchllm_client
+
+
+@pytest.fixture
+def not_instrumented(monkeypatch):
+    """Instrumentation disabled for the test, restored afterwards."""
+    monkeypatch.setattr(instrumentation, "_global_client", None)
+    monkeypatch.setattr(instrumentation, "_instrumentation_enabled", False)
@@ -0,0 +1,204 @@
+import importlib
+import json
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+import pytest
+
+# The legacy client ships as two identical copies; run every test against both
+LEGACY_MODULES = ["aisentry.client", "watchllm.aisentry.client"]
+
+
+@pytest.fixture(params=LEGACY_MODULES)
+def legacy(request):
+    return importlib.import_module(request.param)
+
+
+class _Recorder(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.received.put((self.path, dict(self.headers), body))
+        statuses = self.server.statuses
+        self.send_response(statuses.pop(0) if statuses else 200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"{}")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    """Local HTTP server recording every POST as (path, headers, body).
+
+    Responds 200 unless statuses are queued in ``server.statuses``.
+    """
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Recorder)
+    httpd.received = queue.Queue()
+    httpd.statuses = []
+    httpd.base_url = f"http://127.0.0.1:{httpd.server_port}/v1"
+    thread = threading.Thread(target=httpd.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def make_client(legacy, server):
+    """Build clients against the local server; all are closed after the test."""
+    clients = []
+
+    def make(**kwargs):
+        kwargs.setdefault("flush_interval_seconds", 10)
+        client = legacy.WatchLLMClient("k", "p", base_url=server.base_url, **kwargs)
+        clients.append(client)
+        return client
+
+    yield make
+    for client in clients:
+        client.close()
+
+
+def _log(client, run_id="r", prompt="prompt"):
+    client.log_prompt_call(run_id, prompt, "gpt-4o", "response", 1, 1, 1)
+
+
+def _events(body):
+    return json.loads(body)["events"]
+
+
+def test_async_worker_sleeps_until_first_event(legacy, make_client, server):
+    assert legacy.AIOHTTP_AVAILABLE
+    client = make_client(flush_interval_seconds=0.05)
+    with patch.object(client, "flush", wraps=client.flush) as flush:
+        time.sleep(0.2)
+        # Several intervals passed with nothing queued: no periodic flushes
+        flush.assert_not_called()
+
+        _log(client)
+        path, _, _ = server.received.get(timeout=5)
+        assert path == "/v1/events/batch"
+        assert flush.call_count == 1
+
+
+@pytest.mark.parametrize("use_async", [True, False], ids=["aiohttp", "requests"])
+def test_full_batch_is_sent(legacy, make_client, server, monkeypatch, use_async):
+    monkeypatch.setattr(legacy, "AIOHTTP_AVAILABLE", use_async)
+    client = make_client(batch_size=2)
+    assert client._use_async is use_async
+
+    _log(client, run_id="1")
+    _log(client, run_id="2")
+
+    path, headers, body = server.received.get(timeout=5)
+    assert path == "/v1/events/batch"
+    assert headers["Authorization"] == "Bearer k"
+    assert headers["Content-Type"] == "application/json"
+    assert [event["run_id"] for event in _events(body)] == ["1", "2"]
+
+
+def test_async_send_failure_is_requeued_and_retried(make_client, server):
+    server.statuses.append(500)
+    client = make_client(batch_size=2, flush_interval_seconds=0.05)
+
+    _log(client, run_id="1")
+    _log(client, run_id="2")
+
+    _, _, failed = server.received.get(timeout=5)
+    # Retried one flush interval later with the same events
+    _, _, retried = server.received.get(timeout=5)
+    assert _events(retried) == _events(failed)
+    assert client.dropped_events == 0
+
+
+def test_finished_async_sends_are_forgotten(make_client, server):
+    client = make_client(batch_size=1)
+    assert client._use_async
+
+    for run_id in ("1", "2", "3"):
+        _log(client, run_id=run_id)
+    for _ in range(3):
+        server.received.get(timeout=5)
+
+    # Done-callbacks on the loop thread drop each send under _pending_lock
+    deadline = time.monotonic() + 5
+    while client._pending_sends and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not client._pending_sends
+    client.close()
+
+
+def test_msgpack_zstd_batch(make_client, server):
+    msgpack = pytest.importorskip("msgpack")
+    zstandard = pytest.importorskip("zstandard")
+    client = make_client(batch_size=2, wire_format="msgpack", compression="zstd")
+
+    _log(client, run_id="1", prompt="mail me at user@example.com")
+    _log(client, run_id="2")
+
+    _, headers, body = server.received.get(timeout=5)
+    assert headers["Content-Type"] == "application/msgpack"
+    assert headers["Content-Encoding"] == "zstd"
+    events = msgpack.unpackb(zstandard.ZstdDecompressor().decompress(body), raw=False)["events"]
+    assert [event["run_id"] for event in events] == ["1", "2"]
+    assert events[0]["prompt"] == "mail me at [REDACTED]"
+    assert events[0]["status"] == "success"
+
+
+def test_full_queue_drops_oldest(make_client):
+    client = make_client(batch_size=100, max_queue_size=2)
+
+    for run_id in ("1", "2", "3"):
+        _log(client, run_id=run_id)
+
+    assert client.dropped_events == 1
+    assert [event.run_id for event in client._buf] == ["2", "3"]
+
+
+def test_requeue_clips_to_free_capacity(make_client):
+    client = make_client(batch_size=100, max_queue_size=3)
+    _log(client, run_id="1")
+    _log(client, run_id="2")
+    queued = list(client._buf)
+
+    client._requeue_events([b'{"run_id":"a"}', b'{"run_id":"b"}', b'{"run_id":"c"}'])
+
+    # One free slot: the first failed event goes back, the other two are counted as dropped
+    assert list(client._buf) == queued + [b'{"run_id":"a"}']
+    assert client.dropped_events == 2
+
+
+@pytest.mark.parametrize("text", [
+    "x\n123-45-6789",
+    "x\t4111 1111 1111 1111",
+    "4111\n1111\n1111\n1111",
+    "x\x0b123-45-6789",
+    "メール\nuser@example.com",
+])
+def test_pii_after_escaped_whitespace_is_redacted(make_client, text):
+    client = make_client(redact_pii=True)
+
+    payload = client._redact_pii(json.dumps({"prompt": text}).encode("utf-8"))
+
+    prompt = json.loads(payload)["prompt"]
+    assert "[REDACTED]" in prompt
+    assert not any(pii in prompt for pii in ("6789", "4111", "user@"))
+
+
+def test_sample_rate_can_change_after_init(make_client):
+    client = make_client(batch_size=100)
+    _log(client, run_id="kept")
+
+    client.sample_rate = 0
+    _log(client, run_id="dropped")
+    assert len(client._buf) == 1
+
+    client.sample_rate = 1.0
+    _log(client, run_id="kept-again")
+    assert len(client._buf) == 2
@@ -1,15 +1,32 @@
 import unittest
 from unittest.mock import patch, MagicMock
 import json
-import time
+import random
+import threading
 import sys
 import os
+from dataclasses import fields
 
 # Add src to path to import watchllm
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
 
+from watchllm import client as client_module
 from watchllm.client import WatchLLMClient, init, EventType, Status
 
+
+def _fuzz_blobs(n=3000):
+    """Short JSON-ish byte strings dense in email, card-number and escape fragments."""
+    rng = random.Random(0)
+    pieces = [b'a', b'Z', b'0', b'9', b'.', b'@', b'-', b' ', b'_', b'%', b'+', b'"', b'\\', b'n',
+              b'com', b'x.io', b'1234', b'5678 ', b'@ex.com', b'\\n', b'\\\\', b'\x0b', b'\t']
+    for _ in range(n):
+        yield b"".join(rng.choice(pieces) for _ in range(rng.randint(1, 16)))
+
+
+def _redact_with(patterns, blob):
+    return client_module._splice_redactions(blob, client_module._pii_spans(patterns, blob))
+
+
 class TestWatchLLMClient(unittest.TestCase):
     def setUp(self):
         self.api_key = "test_key"
@@ -23,14 +40,13 @@ class TestWatchLLMClient(unittest.TestCase):
     def tearDown(self):
         self.client.close()
 
-    @patch('watchllm.client.requests.Session')
-    def test_log_prompt_call(self, mock_session_cls):
+    @patch('watchllm.client.urllib3.PoolManager')
+    def test_log_prompt_call(self, mock_pool_cls):
         # Setup mock
-        mock_session = mock_session_cls.return_value
+        mock_pool = mock_pool_cls.return_value
         mock_response = MagicMock()
-        mock_response.json.return_value = {"success": True}
-        mock_response.status_code = 200
-        mock_session.post.return_value = mock_response
+        mock_response.status = 200
+        mock_pool.request.return_value = mock_response
 
         # Log event
         self.client.log_prompt_call(
@@ -47,13 +63,15 @@ class TestWatchLLMClient(unittest.TestCase):
         self.client.flush()
 
         # Verify call
-        mock_session.post.assert_called_once()
-        args, kwargs = mock_session.post.call_args
+        mock_pool.request.assert_called_once()
+        args, kwargs = mock_pool.request.call_args
         
-        self.assertIn('/events/batch', args[0])
+        self.assertEqual(args[0], 'POST')
+        self.assertIn('/events/batch', args[1])
         self.assertEqual(kwargs['headers']['Authorization'], 'Bearer test_key')
         
-        body = kwargs['json']
+        self.assertEqual(kwargs['headers']['Content-Type'], 'application/json')
+        body = json.loads(kwargs['body'])
         self.assertEqual(len(body['events']), 1)
         event = body['events'][0]
         
@@ -64,10 +82,17 @@ class TestWatchLLMClient(unittest.TestCase):
         # (10 * 0.005 + 5 * 0.015) / 1000 = (0.05 + 0.075) / 1000 = 0.125 / 1000 = 0.000125
         self.assertAlmostEqual(event['cost_estimate_usd'], 0.000125)
 
-    @patch('watchllm.client.requests.Session')
-    def test_batching(self, mock_session_cls):
-        mock_session = mock_session_cls.return_value
-        mock_session.post.return_value.status_code = 200
+    @patch('watchllm.client.urllib3.PoolManager')
+    def test_batching(self, mock_pool_cls):
+        mock_pool = mock_pool_cls.return_value
+        sent = threading.Event()
+
+        def _request(*args, **kwargs):
+            sent.set()
+            response = MagicMock()
+            response.status = 200
+            return response
+        mock_pool.request.side_effect = _request
 
         # Create client with batch size 2
         client = WatchLLMClient(
@@ -78,21 +103,250 @@ class TestWatchLLMClient(unittest.TestCase):
             client.log_prompt_call(run_id="1", prompt="p1", model="m", response="r", tokens_input=1, tokens_output=1, latency_ms=1)
             
             # Should not have flushed yet (size 1 < 2)
-            mock_session.post.assert_not_called()
+            mock_pool.request.assert_not_called()
 
             client.log_prompt_call(run_id="2", prompt="p2", model="m", response="r", tokens_input=1, tokens_output=1, latency_ms=1)
             
-            # Should flush automatically soon (since size >= 2). 
-            # However, the flush is in a background thread, so we wait briefly.
-            time.sleep(1.5) 
+            # Should flush automatically (since size >= 2) from the background thread
+            self.assertTrue(sent.wait(timeout=5.0))
             
-            mock_session.post.assert_called()
-            args, kwargs = mock_session.post.call_args
-            self.assertEqual(len(kwargs['json']['events']), 2)
+            args, kwargs = mock_pool.request.call_args
+            self.assertEqual(len(json.loads(kwargs['body'])['events']), 2)
             
         finally:
             client.close()
 
+    @patch('watchllm.client.urllib3.PoolManager')
+    def test_partial_batch_flushed_at_deadline(self, mock_pool_cls):
+        mock_pool = mock_pool_cls.return_value
+        sent = threading.Event()
+
+        def _request(*args, **kwargs):
+            sent.set()
+            return MagicMock(status=200)
+        mock_pool.request.side_effect = _request
+
+        client = WatchLLMClient("k", "p", batch_size=10, flush_interval_seconds=0.05)
+        self.addCleanup(client.close)
+
+        # The idle worker sleeps until something is queued; one entry is enough to arm the deadline
+        client.log_prompt_call(run_id="1", prompt="p", model="m", response="r", tokens_input=1, tokens_output=1, latency_ms=1)
+        self.assertTrue(sent.wait(timeout=5.0))
+
+        sent.clear()
+        client.log_prompt_calls_bulk([dict(run_id="2", prompt="p", model="m", response="r",
+                                           tokens_input=1, tokens_output=1, latency_ms=1)])
+        self.assertTrue(sent.wait(timeout=5.0))
+
+    @patch('watchllm.client.urllib3.PoolManager')
+    def test_log_prompt_calls(self, mock_pool_cls):
+        mock_pool = mock_pool_cls.return_value
+        mock_pool.request.return_value.status = 200
+
+        client = WatchLLMClient(
+            api_key="k", project_id="p", batch_size=1000, flush_interval_seconds=10
+        )
+        self.addCleanup(client.close)
+
+        n = 150
+        event_ids = client.log_prompt_calls(
+            run_ids=[f"run-{i}" for i in range(n)],
+            prompts=["p"] * n,
+            models=["gpt-4o"] * n,
+            responses=["r"] * n,
+            tokens_input=[10] * n,
+            tokens_output=[5] * n,
+            latency_ms=[100] * n,
+        )
+        self.assertEqual(len(event_ids), n)
+        client.flush()
+
+        # Split into request-sized chunks of at most 100 events (sent concurrently, in any order)
+        sent = [json.loads(call.kwargs['body'])['events'] for call in mock_pool.request.call_args_list]
+        self.assertEqual(sorted(len(events) for events in sent), [50, 100])
+        events = {event['run_id']: event for chunk in sent for event in chunk}
+        self.assertEqual(len(events), n)
+        event = events["run-149"]
+        # Same shape as an encoded PromptCallEvent
+        self.assertEqual(list(event), [f.name for f in fields(client_module.PromptCallEvent)])
+        self.assertEqual(event['event_type'], 'prompt_call')
+        self.assertEqual(event['status'], 'success')
+        self.assertAlmostEqual(event['cost_estimate_usd'], 0.000125)
+
+        with self.assertRaises(ValueError):
+            client.log_prompt_calls(["a"], [], [], [], [], [], [])
+        with self.assertRaises(TypeError):
+            client.log_prompt_calls(["a"], ["p"], ["m"], ["r"], [1], [1], [1], prompt_template_id="t")
+
+    @patch('watchllm.client.urllib3.PoolManager')
+    def test_log_prompt_calls_timestamps_per_event(self, mock_pool_cls):
+        mock_pool = mock_pool_cls.return_value
+        mock_pool.request.return_value.status = 200
+
+        client = WatchLLMClient("k", "p", flush_interval_seconds=10)
+        self.addCleanup(client.close)
+        seconds = iter(range(60))
+        with patch.object(client, "_get_timestamp", side_effect=lambda: f"2024-01-01T00:00:{next(seconds):02d}Z"):
+            client.log_prompt_calls(["a", "b"], ["p"] * 2, ["m"] * 2, ["r"] * 2, [1] * 2, [1] * 2, [1] * 2)
+        client.flush()
+
+        events = json.loads(mock_pool.request.call_args.kwargs['body'])['events']
+        timestamps = [event['timestamp'] for event in events]
+        self.assertEqual(len(set(timestamps)), 2)
+        self.assertLess(timestamps[0], timestamps[1])
+
+    @patch('watchllm.client.urllib3.PoolManager')
+    def test_log_prompt_calls_bulk(self, mock_pool_cls):
+        from types import SimpleNamespace
+        mock_pool = mock_pool_cls.return_value
+        mock_pool.request.return_value.status = 200
+
+        client = WatchLLMClient("k", "p", flush_interval_seconds=10)
+        self.addCleanup(client.close)
+        record = SimpleNamespace(
+            run_id="run-2", prompt="p", model="gpt-4o", response="r", tokens_input=10,
+            tokens_output=5, latency_ms=100, status=Status.ERROR, error={"message": "boom"},
+            response_metadata={"provider": "openai"}, tags=("auto-instrumented",), user_id="u",
+        )
+        event_ids = client.log_prompt_calls_bulk([
+            dict(run_id="run-1", prompt="p", model="gpt-4o", response="r",
+                 tokens_input=10, tokens_output=5, latency_ms=100),
+            record,
+        ])
+        self.assertEqual(len(event_ids), 2)
+        client.flush()
+
+        events = json.loads(mock_pool.request.call_args.kwargs['body'])['events']
+        self.assertEqual([event['run_id'] for event in events], ["run-1", "run-2"])
+        self.assertEqual(events[1]['status'], 'error')
+        self.assertEqual(events[1]['tags'], ["auto-instrumented"])
+
+    @patch('watchllm.client.urllib3.PoolManager')
+    def test_gzip_compression(self, mock_pool_cls):
+        import gzip
+        mock_pool = mock_pool_cls.return_value
+        mock_pool.request.return_value.status = 200
+
+        client = WatchLLMClient("k", "p", compression="gzip", flush_interval_seconds=10)
+        self.addCleanup(client.close)
+        client.log_prompt_call(run_id="r", prompt="hello " * 100, model="m", response="r",
+                               tokens_input=1, tokens_output=1, latency_ms=1)
+        client.flush()
+
+        args, kwargs = mock_pool.request.call_args
+        self.assertEqual(kwargs['headers']['Content-Encoding'], 'gzip')
+        body = json.loads(gzip.decompress(kwargs['body']))
+        self.assertEqual(body['events'][0]['prompt'], "hello " * 100)
+
+        with self.assertRaises(ValueError):
+            WatchLLMClient("k", "p", compression="brotli")
+
+    def test_generated_encoder_matches_fields(self):
+        from dataclasses import asdict
+        from watchllm.client import _ENCODERS, PromptCallEvent
+
+        event = PromptCallEvent(event_id="e", project_id="p", run_id="r", timestamp="t", model="m")
+        self.assertEqual(_ENCODERS[PromptCallEvent](event), asdict(event))
+
+    def test_adaptive_flush_timeout(self):
+        client = WatchLLMClient("k", "p", adaptive=True, flush_interval_seconds=5)
+        try:
+            # No measurements yet: fall back to the static interval
+            self.assertEqual(client._flush_timeout(), 5)
+
+            # 1 event/s with a 0.5s flush cost: sqrt(2 * 0.5 / 1) = 1s
+            client._ewma_interarrival = 1.0
+            client._ewma_flush_cost = 0.5
+            self.assertAlmostEqual(client._flush_timeout(), 1.0)
+
+            # Above lambda* = 2 / F0 the timer is vacuous and flushing is greedy
+            client._ewma_interarrival = 0.1
+            self.assertEqual(client._flush_timeout(), 0.0)
+        finally:
+            client.close()
+
+    @patch('watchllm.client.urllib3.PoolManager')
+    def test_log_error_caps_stack_frames(self, mock_pool_cls):
+        mock_pool = mock_pool_cls.return_value
+        mock_pool.request.return_value.status = 200
+
+        client = WatchLLMClient("k", "p", stack_trace_max_frames=2, flush_interval_seconds=10)
+        self.addCleanup(client.close)
+
+        def recurse(depth):
+            if depth == 0:
+                raise ValueError("boom")
+            recurse(depth - 1)
+
+        try:
+            recurse(10)
+        except ValueError as e:
+            client.log_error(run_id="r", error=e)
+        client.flush()
+
+        event = json.loads(mock_pool.request.call_args.kwargs['body'])['events'][0]
+        self.assertEqual(event['stack_trace'].count('File "'), 2)
+        self.assertIn("ValueError: boom", event['stack_trace'])
+
+    def test_sampled_out_error_skips_stack_formatting(self):
+        client = WatchLLMClient("k", "p", sample_rate=0.0, flush_interval_seconds=10)
+        self.addCleanup(client.close)
+
+        with patch('watchllm.client.traceback.format_exception') as format_exception:
+            try:
+                raise ValueError("boom")
+            except ValueError as e:
+                client.log_error(run_id="r", error=e)
+            format_exception.assert_not_called()
+
+    @patch('watchllm.client.urllib3.PoolManager')
+    def test_batch_post_not_retried_after_possible_ingest(self, mock_pool_cls):
+        client = WatchLLMClient("k", "p", flush_interval_seconds=10)
+        self.addCleanup(client.close)
+        client._get_pool()
+
+        retries = mock_pool_cls.call_args.kwargs['retries']
+        self.assertEqual(retries.read, 0)
+        self.assertTrue(retries.is_retry("POST", 503))
+        self.assertTrue(retries.is_retry("POST", 429))
+        self.assertFalse(retries.is_retry("POST", 500))
+        self.assertFalse(retries.is_retry("POST", 502))
+
+    @patch('watchllm.client.urllib3.PoolManager')
+    def test_full_queue_drops_oldest(self, mock_pool_cls):
+        mock_pool_cls.return_value.request.return_value.status = 200
+        client = WatchLLMClient("k", "p", max_queue_size=2, batch_size=100, flush_interval_seconds=10)
+        try:
+            for run_id in ("1", "2", "3"):
+                client.log_prompt_call(run_id=run_id, prompt="p", model="m", response="r",
+                                       tokens_input=1, tokens_output=1, latency_ms=1)
+
+            self.assertEqual(client.dropped_events, 1)
+            queued = [json.loads(blob)['run_id'] for _, blob in client._events]
+            self.assertEqual(queued, ["2", "3"])
+        finally:
+            client.close()
+
+    @patch('watchllm.client.urllib3.PoolManager')
+    def test_full_queue_bounds_bulk_events(self, mock_pool_cls):
+        mock_pool_cls.return_value.request.return_value.status = 200
+        client = WatchLLMClient("k", "p", max_queue_size=5, batch_size=100, flush_interval_seconds=10)
+        call = dict(prompt="p", model="m", response="r", tokens_input=1, tokens_output=1, latency_ms=1)
+        try:
+            # Bulk entries hold several events each, and the bound counts events, not entries
+            client.log_prompt_calls_bulk([dict(call, run_id=f"a{i}") for i in range(3)])
+            client.log_prompt_calls_bulk([dict(call, run_id=f"b{i}") for i in range(3)])
+            self.assertEqual(client.dropped_events, 3)
+            self.assertEqual(client._queued_events, 3)
+
+            # A bulk call larger than the queue is split so its newest events still fit
+            client.log_prompt_calls_bulk([dict(call, run_id=f"c{i}") for i in range(7)])
+            self.assertEqual(client.dropped_events, 11)
+            queued = [event['run_id'] for _, blob in client._events for event in json.loads(b"[" + blob + b"]")]
+            self.assertEqual(queued, ["c5", "c6"])
+        finally:
+            client.close()
+
     def test_pii_redaction(self):
         client = WatchLLMClient("k", "p", redact_pii=True)
         
@@ -101,11 +355,62 @@ class TestWatchLLMClient(unittest.TestCase):
             "text": "Call me at 555-123-4567 or email test@test.org"
         }
         
-        redacted = client._redact_pii(event_dict)
+        # Redaction runs on the serialized event bytes
+        redacted = json.loads(client._redact_bytes(json.dumps(event_dict).encode("utf-8")))
         
         self.assertEqual(redacted['email'], "[REDACTED_EMAIL]")
         self.assertIn("[REDACTED_EMAIL]", redacted['text'])
         client.close()
 
+    def test_pii_redaction_after_backslashes(self):
+        client = WatchLLMClient("k", "p", redact_pii=True)
+        cases = {
+            # Serialized as \\user@..., so the email follows an escaped backslash
+            "\\user@example.com": "\\[REDACTED_EMAIL]",
+            "C:\\\\user@example.com": "C:\\\\[REDACTED_EMAIL]",
+            "\nuser@example.com": "\n[REDACTED_EMAIL]",
+            "\\\nuser@example.com": "\\\n[REDACTED_EMAIL]",
+            # A literal backslash-n: the n belongs to the address
+            "\\nuser@example.com": "\\[REDACTED_EMAIL]",
+        }
+        for text, expected in cases.items():
+            blob = json.dumps({"text": text}).encode("utf-8")
+            self.assertEqual(json.loads(client._redact_bytes(blob))["text"], expected, text)
+        client.close()
+
+    def test_pii_redaction_after_unicode_escapes(self):
+        client = WatchLLMClient("k", "p", redact_pii=True)
+        self.addCleanup(client.close)
+        cases = {
+            "\u30e1\u30fc\u30ebjohn@example.com": "\u30e1\u30fc\u30eb[REDACTED_EMAIL]",
+            "x\x0bjohn@example.com": "x\x0b[REDACTED_EMAIL]",
+            "x\x0b4111 1111 1111 1111": "x\x0b[REDACTED_CC]",
+        }
+        serializers = [False, True] if client_module.ORJSON_AVAILABLE else [False]
+        for use_orjson in serializers:
+            with patch.object(client_module, "ORJSON_AVAILABLE", use_orjson):
+                for text, expected in cases.items():
+                    blob = client_module._dumps({"text": text})
+                    self.assertEqual(json.loads(client._redact_bytes(blob))["text"], expected, (use_orjson, text))
+                    # \u escapes as the server or another serializer might write them
+                    blob = json.dumps({"text": text}, ensure_ascii=True).encode("utf-8")
+                    self.assertEqual(json.loads(client._redact_bytes(blob))["text"], expected, text)
+
+    @unittest.skipUnless(client_module.RE2_AVAILABLE, "google-re2 is not installed")
+    def test_re2_redaction_matches_re(self):
+        for blob in _fuzz_blobs():
+            self.assertEqual(
+                _redact_with(client_module._RE2_PATTERNS, blob),
+                _redact_with(client_module._RE_PATTERNS, blob),
+                blob,
+            )
+
+    @unittest.skipUnless(client_module._HS_DB is not None, "hyperscan is not installed")
+    def test_hyperscan_prefilter_never_skips_pii(self):
+        for blob in _fuzz_blobs():
+            if _redact_with(client_module._RE_PATTERNS, blob) != blob:
+                self.assertTrue(client_module._hyperscan_may_match(blob), blob)
+        self.assertFalse(client_module._hyperscan_may_match(b'{"prompt":"nothing to see"}'))
+
 if __name__ == '__main__':
     unittest.main()
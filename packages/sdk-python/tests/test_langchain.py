@@ -3,27 +3,53 @@ Tests for WatchLLM LangChain Integration
 """
 
 import pytest
-import time
-from unittest.mock import Mock, MagicMock, patch
+import uuid
+from dataclasses import dataclass
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
 from typing import Dict, List, Any
 
-# Import without LangChain first to test graceful degradation
+from watchllm.client import _DATACLASS_OPTIONS
+
 import sys
 
 
+# Module names whose None entries make both LangChain import paths fail
+_LANGCHAIN_MODULES = (
+    'langchain_core', 'langchain_core.callbacks', 'langchain',
+    'langchain.callbacks.base', 'langchain.schema',
+)
+
+
+@pytest.fixture
+def langchain_missing(monkeypatch):
+    """Make LangChain unimportable and drop watchllm.langchain so it is re-imported without it.
+
+    Only these sys.modules keys (and the watchllm.langchain package attribute, which the
+    re-import rebinds) are touched, and they are restored after the test.
+    """
+    import watchllm
+    import watchllm.langchain
+    
+    monkeypatch.setattr(watchllm, "langchain", watchllm.langchain)
+    for name in _LANGCHAIN_MODULES:
+        monkeypatch.setitem(sys.modules, name, None)
+    monkeypatch.delitem(sys.modules, 'watchllm.langchain')
+
+
 class TestLangChainImportWithoutLangChain:
     """Test behavior when LangChain is not installed."""
     
-    def test_import_without_langchain(self):
+    def test_import_without_langchain(self, langchain_missing):
         """Should raise ImportError with helpful message when LangChain not installed."""
-        # Mock langchain not being available
-        with patch.dict(sys.modules, {'langchain_core': None, 'langchain_core.callbacks': None}):
-            # Force reimport
-            if 'watchllm.langchain' in sys.modules:
-                del sys.modules['watchllm.langchain']
-            
-            # The import should still work, but instantiation should fail
-            # This is actually handled gracefully in the module
+        import importlib
+        
+        guarded = importlib.import_module('watchllm.langchain')
+        
+        # The import should still work, but instantiation should fail
+        assert guarded.LANGCHAIN_AVAILABLE is False
+        with pytest.raises(ImportError, match="pip install langchain"):
+            guarded.WatchLLMCallbackHandler(client=Mock())
 
 
 # Mock LangChain types for testing without requiring langchain installation
@@ -31,16 +57,30 @@ class MockBaseCallbackHandler:
     pass
 
 
-class MockLLMResult:
+class MockLLMResult(SimpleNamespace):
     def __init__(self, text="", tokens_input=10, tokens_output=20):
-        self.generations = [[MagicMock(text=text, message=MagicMock(content=text))]]
-        self.llm_output = {
-            "token_usage": {
-                "prompt_tokens": tokens_input,
-                "completion_tokens": tokens_output,
-                "total_tokens": tokens_input + tokens_output,
-            }
-        }
+        super().__init__(
+            generations=[[SimpleNamespace(text=text, message=SimpleNamespace(content=text))]],
+            llm_output={
+                "token_usage": {
+                    "prompt_tokens": tokens_input,
+                    "completion_tokens": tokens_output,
+                    "total_tokens": tokens_input + tokens_output,
+                }
+            },
+        )
+
+
+@dataclass(**_DATACLASS_OPTIONS)
+class FakeMsg:
+    type: str
+    content: str
+
+
+@dataclass(**_DATACLASS_OPTIONS)
+class FakeDoc:
+    page_content: str
+    metadata: Dict[str, Any]
 
 
 class MockAgentAction:
@@ -56,7 +96,24 @@ class MockAgentFinish:
         self.log = log
 
 
-@pytest.fixture
+def fake_clock(monkeypatch, *readings):
+    """Feed the handler's time.time() calls from readings instead of the real clock."""
+    monkeypatch.setattr("watchllm.langchain.time", SimpleNamespace(time=iter(readings).__next__))
+
+
+@pytest.fixture(scope="module", autouse=True)
+def _langchain_patches(request):
+    """Pretend LangChain is installed, once for the whole module."""
+    patches = [
+        patch('watchllm.langchain.LANGCHAIN_AVAILABLE', True),
+        patch('watchllm.langchain.BaseCallbackHandler', MockBaseCallbackHandler),
+    ]
+    for p in patches:
+        p.start()
+        request.addfinalizer(p.stop)
+
+
+@pytest.fixture(scope="class")
 def mock_client():
     """Create a mock WatchLLMClient."""
     client = Mock()
@@ -66,58 +123,59 @@ def mock_client():
     return client
 
 
-@pytest.fixture
+@pytest.fixture(scope="class")
 def handler(mock_client):
-    """Create a callback handler with mocked client."""
-    # Patch the LangChain import check
-    with patch('watchllm.langchain.LANGCHAIN_AVAILABLE', True):
-        with patch('watchllm.langchain.BaseCallbackHandler', MockBaseCallbackHandler):
-            from watchllm.langchain import WatchLLMCallbackHandler
-            return WatchLLMCallbackHandler(
-                client=mock_client,
-                run_id="test-run-123",
-                user_id="user-456",
-                tags=["test", "integration"],
-            )
+    """Create a callback handler with mocked client, shared by a test class."""
+    from watchllm.langchain import WatchLLMCallbackHandler
+    return WatchLLMCallbackHandler(
+        client=mock_client,
+        run_id="test-run-123",
+        user_id="user-456",
+        tags=["test", "integration"],
+    )
 
 
 class TestWatchLLMCallbackHandler:
     """Tests for WatchLLMCallbackHandler."""
     
+    @pytest.fixture(autouse=True)
+    def _reset(self, handler, mock_client):
+        """Give each test a clean call history and run table on the shared handler."""
+        yield
+        mock_client.reset_mock()
+        handler._runs.clear()
+        handler._current_run_id = None
+    
     def test_initialization(self, mock_client):
         """Test handler initializes with correct config."""
-        with patch('watchllm.langchain.LANGCHAIN_AVAILABLE', True):
-            with patch('watchllm.langchain.BaseCallbackHandler', MockBaseCallbackHandler):
-                from watchllm.langchain import WatchLLMCallbackHandler
-                
-                handler = WatchLLMCallbackHandler(
-                    client=mock_client,
-                    run_id="custom-run",
-                    user_id="user-123",
-                    tags=["prod"],
-                    metadata={"env": "production"},
-                    log_prompts=False,
-                    log_responses=True,
-                )
-                
-                assert handler.run_id == "custom-run"
-                assert handler.user_id == "user-123"
-                assert handler.tags == ["prod"]
-                assert handler.log_prompts is False
-                assert handler.log_responses is True
+        from watchllm.langchain import WatchLLMCallbackHandler
+        
+        handler = WatchLLMCallbackHandler(
+            client=mock_client,
+            run_id="custom-run",
+            user_id="user-123",
+            tags=["prod"],
+            metadata={"env": "production"},
+            log_prompts=False,
+            log_responses=True,
+        )
+        
+        assert handler.run_id == "custom-run"
+        assert handler.user_id == "user-123"
+        assert handler.tags == ["prod"]
+        assert handler.log_prompts is False
+        assert handler.log_responses is True
     
-    def test_auto_generated_run_id(self, mock_client):
+    def test_auto_generated_run_id(self, mock_client, monkeypatch):
         """Test that run_id is auto-generated if not provided."""
-        with patch('watchllm.langchain.LANGCHAIN_AVAILABLE', True):
-            with patch('watchllm.langchain.BaseCallbackHandler', MockBaseCallbackHandler):
-                from watchllm.langchain import WatchLLMCallbackHandler
-                
-                handler = WatchLLMCallbackHandler(client=mock_client)
-                
-                assert handler.run_id is not None
-                assert len(handler.run_id) == 36  # UUID format
+        from watchllm.langchain import WatchLLMCallbackHandler
+        
+        monkeypatch.setattr("watchllm.langchain.uuid.uuid4", lambda: uuid.UUID("12345678-1234-5678-1234-567812345678"))
+        handler = WatchLLMCallbackHandler(client=mock_client)
+        
+        assert handler.run_id == "12345678-1234-5678-1234-567812345678"
     
-    def test_on_llm_start_and_end(self, handler, mock_client):
+    def test_on_llm_start_and_end(self, handler, mock_client, monkeypatch):
         """Test LLM start and end callbacks."""
         serialized = {
             "name": "ChatOpenAI",
@@ -126,6 +184,8 @@ class TestWatchLLMCallbackHandler:
         }
         
         run_id = "llm-run-1"
+        # 10ms of simulated processing between start and end
+        fake_clock(monkeypatch, 100.0, 100.01)
         
         # Simulate LLM start
         handler.on_llm_start(
@@ -134,9 +194,6 @@ class TestWatchLLMCallbackHandler:
             run_id=run_id,
         )
         
-        # Small delay to simulate processing
-        time.sleep(0.01)
-        
         # Simulate LLM end
         handler.on_llm_end(
             response=MockLLMResult(text="4", tokens_input=5, tokens_output=1),
@@ -145,14 +202,15 @@ class TestWatchLLMCallbackHandler:
         
         # Verify log_prompt_call was called
         mock_client.log_prompt_call.assert_called_once()
-        call_args = mock_client.log_prompt_call.call_args
-        
-        assert call_args.kwargs["run_id"] == "test-run-123"
-        assert call_args.kwargs["model"] == "gpt-4"
-        assert call_args.kwargs["prompt"] == "What is 2+2?"
-        assert call_args.kwargs["response"] == "4"
-        assert call_args.kwargs["tokens_input"] == 5
-        assert call_args.kwargs["tokens_output"] == 1
+        kwargs = mock_client.log_prompt_call.call_args.kwargs
+        
+        assert kwargs["run_id"] == "test-run-123"
+        assert kwargs["model"] == "gpt-4"
+        assert kwargs["prompt"] == "What is 2+2?"
+        assert kwargs["response"] == "4"
+        assert kwargs["tokens_input"] == 5
+        assert kwargs["tokens_output"] == 1
+        assert kwargs["latency_ms"] == 10
     
     def test_on_llm_error(self, handler, mock_client):
         """Test LLM error callback."""
@@ -163,18 +221,18 @@ class TestWatchLLMCallbackHandler:
         handler.on_llm_error(error=ValueError("API error"), run_id=run_id)
         
         mock_client.log_prompt_call.assert_called_once()
-        call_args = mock_client.log_prompt_call.call_args
+        kwargs = mock_client.log_prompt_call.call_args.kwargs
         
-        assert call_args.kwargs["status"].value == "error"
-        assert "API error" in call_args.kwargs["error"]["message"]
+        assert kwargs["status"].value == "error"
+        assert "API error" in kwargs["error"]["message"]
     
     def test_on_chat_model_start(self, handler, mock_client):
         """Test chat model start with messages."""
         serialized = {"name": "ChatOpenAI", "kwargs": {"model": "gpt-4o"}}
         
         messages = [[
-            MagicMock(type="system", content="You are helpful"),
-            MagicMock(type="human", content="Hello!"),
+            FakeMsg("system", "You are helpful"),
+            FakeMsg("human", "Hello!"),
         ]]
         
         run_id = "chat-run-1"
@@ -190,16 +248,17 @@ class TestWatchLLMCallbackHandler:
             run_id=run_id,
         )
         
-        call_args = mock_client.log_prompt_call.call_args
-        prompt = call_args.kwargs["prompt"]
+        kwargs = mock_client.log_prompt_call.call_args.kwargs
+        prompt = kwargs["prompt"]
         
         assert "[system]:" in prompt.lower()
         assert "[human]:" in prompt.lower()
     
-    def test_on_tool_start_and_end(self, handler, mock_client):
+    def test_on_tool_start_and_end(self, handler, mock_client, monkeypatch):
         """Test tool execution callbacks."""
         serialized = {"name": "Calculator", "kwargs": {"description": "Math tool"}}
         run_id = "tool-run-1"
+        fake_clock(monkeypatch, 100.0, 100.01)
         
         handler.on_tool_start(
             serialized=serialized,
@@ -207,17 +266,16 @@ class TestWatchLLMCallbackHandler:
             run_id=run_id,
         )
         
-        time.sleep(0.01)
-        
         handler.on_tool_end(output="4", run_id=run_id)
         
         mock_client.log_agent_step.assert_called_once()
-        call_args = mock_client.log_agent_step.call_args
+        kwargs = mock_client.log_agent_step.call_args.kwargs
         
-        assert call_args.kwargs["step_name"] == "tool:Calculator"
-        assert call_args.kwargs["step_type"].value == "tool_call"
-        assert call_args.kwargs["input_data"]["input"] == "2 + 2"
-        assert call_args.kwargs["output_data"]["output"] == "4"
+        assert kwargs["step_name"] == "tool:Calculator"
+        assert kwargs["step_type"].value == "tool_call"
+        assert kwargs["input_data"]["input"] == "2 + 2"
+        assert kwargs["output_data"]["output"] == "4"
+        assert kwargs["latency_ms"] == 10
     
     def test_on_chain_start_and_end(self, handler, mock_client):
         """Test chain execution callbacks."""
@@ -236,9 +294,23 @@ class TestWatchLLMCallbackHandler:
         )
         
         mock_client.log_agent_step.assert_called_once()
-        call_args = mock_client.log_agent_step.call_args
+        kwargs = mock_client.log_agent_step.call_args.kwargs
+        
+        assert kwargs["step_name"] == "chain:LLMChain"
+    
+    def test_chain_callback_metadata_is_kept(self, handler, mock_client):
+        """Metadata passed to on_chain_start should reach the run context alongside the chain fields."""
+        handler.on_chain_start(
+            serialized={"name": "LLMChain"},
+            inputs={},
+            run_id="chain-run-2",
+            metadata={"ls_run_depth": 1},
+        )
+        handler.on_chain_error(error=ValueError("boom"), run_id="chain-run-2")
         
-        assert call_args.kwargs["step_name"] == "chain:LLMChain"
+        context = mock_client.log_error.call_args.kwargs["context"]["chain_metadata"]
+        assert context["chain_name"] == "LLMChain"
+        assert context["ls_run_depth"] == 1
     
     def test_on_agent_action(self, handler, mock_client):
         """Test agent action callback."""
@@ -247,10 +319,10 @@ class TestWatchLLMCallbackHandler:
         handler.on_agent_action(action=action, run_id="agent-run-1")
         
         mock_client.log_agent_step.assert_called_once()
-        call_args = mock_client.log_agent_step.call_args
+        kwargs = mock_client.log_agent_step.call_args.kwargs
         
-        assert call_args.kwargs["step_name"] == "agent_action:search"
-        assert call_args.kwargs["reasoning"] == "test log"
+        assert kwargs["step_name"] == "agent_action:search"
+        assert kwargs["reasoning"] == "test log"
     
     def test_on_agent_finish(self, handler, mock_client):
         """Test agent finish callback."""
@@ -259,39 +331,118 @@ class TestWatchLLMCallbackHandler:
         handler.on_agent_finish(finish=finish, run_id="agent-run-1")
         
         mock_client.log_agent_step.assert_called_once()
-        call_args = mock_client.log_agent_step.call_args
+        kwargs = mock_client.log_agent_step.call_args.kwargs
         
-        assert call_args.kwargs["step_name"] == "agent_finish"
-        assert call_args.kwargs["step_type"].value == "output"
-        assert call_args.kwargs["output_data"]["output"] == "Done!"
+        assert kwargs["step_name"] == "agent_finish"
+        assert kwargs["step_type"].value == "output"
+        assert kwargs["output_data"]["output"] == "Done!"
     
     def test_privacy_redaction(self, mock_client):
         """Test that prompts and responses can be redacted."""
-        with patch('watchllm.langchain.LANGCHAIN_AVAILABLE', True):
-            with patch('watchllm.langchain.BaseCallbackHandler', MockBaseCallbackHandler):
-                from watchllm.langchain import WatchLLMCallbackHandler
-                
-                handler = WatchLLMCallbackHandler(
-                    client=mock_client,
-                    log_prompts=False,
-                    log_responses=False,
-                )
-                
-                run_id = "private-run"
-                handler.on_llm_start(
-                    serialized={"kwargs": {"model": "gpt-4"}},
-                    prompts=["Secret prompt"],
-                    run_id=run_id,
-                )
-                
-                handler.on_llm_end(
-                    response=MockLLMResult(text="Secret response"),
-                    run_id=run_id,
-                )
-                
-                call_args = mock_client.log_prompt_call.call_args
-                assert call_args.kwargs["prompt"] == "[REDACTED]"
-                assert call_args.kwargs["response"] == "[REDACTED]"
+        from watchllm.langchain import WatchLLMCallbackHandler
+        
+        handler = WatchLLMCallbackHandler(
+            client=mock_client,
+            log_prompts=False,
+            log_responses=False,
+        )
+        
+        run_id = "private-run"
+        handler.on_llm_start(
+            serialized={"kwargs": {"model": "gpt-4"}},
+            prompts=["Secret prompt"],
+            run_id=run_id,
+        )
+        
+        handler.on_llm_end(
+            response=MockLLMResult(text="Secret response"),
+            run_id=run_id,
+        )
+        
+        kwargs = mock_client.log_prompt_call.call_args.kwargs
+        assert kwargs["prompt"] == "[REDACTED]"
+        assert kwargs["response"] == "[REDACTED]"
+    
+    def test_callback_metadata_overlays_handler_metadata(self, mock_client):
+        """Per-call metadata should merge over handler metadata without mutating it."""
+        from watchllm.langchain import WatchLLMCallbackHandler
+
+        handler = WatchLLMCallbackHandler(client=mock_client, metadata={"env": "prod"})
+
+        handler.on_llm_start(
+            serialized={"kwargs": {"model": "gpt-4"}},
+            prompts=["Hi"],
+            run_id="run-1",
+            metadata={"ls_provider": "openai"},
+        )
+        handler.on_llm_end(response=MockLLMResult(text="Hello"), run_id="run-1")
+
+        kwargs = mock_client.log_prompt_call.call_args.kwargs
+        assert kwargs["response_metadata"] == {"env": "prod", "ls_provider": "openai"}
+        assert handler.metadata == {"env": "prod"}
+    
+    def test_nested_runs_track_parent(self, handler, mock_client):
+        """A run started inside another should point at it, and ending it should restore the outer run."""
+        handler.on_chain_start(serialized={"name": "outer"}, inputs={}, run_id="chain-1")
+        handler.on_llm_start(serialized={"kwargs": {"model": "gpt-4"}}, prompts=["Hi"], run_id="llm-1")
+
+        assert handler._runs["llm-1"].parent_run_id == "chain-1"
+
+        handler.on_llm_end(response=MockLLMResult(text="Hello"), run_id="llm-1")
+        assert handler._current_run_id == "chain-1"
+
+        handler.on_chain_end(outputs={}, run_id="chain-1")
+        assert handler._current_run_id is None
+        assert handler._runs == {}
+    
+    def test_uuid_run_ids_pair_start_and_end(self, handler, mock_client):
+        """LangChain passes UUID run_ids; start and end must resolve to the same run."""
+        run_id = uuid.uuid4()
+        handler.on_tool_start(serialized={"name": "calculator"}, input_str="2+2", run_id=run_id)
+        handler.on_tool_end(output="4", run_id=run_id)
+
+        mock_client.log_agent_step.assert_called_once()
+        assert handler._runs == {}
+    
+    def test_background_logging_drains_on_close(self, mock_client):
+        """With background=True, events are logged by the handler's thread and close() drains it."""
+        from watchllm.langchain import WatchLLMCallbackHandler
+
+        with WatchLLMCallbackHandler(client=mock_client, background=True) as handler:
+            for i in range(3):
+                handler.on_tool_start(serialized={"name": "calculator"}, input_str="2+2", run_id=f"tool-{i}")
+                handler.on_tool_end(output="4", run_id=f"tool-{i}")
+
+        assert mock_client.log_agent_step.call_count == 3
+        mock_client.flush.assert_called_once()
+        # After close, callbacks log inline again
+        handler.on_agent_finish(finish=MockAgentFinish(), run_id="agent-1")
+        assert mock_client.log_agent_step.call_count == 4
+    
+    def test_token_usage_from_message_usage_metadata(self, handler, mock_client):
+        """Chat models that report usage_metadata on the message instead of llm_output should be counted."""
+        response = MockLLMResult(text="4")
+        response.llm_output = {}
+        response.generations[0][0].message.usage_metadata = {
+            "input_tokens": 7, "output_tokens": 2, "total_tokens": 9,
+        }
+
+        handler.on_llm_start(serialized={"kwargs": {"model": "gpt-4"}}, prompts=["2+2?"], run_id="llm-1")
+        handler.on_llm_end(response=response, run_id="llm-1")
+
+        kwargs = mock_client.log_prompt_call.call_args.kwargs
+        assert kwargs["tokens_input"] == 7
+        assert kwargs["tokens_output"] == 2
+
+    @pytest.mark.skipif(sys.version_info < (3, 10), reason="dataclass slots need Python 3.10+")
+    def test_run_context_is_slotted(self, handler):
+        """RunContext instances should carry no per-instance __dict__."""
+        handler.on_llm_start(serialized={"kwargs": {"model": "gpt-4"}}, prompts=["Hi"], run_id="llm-1")
+
+        ctx = handler._runs["llm-1"]
+        assert not hasattr(ctx, "__dict__")
+        with pytest.raises(AttributeError):
+            ctx.unexpected = 1
     
     def test_retriever_callbacks(self, handler, mock_client):
         """Test retriever start and end callbacks."""
@@ -306,18 +457,18 @@ class TestWatchLLMCallbackHandler:
         
         # Mock documents
         docs = [
-            MagicMock(page_content="AI is artificial intelligence", metadata={"source": "doc1"}),
-            MagicMock(page_content="Machine learning is a subset of AI", metadata={"source": "doc2"}),
+            FakeDoc("AI is artificial intelligence", {"source": "doc1"}),
+            FakeDoc("Machine learning is a subset of AI", {"source": "doc2"}),
         ]
         
         handler.on_retriever_end(documents=docs, run_id=run_id)
         
         mock_client.log_agent_step.assert_called_once()
-        call_args = mock_client.log_agent_step.call_args
+        kwargs = mock_client.log_agent_step.call_args.kwargs
         
-        assert call_args.kwargs["step_name"] == "retriever"
-        assert call_args.kwargs["input_data"]["query"] == "Find documents about AI"
-        assert call_args.kwargs["output_data"]["document_count"] == 2
+        assert kwargs["step_name"] == "retriever"
+        assert kwargs["input_data"]["query"] == "Find documents about AI"
+        assert kwargs["output_data"]["document_count"] == 2
 
 
 class TestCreateCallbackHandler:
@@ -325,18 +476,16 @@ class TestCreateCallbackHandler:
     
     def test_create_callback_handler(self, mock_client):
         """Test factory function creates handler correctly."""
-        with patch('watchllm.langchain.LANGCHAIN_AVAILABLE', True):
-            with patch('watchllm.langchain.BaseCallbackHandler', MockBaseCallbackHandler):
-                from watchllm.langchain import create_callback_handler
-                
-                handler = create_callback_handler(
-                    client=mock_client,
-                    run_id="factory-run",
-                    tags=["test"],
-                )
-                
-                assert handler.run_id == "factory-run"
-                assert handler.tags == ["test"]
+        from watchllm.langchain import create_callback_handler
+        
+        handler = create_callback_handler(
+            client=mock_client,
+            run_id="factory-run",
+            tags=["test"],
+        )
+        
+        assert handler.run_id == "factory-run"
+        assert handler.tags == ["test"]
 
 
 if __name__ == "__main__":
@@ -4,14 +4,44 @@ Python SDK Test Script
 Tests the WatchLLM Python SDK for observability logging
 """
 
+import argparse
+import asyncio
 import requests
+from requests.adapters import HTTPAdapter
+import urllib3
 import time
 import json
 import uuid
 import sys
 import io
+import gzip
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    AIOHTTP_AVAILABLE = False
+
+try:
+    import httpx
+    import h2  # noqa: F401  (needed by httpx for HTTP/2)
+    HTTPX_AVAILABLE = True
+except ImportError:
+    HTTPX_AVAILABLE = False
+
+# Transport errors from whichever HTTP client _new_session() returns
+HTTP_ERRORS = (requests.exceptions.RequestException, urllib3.exceptions.HTTPError) + (
+    (httpx.HTTPError,) if HTTPX_AVAILABLE else ()
+)
+
 # Fix encoding for Windows console
 if sys.platform == 'win32':
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
@@ -19,24 +49,237 @@ if sys.platform == 'win32':
 # Configuration
 WORKER_URL = "https://proxy.watchllm.dev"
 API_KEY = "test-key"  # Using test key from worker
+HEADERS = {"Content-Type": "application/json", "Authorization": f"Bearer {API_KEY}"}
+
+
+def iso_now() -> str:
+    """Current UTC time as RFC 3339 with milliseconds, e.g. 2024-01-01T00:00:00.000Z."""
+    s, rem = divmod(time.time_ns(), 1_000_000_000)
+    t = time.gmtime(s)
+    return (
+        f"{t.tm_year:04d}-{t.tm_mon:02d}-{t.tm_mday:02d}"
+        f"T{t.tm_hour:02d}:{t.tm_min:02d}:{t.tm_sec:02d}.{rem // 1_000_000:03d}Z"
+    )
+
+
+def _json_default(o):
+    # Naive datetimes are UTC, written as ISO 8601 with a "Z" like orjson's OPT_UTC_Z
+    if isinstance(o, datetime):
+        return o.isoformat() + "Z"
+    # UUIDs in their hyphenated form, as orjson writes them
+    if isinstance(o, uuid.UUID):
+        return str(o)
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+def _dumps(obj) -> bytes:
+    """Serialize a request body (orjson when installed)."""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj, option=orjson.OPT_NAIVE_UTC | orjson.OPT_UTC_Z)
+    return json.dumps(obj, default=_json_default, separators=(",", ":")).encode("utf-8")
+
+
+def _prefix(common: dict) -> bytes:
+    """``common`` serialized once, left open so an item's own fields can be appended."""
+    return _dumps(common)[:-1] + b","
+
+
+def _dumps_events(common: dict, items: list) -> bytes:
+    """Serialize {"events": [...]}, each event being ``common`` plus one item's fields.
+
+    ``common`` is serialized once and spliced with each item's own (disjoint) fields.
+    """
+    head = _prefix(common)
+    return b'{"events":[' + b",".join(head + _dumps(item)[1:] for item in items) + b"]}"
+
+
+def _loads(data: bytes):
+    """Parse a response body (orjson when installed)."""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _pretty(obj) -> str:
+    """Indented JSON for console output."""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode("utf-8")
+    return json.dumps(obj, indent=2)
+
+
+def _new_session(pool_size: int = 10):
+    """Client for the worker with HEADERS as defaults.
+
+    With httpx (and h2) installed, requests to the worker share one multiplexed HTTP/2
+    connection; otherwise a requests.Session over an HTTP/1.1 keep-alive pool.
+    """
+    if HTTPX_AVAILABLE:
+        return httpx.Client(
+            http2=True,
+            headers=HEADERS,
+            timeout=30.0,
+            limits=httpx.Limits(max_connections=pool_size)
+        )
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def _post(session, url: str, body: bytes, **kwargs):
+    """POST raw bytes with either client (httpx takes them as ``content``)."""
+    if HTTPX_AVAILABLE:
+        return session.post(url, content=body, **kwargs)
+    return session.post(url, data=body, **kwargs)
+
+
+def _check(response, ok: str, failed: str, show_body: bool = False) -> bool:
+    """Report whether ``response`` is a 2xx, optionally echoing its body."""
+    passed = 200 <= response.status_code < 300
+    if passed:
+        print(f"   ✅ {ok}")
+    else:
+        print(f"   ❌ {failed}: {response.status_code}")
+    if show_body:
+        print(f"   {'📊 Response' if passed else 'Error'}: {response.text}")
+    print()
+    return passed
+
+
+def _get_stats(session):
+    """GET the project's analytics stats."""
+    return session.get(
+        f"{WORKER_URL}/v1/analytics/stats",
+        params={"project_id": "sdk-test-project"},
+        headers={"Accept-Encoding": "gzip"},
+        timeout=30
+    )
+
+
+def _total_requests(response):
+    """``stats.total_requests`` of a stats response (AnalyticsStats), or None if unavailable."""
+    if response.status_code != 200:
+        return None
+    try:
+        return int(_loads(response.content)["stats"]["total_requests"])
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+async def _load_async(url: str, bodies: list, concurrency: int) -> list:
+    """POST every body with ``concurrency`` workers sharing one aiohttp connection pool."""
+    queue = asyncio.Queue()
+    for body in bodies:
+        queue.put_nowait(body)
+    statuses = []
+
+    connector = aiohttp.TCPConnector(limit=concurrency, ttl_dns_cache=300)
+    # Same 30s budget as the threaded path, so a stalled server cannot hang the run
+    timeout = aiohttp.ClientTimeout(total=30)
+    async with aiohttp.ClientSession(connector=connector, headers=HEADERS, timeout=timeout) as session:
+        async def worker():
+            while True:
+                try:
+                    body = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                try:
+                    async with session.post(url, data=body) as response:
+                        statuses.append(response.status)
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    statuses.append(None)
+
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return statuses
+
+
+def _load_threaded(url: str, bodies: list, concurrency: int) -> list:
+    """Fallback for _load_async without aiohttp: a thread pool over one connection pool.
+
+    Uses the HTTP/2 httpx client when installed, else urllib3 directly: only the status is
+    needed, so requests' per-call preparation (cookies, hooks, auth) is skipped.
+    """
+    # At most one connection per worker thread
+    if HTTPX_AVAILABLE:
+        session = _new_session(pool_size=concurrency)
+        post = lambda body: _post(session, url, body, timeout=30).status_code
+        close = session.close
+    else:
+        # No retries, so every failure is counted as one
+        http = urllib3.PoolManager(maxsize=concurrency, headers=HEADERS, retries=False)
+        post = lambda body: http.request("POST", url, body=body, timeout=30).status
+        close = http.clear
+
+    def send(body):
+        try:
+            return post(body)
+        except HTTP_ERRORS:
+            return None
+
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            return list(pool.map(send, bodies))
+    finally:
+        close()
+
+
+def run_load(n: int, concurrency: int):
+    """Send ``n`` prompt_call events with ``concurrency`` requests in flight and report throughput."""
+    print(f"🚀 Load test: {n} events, concurrency {concurrency}\n")
+    print(f"Worker URL: {WORKER_URL}\n")
+
+    project_id = "sdk-test-project"
+    url = f"{WORKER_URL}/v1/projects/{project_id}/events"
+    template = {
+        "event_type": "prompt_call",
+        "project_id": project_id,
+        "run_id": uuid.uuid4(),
+        "timestamp": iso_now(),
+        "tags": ["sdk-test", "python", "load"],
+        "env": "development",
+        "prompt": "Load test prompt",
+        "model": "gpt-4o-mini",
+        "response": "Load test response",
+        "tokens_input": 10,
+        "tokens_output": 5,
+        "latency_ms": 100,
+        "status": "success"
+    }
+    # Bodies are built up front so the timed section is network only
+    head = _prefix(template)
+    bodies = [head + _dumps({"event_id": uuid.uuid4()})[1:] for _ in range(n)]
+
+    start = time.perf_counter()
+    if AIOHTTP_AVAILABLE:
+        statuses = asyncio.run(_load_async(url, bodies, concurrency))
+    else:
+        statuses = _load_threaded(url, bodies, concurrency)
+    elapsed = time.perf_counter() - start
+
+    ok = sum(1 for status in statuses if status is not None and 200 <= status < 300)
+    print(f"   ✅ {ok}/{n} accepted, {n - ok} failed")
+    print(f"   ⏱️  {elapsed:.2f}s ({n / elapsed:.1f} req/s)\n")
+    if ok < n:
+        exit(1)
+
 
 def test_python_sdk():
     print("🚀 Testing WatchLLM Python SDK Integration...\n")
     print(f"Worker URL: {WORKER_URL}\n")
 
+    # Reuse connections for every request instead of a new TCP+TLS handshake each
+    session = _new_session()
+
     try:
         # Test 1: Log a Prompt Call Event
-        print("📤 Test 1: Logging Prompt Call Event")
-        
-        # Format timestamp to match JavaScript ISO 8601 (with milliseconds)
-        timestamp = datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + "Z"
-        
         event = {
-            "event_id": str(uuid.uuid4()),
+            "event_id": uuid.uuid4(),
             "event_type": "prompt_call",
             "project_id": "sdk-test-project",
-            "run_id": str(uuid.uuid4()),
-            "timestamp": timestamp,
+            "run_id": uuid.uuid4(),
+            "timestamp": iso_now(),
             "tags": ["sdk-test", "python"],
             "env": "development",
             "client": {
@@ -58,115 +301,100 @@ def test_python_sdk():
             "status": "success"
         }
 
-        response1 = requests.post(
-            f"{WORKER_URL}/v1/projects/{event['project_id']}/events",
-            headers={
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {API_KEY}"
-            },
-            json=event,
-            timeout=30
-        )
-
-        if response1.status_code in [200, 201]:
-            print("   ✅ Event logged successfully")
-            print(f"   📊 Response: {response1.text}\n")
-        else:
-            print(f"   ❌ Failed to log event: {response1.status_code}")
-            print(f"   Error: {response1.text}\n")
-            return
-
         # Test 2: Log an Agent Step Event
-        print("📤 Test 2: Logging Agent Step Event")
-        
-        agent_timestamp = datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + "Z"
-        
         agent_event = {
-            "event_id": str(uuid.uuid4()),
+            "event_id": uuid.uuid4(),
             "event_type": "agent_step",
             "project_id": "sdk-test-project",
             "run_id": event["run_id"],  # Same run
-            "timestamp": agent_timestamp,
+            "timestamp": iso_now(),
             "tags": ["sdk-test", "agent-step"],
             "env": "development",
             "client": event["client"],
             "step_number": 1,
             "step_name": "reasoning",
             "step_type": "reasoning",
-            "step_input_data": json.dumps({"task": "analyze data"}),
-            "step_output_data": json.dumps({"decision": "proceed"}),
+            "step_input_data": _dumps({"task": "analyze data"}).decode("utf-8"),
+            "step_output_data": _dumps({"decision": "proceed"}).decode("utf-8"),
             "step_reasoning": "Based on the input, we should proceed with the analysis",
             "latency_ms": 500,
             "status": "success"
         }
 
-        response2 = requests.post(
-            f"{WORKER_URL}/v1/projects/{agent_event['project_id']}/events",
-            headers={
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {API_KEY}"
-            },
-            json=agent_event,
-            timeout=30
-        )
-
-        if response2.status_code in [200, 201]:
-            print("   ✅ Agent step logged successfully\n")
-        else:
-            print(f"   ❌ Failed to log agent step: {response2.status_code}\n")
-
         # Test 3: Batch Event Logging
-        print("📤 Test 3: Batch Event Logging")
-        
+        # Fields shared by every batch item, serialized once; each item only adds its own
+        common = {k: v for k, v in event.items() if k not in ("event_id", "prompt")}
         batch_events = [
-            {
-                **event,
-                "event_id": str(uuid.uuid4()),
-                "prompt": "Batch test 1"
-            },
-            {
-                **event,
-                "event_id": str(uuid.uuid4()),
-                "prompt": "Batch test 2"
-            },
-            {
-                **event,
-                "event_id": str(uuid.uuid4()),
-                "prompt": "Batch test 3"
-            }
+            {"event_id": uuid.uuid4(), "prompt": prompt}
+            for prompt in ("Batch test 1", "Batch test 2", "Batch test 3")
         ]
 
-        response3 = requests.post(
-            f"{WORKER_URL}/v1/events/batch",
-            headers={
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {API_KEY}"
-            },
-            json={"events": batch_events},
-            timeout=30
-        )
+        # Requests already counted, so the poll in Test 4 can tell when these events land
+        requests_before = _total_requests(_get_stats(session)) or 0
+        expected_requests = requests_before + 1 + len(batch_events)
 
-        if response3.status_code in [200, 201]:
-            print(f"   ✅ Batch of {len(batch_events)} events logged successfully\n")
-        else:
-            print(f"   ❌ Failed to log batch: {response3.status_code}\n")
+        # The three sends are independent, so they go out concurrently over the session's
+        # connection pool; results are still reported in order
+        with ThreadPoolExecutor(max_workers=3) as pool:
+            future1 = pool.submit(
+                _post,
+                session,
+                f"{WORKER_URL}/v1/projects/{event['project_id']}/events",
+                _dumps(event),
+                timeout=30
+            )
+            future2 = pool.submit(
+                _post,
+                session,
+                f"{WORKER_URL}/v1/projects/{agent_event['project_id']}/events",
+                _dumps(agent_event),
+                timeout=30
+            )
+            future3 = pool.submit(
+                _post,
+                session,
+                f"{WORKER_URL}/v1/events/batch",
+                # Near-identical items compress well; level 1 is nearly free to produce
+                gzip.compress(_dumps_events(common, batch_events), compresslevel=1),
+                headers={"Content-Encoding": "gzip"},
+                timeout=30
+            )
+
+        print("📤 Test 1: Logging Prompt Call Event")
+        response1 = future1.result()
+
+        if not _check(response1, "Event logged successfully", "Failed to log event", show_body=True):
+            return
+
+        print("📤 Test 2: Logging Agent Step Event")
+        response2 = future2.result()
+
+        _check(response2, "Agent step logged successfully", "Failed to log agent step")
+
+        print("📤 Test 3: Batch Event Logging")
+        response3 = future3.result()
+
+        _check(response3, f"Batch of {len(batch_events)} events logged successfully", "Failed to log batch")
 
         # Test 4: Query Analytics API
         print("📊 Test 4: Querying Analytics API")
-        print("   ⏳ Waiting 3 seconds for events to process...")
-        time.sleep(3)
-
-        response4 = requests.get(
-            f"{WORKER_URL}/v1/analytics/stats",
-            params={"project_id": "sdk-test-project"},
-            headers={"Authorization": f"Bearer {API_KEY}"},
-            timeout=30
-        )
+        print("   ⏳ Waiting for events to process...")
+
+        # Poll with backoff (about 3s in total, the old fixed wait) until the prompt calls
+        # sent above are counted in stats.total_requests
+        for delay in (0.1, 0.2, 0.4, 0.8, 1.5, None):
+            response4 = _get_stats(session)
+            total_requests = _total_requests(response4)
+            if (total_requests is not None and total_requests >= expected_requests) or delay is None:
+                break
+            time.sleep(delay)
 
         if response4.status_code == 200:
-            stats = response4.json()
+            stats = _loads(response4.content)
             print("   ✅ Analytics retrieved successfully")
-            print(f"   📊 Stats: {json.dumps(stats, indent=2)}\n")
+            if total_requests is None or total_requests < expected_requests:
+                print(f"   ⚠️  Only {total_requests} of {expected_requests} requests counted so far")
+            print(f"   📊 Stats: {_pretty(stats)}\n")
         else:
             print(f"   ⚠️  Analytics may not be available yet: {response4.status_code}\n")
 
@@ -183,13 +411,25 @@ def test_python_sdk():
         print(f'   watch = WatchLLM(api_key="your-key", base_url="{WORKER_URL}")')
         print("   watch.log(prompt=..., response=..., model=...)\n")
 
-    except requests.exceptions.RequestException as e:
+    except HTTP_ERRORS as e:
         print(f"\n❌ Test failed: {str(e)}")
         print("\n💡 Troubleshooting:")
         print("   1. Ensure worker is deployed and running")
         print("   2. Check worker logs: npx wrangler tail")
         print("   3. Verify network connectivity to worker\n")
         exit(1)
+    finally:
+        session.close()
 
 if __name__ == "__main__":
-    test_python_sdk()
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--load", type=int, default=0, metavar="N",
+                        help="send N events as a throughput test instead of the functional checks")
+    parser.add_argument("--concurrency", type=int, default=10, metavar="C",
+                        help="requests in flight during --load (default: 10)")
+    args = parser.parse_args()
+
+    if args.load:
+        run_load(args.load, args.concurrency)
+    else:
+        test_python_sdk()